@@ -0,0 +1,280 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from http import HTTPStatus
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from metricas import registro
+
+# Ajuste do limite (AIMD): +1/limite a cada resposta dentro da tolerância, e
+# ×FATOR_REDUCAO (no máximo uma vez por latência recente) quando ela passa
+FATOR_REDUCAO = 0.9
+# A latência de referência é a menor observada, que sobe devagar a cada
+# amostra para acompanhar mudanças permanentes (mais dados, outro hardware)
+DERIVA_DA_BASE = 0.001
+# Peso da amostra nova na média móvel da latência recente
+SUAVIZACAO = 0.1
+# Abaixo desta diferença (em segundos) a latência nunca reduz o limite:
+# evita reagir ao ruído de rotas que levam 1 ms
+FOLGA_LATENCIA = 0.01
+# Clientes lembrados pelos baldes de fichas (os menos recentes são esquecidos)
+MAXIMO_CLIENTES = 10_000
+
+decisoes = registro.contador(
+    'admission_requests_total', 'Decisões do controle de admissão', ('group', 'result'))
+
+# Decisões em que a requisição segue; as demais são recusas
+ADMITIDAS = {'admitida', 'enfileirada'}
+
+_limites: Dict[str, 'LimiteAdaptativo'] = {}
+
+
+def _estado(atributo):
+    def coletar():
+        return {(nome,): float(getattr(limite, atributo)) for nome, limite in _limites.items()}
+    return coletar
+
+
+registro.medidor('admission_limit', 'Limite de concorrência atual', ('group',), _estado('limite'))
+registro.medidor('admission_in_flight', 'Requisições admitidas em andamento', ('group',), _estado('em_uso'))
+registro.medidor('admission_queued', 'Requisições esperando na fila', ('group',), _estado('na_fila'))
+
+
+class LimiteAdaptativo:
+    """Limite de concorrência com fila limitada, ajustado pela latência (AIMD).
+
+    Roda no event loop (sem locks). Quem chega com o limite atingido espera na
+    fila até ``espera_maxima``; com a fila cheia, é recusado na hora.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        maximo: int,
+        fila_maxima: int,
+        espera_maxima: float = 2.0,
+        minimo: int = 1,
+        tolerancia: float = 2.0,
+    ):
+        self.nome = nome
+        self.maximo = maximo
+        self.minimo = min(minimo, maximo)
+        self.fila_maxima = fila_maxima
+        self.espera_maxima = espera_maxima
+        self.tolerancia = tolerancia
+        self.limite = float(maximo)
+        self.em_uso = 0
+        self.latencia_base: Optional[float] = None
+        self.latencia_recente: Optional[float] = None
+        self._ultima_reducao = 0.0
+        self._fila: Deque[asyncio.Future] = deque()
+
+    @property
+    def na_fila(self) -> int:
+        return len(self._fila)
+
+    async def adquirir(self) -> str:
+        """Tenta ocupar uma vaga e devolve a decisão (ver ``ADMITIDAS``)."""
+        if self.em_uso < int(self.limite) and not self._fila:
+            self.em_uso += 1
+            return 'admitida'
+        if len(self._fila) >= self.fila_maxima:
+            return 'fila_cheia'
+
+        vez = asyncio.get_running_loop().create_future()
+        self._fila.append(vez)
+        try:
+            # shield: o timeout não cancela a vaga que acabou de ser passada
+            await asyncio.wait_for(asyncio.shield(vez), self.espera_maxima)
+        except asyncio.TimeoutError:
+            if vez.done():
+                return 'enfileirada'
+            vez.cancel()
+            self._fila.remove(vez)
+            return 'espera_esgotada'
+        except asyncio.CancelledError:
+            # Cliente desconectou: devolve a vaga se ela já tinha sido passada
+            if vez.done() and not vez.cancelled():
+                self.liberar()
+            else:
+                vez.cancel()
+            raise
+        return 'enfileirada'
+
+    def liberar(self, latencia: Optional[float] = None) -> None:
+        if latencia is not None:
+            self._ajustar(latencia)
+        self.em_uso -= 1
+        # Passa as vagas livres para a fila, na ordem de chegada
+        while self._fila and self.em_uso < int(self.limite):
+            vez = self._fila.popleft()
+            if not vez.done():
+                self.em_uso += 1
+                vez.set_result(None)
+
+    def _ajustar(self, latencia: float) -> None:
+        base = latencia if self.latencia_base is None else min(latencia, self.latencia_base * (1 + DERIVA_DA_BASE))
+        recente = latencia if self.latencia_recente is None else self.latencia_recente + SUAVIZACAO * (latencia - self.latencia_recente)
+        self.latencia_base, self.latencia_recente = base, recente
+
+        if recente > base * self.tolerancia and recente - base > FOLGA_LATENCIA:
+            agora = time.monotonic()
+            if agora - self._ultima_reducao >= recente:
+                self.limite = max(float(self.minimo), self.limite * FATOR_REDUCAO)
+                self._ultima_reducao = agora
+        else:
+            self.limite = min(float(self.maximo), self.limite + 1 / self.limite)
+
+    def retry_after(self) -> int:
+        # Tempo para a fila atual andar, em segundos inteiros (mínimo 1)
+        if not self.latencia_recente:
+            return 1
+        return max(1, math.ceil(self.latencia_recente * (len(self._fila) + 1) / max(int(self.limite), 1)))
+
+
+class BaldeDeFichas:
+    """Taxa por cliente: ``taxa`` fichas por segundo, acumulando até ``rajada``."""
+
+    def __init__(self, taxa: float, rajada: int, maximo_clientes: int = MAXIMO_CLIENTES):
+        self.taxa = taxa
+        self.rajada = rajada
+        self.maximo_clientes = maximo_clientes
+        self._clientes: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    def consumir(self, cliente: str) -> float:
+        """Gasta uma ficha. Devolve 0, ou quantos segundos faltam para a próxima."""
+        agora = time.monotonic()
+        fichas, ultimo = self._clientes.pop(cliente, (float(self.rajada), agora))
+        fichas = min(float(self.rajada), fichas + (agora - ultimo) * self.taxa)
+        espera = 0.0
+        if fichas >= 1:
+            fichas -= 1
+        else:
+            espera = (1 - fichas) / self.taxa
+        self._clientes[cliente] = (fichas, agora)
+        if len(self._clientes) > self.maximo_clientes:
+            self._clientes.popitem(last=False)
+        return espera
+
+
+class ControleDeAdmissao:
+    """Grupos de rotas com limites próprios e, opcionalmente, taxa por cliente.
+
+    O grupo vem de ``grupos`` (método, template da rota); sem entrada, GET e
+    HEAD são "leitura" e os demais métodos, "escrita". Rotas fora do schema
+    (/metrics, /ready) e caminhos sem rota não passam pelo controle.
+    """
+
+    def __init__(
+        self,
+        limites: Iterable[LimiteAdaptativo],
+        grupos: Optional[Dict[Tuple[str, str], str]] = None,
+        baldes: Optional[BaldeDeFichas] = None,
+        cabecalho_cliente: Optional[str] = None,
+    ):
+        self.limites = {limite.nome: limite for limite in limites}
+        self.grupos = grupos or {}
+        self.baldes = baldes
+        self.cabecalho_cliente = cabecalho_cliente.lower().encode() if cabecalho_cliente else None
+
+    @classmethod
+    def a_partir_de(cls, settings, grupos: Optional[Dict[Tuple[str, str], str]] = None) -> 'ControleDeAdmissao':
+        limites = [
+            LimiteAdaptativo(
+                nome,
+                maximo=maximo,
+                fila_maxima=settings.ADMISSAO_FILA_MAXIMA.get(nome, maximo),
+                espera_maxima=settings.ADMISSAO_ESPERA_MAXIMA,
+                minimo=settings.ADMISSAO_LIMITE_MINIMO,
+                tolerancia=settings.ADMISSAO_TOLERANCIA_LATENCIA,
+            )
+            for nome, maximo in settings.ADMISSAO_LIMITE_MAXIMO.items()
+        ]
+        baldes = None
+        if settings.ADMISSAO_TAXA_POR_CLIENTE:
+            baldes = BaldeDeFichas(settings.ADMISSAO_TAXA_POR_CLIENTE, settings.ADMISSAO_RAJADA_POR_CLIENTE)
+        controle = cls(limites, grupos, baldes, settings.ADMISSAO_CABECALHO_CLIENTE)
+        # Os medidores de /metrics mostram os limites do controle da aplicação
+        _limites.update(controle.limites)
+        return controle
+
+    def grupo(self, scope) -> Optional[str]:
+        for rota in scope['app'].router.routes:
+            if rota.matches(scope)[0] == Match.FULL:
+                if not getattr(rota, 'include_in_schema', False):
+                    return None
+                # A rota fica no scope: as métricas rotulam até as recusadas
+                scope['route'] = rota
+                padrao = 'leitura' if scope['method'] in ('GET', 'HEAD') else 'escrita'
+                return self.grupos.get((scope['method'], rota.path), padrao)
+        return None
+
+    def cliente(self, scope) -> str:
+        if self.cabecalho_cliente is not None:
+            for nome, valor in scope['headers']:
+                if nome == self.cabecalho_cliente:
+                    # X-Forwarded-For: o primeiro endereço é o do cliente
+                    return valor.decode('latin-1').split(',')[0].strip()
+        return scope['client'][0] if scope.get('client') else ''
+
+
+def _recusa(status: HTTPStatus, detalhe: str, retry_after: int) -> JSONResponse:
+    return JSONResponse({'detail': detalhe}, status_code=status, headers={'Retry-After': str(retry_after)})
+
+
+class MiddlewareDeAdmissao:
+    """Middleware ASGI que aplica o ``ControleDeAdmissao`` antes do roteamento.
+
+    A latência que ajusta o limite é o tempo até os cabeçalhos da resposta
+    (exportações em streaming não parecem lentas); a vaga só é devolvida no
+    fim do corpo.
+    """
+
+    def __init__(self, app, controle: ControleDeAdmissao):
+        self.app = app
+        self.controle = controle
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        nome = self.controle.grupo(scope)
+        limite = self.controle.limites.get(nome)
+        if limite is None:
+            await self.app(scope, receive, send)
+            return
+
+        # 1. Taxa por cliente: 429 antes de ocupar qualquer vaga
+        if self.controle.baldes is not None:
+            espera = self.controle.baldes.consumir(self.controle.cliente(scope))
+            if espera:
+                decisoes.inc((nome, 'limite_do_cliente'))
+                resposta = _recusa(HTTPStatus.TOO_MANY_REQUESTS, 'Muitas requisições; aguarde para tentar novamente', math.ceil(espera))
+                await resposta(scope, receive, send)
+                return
+
+        # 2. Vaga no grupo, talvez depois de esperar na fila
+        decisao = await limite.adquirir()
+        decisoes.inc((nome, decisao))
+        if decisao not in ADMITIDAS:
+            resposta = _recusa(HTTPStatus.SERVICE_UNAVAILABLE, 'Servidor ocupado, tente novamente em instantes', limite.retry_after())
+            await resposta(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        latencia = None
+
+        async def enviar(mensagem):
+            nonlocal latencia
+            if mensagem['type'] == 'http.response.start':
+                latencia = time.perf_counter() - inicio
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            limite.liberar(latencia)
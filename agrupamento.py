@@ -0,0 +1,115 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+from metricas import registro
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+BUCKETS_LOTE = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+tamanho_dos_lotes = registro.histograma(
+    'db_batch_size', 'Chaves por consulta em lote dos carregadores', ('loader',), buckets=BUCKETS_LOTE)
+coalescidas = registro.contador(
+    'coalesced_lookups_total', 'Leituras que aproveitaram uma consulta já em andamento', ('loader',))
+
+
+class CarregadorEmLote(Generic[K, V]):
+    """Junta leituras por chave em uma consulta ``IN (...)`` (estilo DataLoader).
+
+    As chaves pedidas dentro de ``janela`` segundos (0: até a próxima volta
+    do event loop) viram uma única chamada de ``buscar``, que devolve um dict
+    chave -> valor; chaves ausentes resolvem para None. Pedidos iguais, no
+    lote aberto ou na consulta em andamento, compartilham o mesmo resultado
+    (single-flight). Nada é guardado depois da resposta: o cache de
+    respostas continua sendo o cache.
+
+    Uma consulta em andamento pode ter começado antes de uma escrita: quem
+    acabou de escrever (``depois_de_escrever``) não a aproveita, e
+    ``esquecer`` faz as escritas deste processo valerem para todos.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        buscar: Callable[[List[K]], Awaitable[Dict[K, V]]],
+        janela: float = 0.002,
+        maximo: int = 500,
+    ):
+        self.nome = nome
+        self.buscar = buscar
+        self.janela = janela
+        self.maximo = maximo
+        self._lote: Dict[K, asyncio.Future] = {}
+        self._em_andamento: Dict[K, asyncio.Future] = {}
+        self._disparo: Optional[asyncio.Handle] = None
+        # Referências às consultas em andamento (o loop guarda só referências fracas)
+        self._tarefas = set()
+
+    async def carregar(self, chave: K, depois_de_escrever: bool = False) -> Optional[V]:
+        # O lote aberto ainda não consultou: serve também para quem acabou de escrever
+        futuro = self._lote.get(chave)
+        if futuro is None and not depois_de_escrever:
+            futuro = self._em_andamento.get(chave)
+        if futuro is not None:
+            coalescidas.inc((self.nome,))
+        else:
+            futuro = self._agendar(chave)
+        # shield: quem desiste não cancela o resultado dos outros
+        return await asyncio.shield(futuro)
+
+    async def carregar_muitos(self, chaves: Iterable[K], depois_de_escrever: bool = False) -> Dict[K, V]:
+        chaves = list(dict.fromkeys(chaves))
+        valores = await asyncio.gather(*(self.carregar(chave, depois_de_escrever) for chave in chaves))
+        return {chave: valor for chave, valor in zip(chaves, valores) if valor is not None}
+
+    def esquecer(self) -> None:
+        """Chamado depois de uma escrita: as consultas em andamento seguem para
+        quem já as espera, mas os próximos pedidos disparam uma nova."""
+        self._em_andamento.clear()
+
+    def _agendar(self, chave: K) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        self._lote[chave] = futuro
+        if len(self._lote) >= self.maximo:
+            self._disparar()
+        elif self._disparo is None:
+            if self.janela > 0:
+                self._disparo = loop.call_later(self.janela, self._disparar)
+            else:
+                self._disparo = loop.call_soon(self._disparar)
+        return futuro
+
+    def _disparar(self) -> None:
+        if self._disparo is not None:
+            self._disparo.cancel()
+            self._disparo = None
+        lote, self._lote = self._lote, {}
+        self._em_andamento.update(lote)
+        tamanho_dos_lotes.observar(len(lote), (self.nome,))
+        tarefa = asyncio.ensure_future(self._executar(lote))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar(self, lote: Dict[K, asyncio.Future]) -> None:
+        try:
+            valores = await self.buscar(list(lote))
+        except Exception as erro:
+            for futuro in lote.values():
+                if not futuro.done():
+                    futuro.set_exception(erro)
+                    # Marca como lida: quem já desistiu não gera aviso no log
+                    futuro.exception()
+        except BaseException:
+            for futuro in lote.values():
+                futuro.cancel()
+            raise
+        else:
+            for chave, futuro in lote.items():
+                if not futuro.done():
+                    futuro.set_result(valores.get(chave))
+        finally:
+            for chave, futuro in lote.items():
+                if self._em_andamento.get(chave) is futuro:
+                    del self._em_andamento[chave]
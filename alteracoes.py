@@ -0,0 +1,296 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from metricas import registro
+from models import Alteracao, HorizonteAlteracoes, Receita, User
+from schema import AlteracaoPublic, Receita as ReceitaSchema, UsuarioPublic
+from serializacao import colunas, construir
+
+log = logging.getLogger('alteracoes')
+
+RECEITA = 'receita'
+USUARIO = 'usuario'
+
+CRIADO = 'criado'
+ATUALIZADO = 'atualizado'
+REMOVIDO = 'removido'
+
+# No PostgreSQL o seq é reservado no INSERT e o commit pode vir fora de ordem:
+# um advisory lock até o fim da transação faz a ordem do seq ser a do commit
+# (um leitor nunca vê o seq 11 antes do 10). No SQLite só há um escritor.
+TRAVA_POSTGRES = select(func.pg_advisory_xact_lock(0x616c7465))
+
+gravadas = registro.contador(
+    'change_feed_entries_total', 'Entradas gravadas no registro de alterações', ('entity', 'op'))
+expurgadas = registro.contador(
+    'change_feed_expired_tombstones_total', 'Lápides removidas pela retenção')
+
+
+def _comandos(dialeto: str, entidade: str, operacao: str, ids: List[int]) -> list:
+    # Pares (comando, parâmetros); o INSERT vai como executemany, em lotes
+    comandos = [(TRAVA_POSTGRES, None)] if dialeto == 'postgresql' else []
+    if operacao != CRIADO:
+        # Compactação na escrita: a entrada nova substitui as anteriores do item
+        comandos.append((delete(Alteracao).where(
+            Alteracao.entidade == entidade, Alteracao.entidade_id.in_(ids)), None))
+    comandos.append((insert(Alteracao), [
+        {'entidade': entidade, 'entidade_id': i, 'operacao': operacao} for i in ids
+    ]))
+    return comandos
+
+
+def registrar(db: Session, entidade: str, operacao: str, ids: Iterable[int]) -> None:
+    """Acrescenta as alterações à transação corrente; o commit fica com quem chama."""
+    ids = list(ids)
+    if not ids:
+        return
+    for comando, parametros in _comandos(db.get_bind().dialect.name, entidade, operacao, ids):
+        db.execute(comando, parametros)
+    db.info['alteracoes'] = True
+    gravadas.inc((entidade, operacao), len(ids))
+
+
+async def registrar_async(db: AsyncSession, entidade: str, operacao: str, ids: Iterable[int]) -> None:
+    ids = list(ids)
+    if not ids:
+        return
+    for comando, parametros in _comandos(db.get_bind().dialect.name, entidade, operacao, ids):
+        await db.execute(comando, parametros)
+    db.info['alteracoes'] = True
+    gravadas.inc((entidade, operacao), len(ids))
+
+
+class Aviso:
+    """Acorda as esperas de /changes (long-poll e SSE) quando há alterações novas.
+
+    Commits deste processo avisam na hora (de qualquer thread); os dos outros
+    workers são vistos por uma única tarefa que consulta ``max(seq)`` a cada
+    ``intervalo`` segundos, e só enquanto alguém espera. Acima de
+    ``maximo_esperas`` as requisições respondem sem esperar.
+    """
+
+    def __init__(self, intervalo: float = 1.0, maximo_esperas: int = 1000):
+        self.intervalo = intervalo
+        self.maximo_esperas = maximo_esperas
+        self.esperas = 0
+        self.ultimo: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._evento: Optional[asyncio.Event] = None
+        self._vigia: Optional[asyncio.Task] = None
+
+    def evento(self) -> asyncio.Event:
+        """O evento da próxima alteração; pegue-o antes de consultar, para não perder um aviso."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._evento, self._vigia = loop, asyncio.Event(), None
+        return self._evento
+
+    def notificar(self) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._acordar)
+
+    def _acordar(self) -> None:
+        self._evento.set()
+        self._evento = asyncio.Event()
+
+    @property
+    def lotado(self) -> bool:
+        return self.esperas >= self.maximo_esperas
+
+    async def esperar(self, evento: asyncio.Event, timeout: float, ultimo_seq: Callable[[], Awaitable[int]]) -> bool:
+        """Espera o ``evento`` por até ``timeout`` segundos; False se o tempo acabou."""
+        if self._vigia is None or self._vigia.done():
+            self._vigia = asyncio.get_running_loop().create_task(self._vigiar(ultimo_seq))
+        self.esperas += 1
+        try:
+            await asyncio.wait_for(evento.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.esperas -= 1
+
+    async def _vigiar(self, ultimo_seq: Callable[[], Awaitable[int]]) -> None:
+        try:
+            while True:
+                atual = await ultimo_seq()
+                if atual != self.ultimo:
+                    # Na primeira leitura também acorda: quem espera confere de novo
+                    self.ultimo = atual
+                    self._acordar()
+                await asyncio.sleep(self.intervalo)
+                if not self.esperas:
+                    return
+        except Exception:
+            log.warning('falha ao consultar o registro de alterações', exc_info=True)
+
+
+# Avisos a acordar depois de um commit que gravou alterações (main.py registra o seu)
+AVISOS: List[Aviso] = []
+
+
+@event.listens_for(Session, 'after_commit')
+def _avisar_apos_commit(sessao: Session) -> None:
+    if sessao.info.pop('alteracoes', False):
+        for aviso in AVISOS:
+            aviso.notificar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_aviso(sessao: Session) -> None:
+    sessao.info.pop('alteracoes', None)
+
+
+async def ultimo_seq(db: AsyncSession) -> int:
+    return await db.scalar(select(func.coalesce(func.max(Alteracao.seq), 0)))
+
+
+async def horizonte(db: AsyncSession) -> int:
+    linha = await db.get(HorizonteAlteracoes, 1)
+    return linha.seq if linha is not None else 0
+
+
+def pendentes(db: Session, entidade: str, since: int) -> Optional[list]:
+    """As entradas de ``entidade`` depois de ``since`` (seq, entidade_id, operacao), em ordem.
+
+    None se lápides depois de ``since`` já foram expurgadas: quem parou ali
+    pode ter perdido remoções e precisa recomeçar do zero.
+    """
+    expurgado = db.scalar(select(HorizonteAlteracoes.seq).where(HorizonteAlteracoes.id == 1))
+    if expurgado is not None and expurgado > since:
+        return None
+    return db.execute(
+        select(Alteracao.seq, Alteracao.entidade_id, Alteracao.operacao)
+        .where(Alteracao.entidade == entidade, Alteracao.seq > since)
+        .order_by(Alteracao.seq)
+    ).all()
+
+
+async def ler(db: AsyncSession, since: int, limite: int) -> List[AlteracaoPublic]:
+    """Até ``limite`` alterações depois de ``since``, com o estado atual de cada item."""
+    entradas = (await db.scalars(
+        select(Alteracao).where(Alteracao.seq > since).order_by(Alteracao.seq).limit(limite)
+    )).all()
+    if not entradas:
+        return []
+
+    # Os itens de cada entidade em uma consulta; um item removido depois da
+    # entrada fica sem dados (a lápide vem mais adiante no registro)
+    ids = {RECEITA: set(), USUARIO: set()}
+    for entrada in entradas:
+        if entrada.operacao != REMOVIDO:
+            ids[entrada.entidade].add(entrada.entidade_id)
+    dados = {RECEITA: {}, USUARIO: {}}
+    if ids[RECEITA]:
+        receitas = await db.scalars(select(Receita).where(Receita.id.in_(ids[RECEITA])))
+        dados[RECEITA] = {r.id: ReceitaSchema.model_validate(r) for r in receitas}
+    if ids[USUARIO]:
+        linhas = await db.execute(select(*colunas(UsuarioPublic, User)).where(User.id.in_(ids[USUARIO])))
+        dados[USUARIO] = {u.id: u for u in construir(UsuarioPublic, linhas.mappings())}
+
+    return [
+        AlteracaoPublic.model_construct(
+            seq=entrada.seq,
+            entidade=entrada.entidade,
+            id=entrada.entidade_id,
+            operacao=entrada.operacao,
+            em=entrada.criado_em,
+            dados=dados[entrada.entidade].get(entrada.entidade_id),
+        )
+        for entrada in entradas
+    ]
+
+
+async def aguardar(
+    aviso: Aviso,
+    ler_pagina: Callable[[int], Awaitable[List[AlteracaoPublic]]],
+    since: int,
+    espera: float,
+    ultimo: Callable[[], Awaitable[int]],
+) -> List[AlteracaoPublic]:
+    """Long-poll: a primeira página não vazia depois de ``since``, esperando até ``espera`` segundos."""
+    prazo = asyncio.get_running_loop().time() + espera
+    while True:
+        evento = aviso.evento()
+        itens = await ler_pagina(since)
+        restante = prazo - asyncio.get_running_loop().time()
+        if itens or restante <= 0 or aviso.lotado:
+            return itens
+        await aviso.esperar(evento, restante, ultimo)
+
+
+async def eventos(
+    aviso: Aviso,
+    ler_pagina: Callable[[int], Awaitable[List[AlteracaoPublic]]],
+    since: int,
+    ultimo: Callable[[], Awaitable[int]],
+    manter_viva: float = 15,
+) -> AsyncIterator[str]:
+    """Server-Sent Events: cada alteração com ``id: seq`` (o navegador reconecta
+    com Last-Event-ID) e um comentário a cada ``manter_viva`` segundos sem
+    alterações, para proxies não fecharem a conexão."""
+    while True:
+        evento = aviso.evento()
+        itens = await ler_pagina(since)
+        for item in itens:
+            yield f'id: {item.seq}\nevent: {item.operacao}\ndata: {item.model_dump_json()}\n\n'
+        if itens:
+            since = itens[-1].seq
+            continue
+        if not await aviso.esperar(evento, manter_viva, ultimo):
+            yield ': manter viva\n\n'
+
+
+def limite_de_retencao(dialeto: str, retencao_dias: float):
+    # Calculado pelo relógio do banco, o mesmo do server_default de criado_em:
+    # não depende do fuso do processo nem do fuso da sessão (no PostgreSQL a
+    # coluna é timestamp sem fuso, gravada no fuso da sessão)
+    if dialeto == 'sqlite':
+        # CURRENT_TIMESTAMP do SQLite: texto em UTC, no mesmo formato
+        return func.datetime('now', f'{-retencao_dias * 86400:+.0f} seconds')
+    return func.now() - timedelta(days=retencao_dias)
+
+
+async def expurgar(db: AsyncSession, retencao_dias: float) -> int:
+    """Remove as lápides mais velhas que a retenção e avança o horizonte.
+
+    As demais entradas não vencem: com a compactação na escrita, o registro
+    tem uma entrada por item existente, e ``since=0`` continua sendo uma
+    sincronização completa.
+    """
+    limite = limite_de_retencao(db.get_bind().dialect.name, retencao_dias)
+    vencidas = (Alteracao.operacao == REMOVIDO) & (Alteracao.criado_em < limite)
+    ate = await db.scalar(select(func.max(Alteracao.seq)).where(vencidas))
+    if ate is None:
+        return 0
+
+    removidas = (await db.execute(delete(Alteracao).where(vencidas, Alteracao.seq <= ate))).rowcount
+    atual = await db.get(HorizonteAlteracoes, 1)
+    if atual is None:
+        db.add(HorizonteAlteracoes(id=1, seq=ate))
+    elif atual.seq < ate:
+        atual.seq = ate
+    await db.commit()
+    expurgadas.inc(valor=removidas)
+    return removidas
+
+
+async def manter(sessoes: Callable[[], AsyncSession], retencao_dias: float, intervalo: float) -> None:
+    """Tarefa do lifespan: expurga as lápides vencidas a cada ``intervalo`` segundos."""
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            async with sessoes() as db:
+                removidas = await expurgar(db, retencao_dias)
+            if removidas:
+                log.info('%d lápides expurgadas do registro de alterações', removidas)
+        except Exception:
+            # Outro worker expurgando ao mesmo tempo, banco fora do ar...: tenta de novo depois
+            log.warning('falha ao expurgar o registro de alterações', exc_info=True)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterator, Tuple
+from urllib.parse import urlencode
+
+from fastapi import FastAPI
+from fastapi.dependencies.models import Dependant
+from fastapi.routing import APIRoute
+
+from serializacao import adaptador
+
+log = logging.getLogger('aquecimento')
+
+# Valores usados nas leituras de aquecimento: ids e textos quaisquer (um 404
+# também compila o SQL da rota) e páginas de um item. Exportações sem `limit`
+# recebem um `after` além do último id, para não percorrer o catálogo.
+ID_DE_AQUECIMENTO = 1
+TEXTO_DE_AQUECIMENTO = 'aquecimento'
+AFTER_SEM_LINHAS = 2 ** 62
+
+
+def _parametros(dependant: Dependant) -> Iterator[Tuple[str, object]]:
+    # Parâmetros de caminho e de query da rota e de suas dependências (Pagina...)
+    for campo in dependant.path_params:
+        yield 'path', campo
+    for campo in dependant.query_params:
+        yield 'query', campo
+    for dependencia in dependant.dependencies:
+        yield from _parametros(dependencia)
+
+
+def requisicao_de_aquecimento(rota: APIRoute) -> Tuple[str, Dict[str, object]]:
+    """Caminho e query de uma leitura barata na rota GET."""
+    caminho, query = rota.path, {}
+    nomes = set()
+    for tipo, campo in _parametros(rota.dependant):
+        nomes.add(campo.alias)
+        valor = ID_DE_AQUECIMENTO if campo.field_info.annotation is int else TEXTO_DE_AQUECIMENTO
+        if tipo == 'path':
+            caminho = caminho.replace('{' + campo.alias + '}', str(valor))
+        elif campo.field_info.is_required():
+            query[campo.alias] = valor
+    if 'limit' in nomes:
+        query['limit'] = 1
+    elif 'after' in nomes:
+        query['after'] = AFTER_SEM_LINHAS
+    return caminho, query
+
+
+def aquecer_serializadores(app: FastAPI) -> None:
+    # Monta de antemão os TypeAdapters usados pela RespostaJSON (lru_cache)
+    for rota in app.routes:
+        if isinstance(rota, APIRoute) and rota.response_model is not None:
+            adaptador(rota.response_model)
+
+
+async def _get(app: FastAPI, caminho: str, query: Dict[str, object]) -> int:
+    # Uma requisição GET direto na interface ASGI do app: sem rede e sem
+    # cliente HTTP (httpx/TestClient são dependências de teste)
+    fim = asyncio.Event()
+    status = 500
+    enviado = False
+
+    async def receive():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Depois do corpo, o "cliente" só desconecta quando a resposta termina
+        await fim.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensagem):
+        nonlocal status
+        if mensagem['type'] == 'http.response.start':
+            status = mensagem['status']
+        elif mensagem['type'] == 'http.response.body' and not mensagem.get('more_body', False):
+            fim.set()
+
+    escopo = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': caminho,
+        'raw_path': caminho.encode(),
+        'root_path': '',
+        'query_string': urlencode(query).encode(),
+        'headers': [(b'host', b'aquecimento')],
+        'client': None,
+        'server': ('aquecimento', 80),
+    }
+    try:
+        await app(escopo, receive, send)
+    except Exception:
+        # Um erro em uma rota (tabela ainda sem migração...) não impede a partida
+        log.warning('aquecimento de %s levantou uma exceção', caminho, exc_info=True)
+        return 500
+    finally:
+        fim.set()
+    return status
+
+
+async def aquecer_rotas(app: FastAPI) -> Dict[str, int]:
+    """Faz uma leitura em cada rota GET pública, direto no app (sem rede).
+
+    A primeira execução de cada rota é a que compila o SQL no cache do
+    SQLAlchemy, monta os validadores da query e carrega os índices em memória;
+    feita aqui, nenhuma requisição de verdade paga por isso. Devolve o status
+    de cada rota.
+    """
+    status = {}
+    for rota in app.routes:
+        if not isinstance(rota, APIRoute) or 'GET' not in rota.methods or not rota.include_in_schema:
+            continue
+        caminho, query = requisicao_de_aquecimento(rota)
+        inicio = time.perf_counter()
+        status[rota.path] = await _get(app, caminho, query)
+        if status[rota.path] >= 500:
+            log.warning('aquecimento de %s falhou com %s', caminho, status[rota.path])
+        log.debug('%s -> %s em %.1f ms', caminho, status[rota.path], (time.perf_counter() - inicio) * 1000)
+    return status
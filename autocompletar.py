@@ -0,0 +1,294 @@
+import heapq
+import sys
+import threading
+from bisect import bisect_left, insort
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from busca import PALAVRAS_VAZIAS
+from normalizacao import normalizar
+
+# Prefixos com até tantas chaves são ranqueados varrendo o intervalo; acima
+# disso (prefixos curtos: "a", "ca"...) o top-k fica guardado e é mantido a
+# cada escrita
+VARREDURA_MAXIMA = 2048
+# Sugestões guardadas por prefixo (e o máximo por requisição)
+TOPO_K = 50
+# Chaves novas acumuladas antes de juntá-las ao array ordenado (no mínimo; ou 1/8 dele)
+COMPACTAR_APOS = 1024
+# Separa o sufixo do nome do id da receita na chave; ordena antes de qualquer letra
+SEPARADOR = '\x00'
+# Maior caractere possível: prefixo + FIM limita o intervalo do prefixo
+FIM = '\U0010ffff'
+
+# Os mesmos ingredientes se repetem em milhares de receitas
+_normalizar = lru_cache(maxsize=65536)(normalizar)
+
+
+class Sugestao(NamedTuple):
+    chave: str
+    peso: int
+
+
+class Prefixos:
+    """Chaves normalizadas com um peso, consultadas por prefixo (top-k por peso).
+
+    As chaves ficam numa lista ordenada, consultada com ``bisect``; chaves
+    novas vão para uma lista ordenada pequena e são juntadas à principal de
+    tempos em tempos (inserir no meio de um milhão de itens custaria uma cópia
+    a cada escrita). Chaves que chegam a peso zero ficam com peso 0 até a
+    próxima junção, que as remove.
+
+    Sem lock próprio: quem usa (os índices abaixo) serializa o acesso.
+    """
+
+    def __init__(self):
+        # Toda chave das duas listas tem peso aqui (0 se saiu)
+        self._pesos: Dict[str, int] = {}
+        self._ordenadas: List[str] = []
+        self._novas: List[str] = []
+        self._topo: Dict[str, List[str]] = {}
+        self._zeradas = 0
+
+    def __len__(self) -> int:
+        return len(self._pesos) - self._zeradas
+
+    def __contains__(self, chave: str) -> bool:
+        return self._pesos.get(chave, 0) > 0
+
+    def _ordem(self, chave: str) -> Tuple[int, str]:
+        # Maior peso primeiro; no empate, ordem alfabética
+        return -self._pesos[chave], chave
+
+    def somar(self, chave: str, delta: int) -> None:
+        anterior = self._pesos.get(chave)
+        if anterior is None:
+            if delta <= 0:
+                return
+            anterior = 0
+            insort(self._novas, chave)
+        elif not anterior:
+            self._zeradas -= 1
+        peso = max(anterior + delta, 0)
+        self._pesos[chave] = peso
+        if not peso:
+            self._zeradas += 1
+        if len(self._novas) > max(COMPACTAR_APOS, len(self._ordenadas) // 8):
+            self._juntar()
+
+        # Top-k guardados dos prefixos da chave
+        for fim in range(1, len(chave) + 1):
+            topo = self._topo.get(chave[:fim])
+            if topo is None:
+                continue
+            if delta < 0:
+                if chave in topo:
+                    # Pode ter caído abaixo de quem ficou de fora: refaz na próxima consulta
+                    del self._topo[chave[:fim]]
+            elif chave in topo:
+                topo.sort(key=self._ordem)
+            elif len(topo) < TOPO_K or self._ordem(chave) < self._ordem(topo[-1]):
+                topo.append(chave)
+                topo.sort(key=self._ordem)
+                del topo[TOPO_K:]
+
+    def _juntar(self) -> None:
+        pesos = self._pesos
+        # Duas listas ordenadas: o Timsort só as intercala
+        self._ordenadas = sorted(c for c in chain(self._ordenadas, self._novas) if pesos[c])
+        self._novas = []
+        if self._zeradas:
+            self._pesos = {c: pesos[c] for c in self._ordenadas}
+            self._zeradas = 0
+
+    def reconstruir(self, pesos: Dict[str, int]) -> None:
+        self._pesos = {chave: peso for chave, peso in pesos.items() if peso > 0}
+        self._ordenadas = sorted(self._pesos)
+        self._novas = []
+        self._topo = {}
+        self._zeradas = 0
+
+    def buscar(self, prefixo: str, k: int) -> List[Sugestao]:
+        intervalos = [
+            (lista, bisect_left(lista, prefixo), bisect_left(lista, prefixo + FIM))
+            for lista in (self._ordenadas, self._novas)
+        ]
+        if sum(fim - inicio for _, inicio, fim in intervalos) > VARREDURA_MAXIMA and k <= TOPO_K:
+            topo = self._topo.get(prefixo)
+            if topo is None:
+                topo = self._topo[prefixo] = self._melhores(intervalos, TOPO_K)
+            chaves = topo[:k]
+        else:
+            chaves = self._melhores(intervalos, k)
+        return [Sugestao(chave, self._pesos[chave]) for chave in chaves]
+
+    def _melhores(self, intervalos, k: int) -> List[str]:
+        (ordenadas, inicio, fim), (novas, inicio_novas, fim_novas) = intervalos
+        candidatas = ordenadas[inicio:fim]
+        if fim_novas > inicio_novas:
+            candidatas = sorted(candidatas + novas[inicio_novas:fim_novas])
+        # nlargest é estável: no empate de peso fica a ordem alfabética das
+        # candidatas. A chave é o próprio dict, sem função Python por item
+        melhores = heapq.nlargest(k, candidatas, key=self._pesos.__getitem__)
+        return [c for c in melhores if self._pesos[c]]
+
+
+class AutocompletarIngredientes:
+    """Sugestões de ingredientes por prefixo, sem acento e sem caixa.
+
+    O peso de cada ingrediente é o número de receitas que o usam; a sugestão
+    mostra a grafia com que ele apareceu primeiro ("açúcar", não "acucar").
+    É atualizado pelo ``ReceitaRepository`` a cada escrita; uma receita
+    alterada só mexe nos ingredientes que entraram ou saíram dela.
+
+    Memória, medida com ``benchmarks/autocompletar.py``: cerca de 130 MB
+    por milhão de ingredientes distintos (chave, peso e posição na lista
+    ordenada), mais os ingredientes de cada receita, guardados para a remoção
+    (cerca de 220 MB por milhão de receitas de 8 ingredientes). 200 mil
+    receitas com 265 mil ingredientes distintos ocupam 76 MB.
+    """
+
+    def __init__(self):
+        self._prefixos = Prefixos()
+        # Grafia original, só quando difere da chave normalizada
+        self._exibicao: Dict[str, str] = {}
+        self._por_receita: Dict[int, Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+        self.carregado = False
+
+    def __len__(self) -> int:
+        return len(self._prefixos)
+
+    def _chaves(self, ingredientes: Iterable[str]) -> Tuple[str, ...]:
+        chaves = {}
+        for nome in ingredientes:
+            # intern: a chave de cada ingrediente é uma só string em todo o índice
+            chave = sys.intern(_normalizar(nome))
+            chaves.setdefault(chave, nome)
+        for chave, nome in chaves.items():
+            if nome != chave and chave not in self._exibicao:
+                self._exibicao[chave] = nome
+        return tuple(chaves)
+
+    def _somar(self, chaves: Iterable[str], delta: int) -> None:
+        for chave in chaves:
+            self._prefixos.somar(chave, delta)
+            if delta < 0 and chave not in self._prefixos:
+                self._exibicao.pop(chave, None)
+
+    def adicionar(self, receita) -> None:
+        with self._lock:
+            novas = self._chaves(receita.ingredientes)
+            antigas = self._por_receita.get(receita.id, ())
+            self._por_receita[receita.id] = novas
+            self._somar([c for c in antigas if c not in novas], -1)
+            self._somar([c for c in novas if c not in antigas], +1)
+
+    def remover(self, receita_id: int) -> None:
+        with self._lock:
+            self._somar(self._por_receita.pop(receita_id, ()), -1)
+
+    def reconstruir(self, receitas: Iterable) -> None:
+        with self._lock:
+            self.carregado = False
+            self._exibicao.clear()
+            self._por_receita.clear()
+            pesos: Dict[str, int] = {}
+            for receita in receitas:
+                chaves = self._por_receita[receita.id] = self._chaves(receita.ingredientes)
+                for chave in chaves:
+                    pesos[chave] = pesos.get(chave, 0) + 1
+            self._prefixos.reconstruir(pesos)
+            self.carregado = True
+
+    def buscar(self, prefixo: str, k: int = 10) -> List[Tuple[str, int]]:
+        """(nome, número de receitas) dos ``k`` ingredientes mais usados que começam com o prefixo."""
+        prefixo = normalizar(prefixo)
+        if not prefixo:
+            return []
+        with self._lock:
+            return [(self._exibicao.get(s.chave, s.chave), s.peso) for s in self._prefixos.buscar(prefixo, k)]
+
+
+class AutocompletarReceitas:
+    """Sugestões de receitas pelo começo do nome ou de qualquer palavra dele.
+
+    "Bolo de Chocolate" é encontrado por "bol" e por "choc" (palavras vazias
+    como "de" não iniciam sugestões). Cada palavra vira uma chave
+    ``sufixo do nome + SEPARADOR + id``, e quem casa pelo começo do nome pesa
+    mais que quem casa por uma palavra do meio; no empate, ordem alfabética.
+
+    Memória, medida com ``benchmarks/autocompletar.py``: cerca de 140 MB por
+    milhão de chaves, contando os nomes (200 mil nomes de 3 palavras geram
+    600 mil chaves e ocupam 84 MB).
+    """
+
+    def __init__(self):
+        self._prefixos = Prefixos()
+        self._nomes: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.carregado = False
+
+    def __len__(self) -> int:
+        return len(self._nomes)
+
+    @staticmethod
+    def _chaves(receita_id: int, nome: str) -> List[Tuple[str, int]]:
+        palavras = normalizar(nome).split()
+        return [
+            (' '.join(palavras[i:]) + SEPARADOR + str(receita_id), 2 if i == 0 else 1)
+            for i, palavra in enumerate(palavras)
+            if i == 0 or palavra not in PALAVRAS_VAZIAS
+        ]
+
+    def _remover(self, receita_id: int) -> None:
+        nome = self._nomes.pop(receita_id, None)
+        if nome is not None:
+            for chave, peso in self._chaves(receita_id, nome):
+                self._prefixos.somar(chave, -peso)
+
+    def adicionar(self, receita) -> None:
+        with self._lock:
+            if self._nomes.get(receita.id) == receita.nome:
+                return
+            self._remover(receita.id)
+            self._nomes[receita.id] = receita.nome
+            for chave, peso in self._chaves(receita.id, receita.nome):
+                self._prefixos.somar(chave, peso)
+
+    def remover(self, receita_id: int) -> None:
+        with self._lock:
+            self._remover(receita_id)
+
+    def reconstruir(self, receitas: Iterable) -> None:
+        with self._lock:
+            self.carregado = False
+            self._nomes.clear()
+            pesos: Dict[str, int] = {}
+            for receita in receitas:
+                self._nomes[receita.id] = receita.nome
+                pesos.update(self._chaves(receita.id, receita.nome))
+            self._prefixos.reconstruir(pesos)
+            self.carregado = True
+
+    def buscar(self, prefixo: str, k: int = 10) -> List[Tuple[int, str]]:
+        """(id, nome) das ``k`` receitas sugeridas para o prefixo, sem repetir receita."""
+        prefixo = normalizar(prefixo)
+        if not prefixo:
+            return []
+        with self._lock:
+            # Uma receita pode casar por mais de uma palavra ("pão de pão"):
+            # pede mais chaves até ter k receitas ou acabar o intervalo
+            pedidas = k * 2
+            while True:
+                sugestoes = self._prefixos.buscar(prefixo, pedidas)
+                ids = dict.fromkeys(int(s.chave.rsplit(SEPARADOR, 1)[1]) for s in sugestoes)
+                if len(ids) >= k or len(sugestoes) < pedidas:
+                    break
+                pedidas *= 2
+            return [(receita_id, self._nomes[receita_id]) for receita_id in list(ids)[:k]]
+
+
+autocompletar_ingredientes = AutocompletarIngredientes()
+autocompletar_receitas = AutocompletarReceitas()
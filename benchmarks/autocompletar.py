@@ -0,0 +1,137 @@
+"""Autocompletar: memória por milhão de chaves e latência por tamanho de prefixo.
+
+Monta, direto em memória (sem banco), os dois índices de ``autocompletar.py``:
+
+- ingredientes: ``--receitas`` receitas de 8 ingredientes sorteados (Zipf)
+  de um vocabulário de ``--vocabulario`` nomes sintéticos;
+- receitas: os nomes das mesmas receitas (3 palavras, 2 ou 3 chaves cada).
+
+Para cada um mostra o tempo de montagem, a memória alocada (tracemalloc,
+incluindo as strings das chaves) em MB por milhão de chaves, e a latência
+p50/p99 de ``buscar`` para prefixos de 1 a 5 letras: a primeira consulta de
+cada prefixo (que pode montar o top-k guardado) e as seguintes. Por fim, o
+custo de uma escrita (receita nova) com o índice montado.
+
+Uso:
+    python -m benchmarks.autocompletar [--receitas 200000] [--vocabulario 1000000]
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from itertools import accumulate
+from types import SimpleNamespace
+
+from autocompletar import AutocompletarIngredientes, AutocompletarReceitas, Prefixos
+from benchmarks.medicao import percentil
+from normalizacao import normalizar
+
+SILABAS = [c + v for c in 'bcdfgjlmnprstvz' for v in 'aeiou'] + ['ão', 'ça', 'nh', 'lh', 'ch']
+
+
+def palavra(aleatorio, minimo=2, maximo=4):
+    return ''.join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(minimo, maximo)))
+
+
+def catalogo(n, vocabulario, aleatorio):
+    nomes = list({palavra(aleatorio, 2, 5) for _ in range(vocabulario)})
+    # Pesos de Zipf: poucos ingredientes muito usados, uma cauda longa de raros
+    acumulados = list(accumulate(1 / (i + 1) for i in range(len(nomes))))
+    receitas = []
+    for i in range(n):
+        ingredientes = aleatorio.choices(nomes, cum_weights=acumulados, k=8)
+        nome = f'{palavra(aleatorio).capitalize()} de {palavra(aleatorio)} {palavra(aleatorio)}'
+        receitas.append(SimpleNamespace(id=i + 1, nome=nome, ingredientes=ingredientes))
+    return receitas
+
+
+def memoria_mb(construir):
+    # Montagem à parte: o tracemalloc deixa tudo mais lento
+    gc.collect()
+    tracemalloc.start()
+    objeto = construir()
+    memoria = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    del objeto
+    return memoria
+
+
+def latencias(buscar, prefixos_por_tamanho):
+    print(f'{"prefixo":<10}{"1ª p50 µs":>12}{"1ª p99 µs":>12}{"p50 µs":>10}{"p99 µs":>10}')
+    for tamanho, prefixos in prefixos_por_tamanho.items():
+        primeira, seguintes = [], []
+        for prefixo in prefixos:
+            for tempos in (primeira, seguintes, seguintes):
+                inicio = time.perf_counter()
+                buscar(prefixo, 10)
+                tempos.append((time.perf_counter() - inicio) * 1e6)
+        print(f'{f"{tamanho} letras":<10}{percentil(primeira, 50):>12.0f}{percentil(primeira, 99):>12.0f}'
+              f'{percentil(seguintes, 50):>10.0f}{percentil(seguintes, 99):>10.0f}')
+
+
+def copias(receitas):
+    # Strings novas, como as lidas do banco: as que o índice guarda entram na conta
+    for r in receitas:
+        yield SimpleNamespace(id=r.id, nome=r.nome.encode().decode(), ingredientes=[i.encode().decode() for i in r.ingredientes])
+
+
+def medir_prefixos(n, aleatorio):
+    semente = aleatorio.random()
+
+    def construir():
+        gerador = random.Random(semente)
+        prefixos = Prefixos()
+        prefixos.reconstruir({palavra(gerador, 2, 6): gerador.randint(1, 1000) for _ in range(n)})
+        return prefixos
+
+    memoria = memoria_mb(construir)
+    inicio = time.perf_counter()
+    prefixos = construir()
+    montagem = time.perf_counter() - inicio
+    print(f'\nPrefixos: {len(prefixos)} chaves, montagem {montagem:.1f} s, {memoria:.0f} MB '
+          f'({memoria / len(prefixos) * 1e6:.0f} MB por milhão de chaves)')
+    amostra = aleatorio.sample(prefixos._ordenadas, 300)
+    latencias(prefixos.buscar, {t: list({c[:t] for c in amostra}) for t in range(1, 6)})
+
+
+def medir(classe, receitas, aleatorio):
+    def construir():
+        indice = classe()
+        indice.reconstruir(copias(receitas))
+        return indice
+
+    memoria = memoria_mb(construir)
+    inicio = time.perf_counter()
+    indice = construir()
+    montagem = time.perf_counter() - inicio
+    chaves = len(indice._prefixos)
+
+    print(f'\n{classe.__name__}: {len(receitas)} receitas, {chaves} chaves, montagem {montagem:.1f} s, '
+          f'{memoria:.0f} MB ({memoria / chaves * 1e6:.0f} MB por milhão de chaves)')
+    if classe is AutocompletarIngredientes:
+        amostra = [r.ingredientes[0] for r in aleatorio.sample(receitas, 300)]
+    else:
+        amostra = [r.nome for r in aleatorio.sample(receitas, 300)]
+    latencias(indice.buscar, {t: list({normalizar(c)[:t] for c in amostra}) for t in range(1, 6)})
+
+    novas = catalogo(2000, 5000, aleatorio)
+    inicio = time.perf_counter()
+    for i, receita in enumerate(novas):
+        receita.id = len(receitas) + i + 1
+        indice.adicionar(receita)
+    print(f'escrita: {(time.perf_counter() - inicio) / len(novas) * 1e6:.0f} µs por receita nova')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--receitas', type=int, default=200_000)
+    parser.add_argument('--vocabulario', type=int, default=1_000_000)
+    parser.add_argument('--chaves', type=int, default=1_000_000)
+    argumentos = parser.parse_args()
+
+    aleatorio = random.Random(42)
+    medir_prefixos(argumentos.chaves, aleatorio)
+    receitas = catalogo(argumentos.receitas, argumentos.vocabulario, aleatorio)
+    for classe in (AutocompletarIngredientes, AutocompletarReceitas):
+        medir(classe, receitas, aleatorio)
@@ -0,0 +1,78 @@
+"""Latência da busca textual com um catálogo grande, por backend.
+
+Grava ``--n`` receitas sintéticas (nomes e ingredientes sorteados de um
+vocabulário fixo, com palavras comuns no modo de preparo) e mede o tempo de
+cada consulta no FTS5 e no índice em memória.
+
+Uso:
+    python -m benchmarks.busca [--n 100000] [--repeticoes 20]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_busca.db'
+)
+
+from busca import BuscaFTS5, BuscaMemoria, indice_busca  # noqa: E402
+from database import SessionLocal, create_db_and_tables  # noqa: E402
+from importacao import em_lotes  # noqa: E402
+from repositorio import ReceitaRepository  # noqa: E402
+from schema import BaseReceita  # noqa: E402
+
+PRATOS = ['bolo', 'torta', 'pudim', 'moqueca', 'farofa', 'cuscuz', 'pão', 'creme', 'sopa', 'salada']
+SABORES = ['chocolate', 'queijo', 'limão', 'frango', 'camarão', 'milho', 'abóbora', 'coco', 'banana', 'peixe']
+INGREDIENTES = [f'ingrediente {i}' for i in range(2000)] + ['sal', 'ovos', 'leite', 'açúcar', 'farinha', 'azeite de dendê']
+CONSULTAS = ['pao de queijo', 'moqeca de peixe', 'dende', 'chocolat', 'torta limao', 'misture', 'ingrediente 1234']
+
+
+def popular(n):
+    create_db_and_tables()
+    aleatorio = random.Random(42)
+    receitas = [
+        BaseReceita(
+            nome=f'{aleatorio.choice(PRATOS)} de {aleatorio.choice(SABORES)} {i}',
+            ingredientes=aleatorio.sample(INGREDIENTES, 6),
+            modo_de_preparo='Misture tudo, leve ao forno e sirva quente com ' + aleatorio.choice(SABORES),
+        )
+        for i in range(n)
+    ]
+    inicio = time.perf_counter()
+    with SessionLocal() as db:
+        repositorio = ReceitaRepository(db)
+        for lote in em_lotes(receitas, 5000):
+            repositorio.add_muitos(lote)
+    print(f'{n} receitas gravadas em {time.perf_counter() - inicio:.1f}s (gatilhos do FTS5 incluídos)')
+
+
+def medir(busca, db, repeticoes):
+    for consulta in CONSULTAS:
+        busca.buscar(db, consulta)
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            encontradas = busca.buscar(db, consulta)
+        ms = (time.perf_counter() - inicio) / repeticoes * 1000
+        print(f'{busca.nome:<10}{consulta:<20}{ms:>10.2f}{len(encontradas):>12}')
+
+
+def executar(n, repeticoes):
+    popular(n)
+    with SessionLocal() as db:
+        inicio = time.perf_counter()
+        indice_busca.reconstruir(ReceitaRepository(db).iterar())
+        print(f'índice em memória montado em {time.perf_counter() - inicio:.1f}s')
+
+        print(f'{"backend":<10}{"consulta":<20}{"ms":>10}{"resultados":>12}')
+        for busca in (BuscaFTS5(), BuscaMemoria()):
+            medir(busca, db, repeticoes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=100_000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    argumentos = parser.parse_args()
+    executar(argumentos.n, argumentos.repeticoes)
@@ -0,0 +1,435 @@
+"""Teste de carga de todas as rotas da API, com limites de regressão.
+
+Popula o banco com ``--volume`` receitas e usuários (1k, 100k ou 1m; um banco
+já populado em ``--banco`` é reaproveitado e só completado) e dispara
+``--requisicoes`` requisições concorrentes por rota, uma rota de cada vez,
+através do ``httpx.AsyncClient`` sobre o transporte ASGI e/ou contra um
+uvicorn local. Para cada rota reporta req/s, latência p50/p95/p99, comandos
+SQL por requisição e o pico de RSS do processo (cliente e servidor juntos).
+
+Os resultados vão para ``--saida`` em JSON; com ``--comparar`` a execução
+termina com código 1 se alguma rota piorar além de ``--tolerancia`` em
+relação ao arquivo base (ou se houver respostas com status inesperado).
+
+As configurações da API valem como de costume, por variáveis de ambiente:
+``CACHE_BACKEND=desligado`` mede sem o cache de respostas e um
+``SENHA_SCRYPT_N`` menor deixa as rotas de usuários mais rápidas.
+
+Uso:
+    python -m benchmarks.carga [--volume 1k] [--requisicoes 200] [--concorrencia 16]
+        [--alvo asgi uvicorn] [--saida carga.json] [--comparar base.json] [--tolerancia 0.25]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Banco próprio, a menos que --banco aponte outro (lido antes dos imports da API)
+_banco = next((sys.argv[i + 1] for i, a in enumerate(sys.argv[:-1]) if a == '--banco'), None)
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{_banco or tempfile.mkdtemp() + "/bench_carga.db"}'
+)
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi.routing import APIRoute  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.medicao import ContadorSQL, percentil, rss_pico_mb  # noqa: E402
+from database import SessionLocal, async_engine, create_db_and_tables, engine, engines_de_leitura  # noqa: E402
+from importacao import em_lotes  # noqa: E402
+from models import Receita, User  # noqa: E402
+from repositorio import ReceitaRepository  # noqa: E402
+from schema import BaseReceita  # noqa: E402
+
+VOLUMES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+SENHA = 'Senha123'
+
+PRATOS = ['bolo', 'torta', 'pudim', 'moqueca', 'farofa', 'cuscuz', 'pão', 'creme', 'sopa', 'salada']
+SABORES = ['chocolate', 'queijo', 'limão', 'frango', 'camarão', 'milho', 'abóbora', 'coco', 'banana', 'peixe']
+INGREDIENTES = [f'ingrediente {i}' for i in range(2000)] + ['sal', 'ovos', 'leite', 'açúcar', 'farinha', 'azeite de dendê']
+CONSULTAS = ['pao de queijo', 'moqeca de peixe', 'dende', 'chocolat', 'torta limao', 'ingrediente 1234']
+
+# 429/503 do controle de admissão: contadas à parte, fora das latências
+RECUSAS = {429, 503}
+
+# Um resultado piora quando req/s cai ou a latência sobe além da tolerância;
+# SQL por requisição tem folga absoluta pequena (o cache muda a contagem)
+FOLGA_SQL = 0.1
+
+
+def receita_sintetica(aleatorio: random.Random, nome: str) -> dict:
+    return {
+        'nome': nome,
+        'ingredientes': aleatorio.sample(INGREDIENTES, 6),
+        'modo_de_preparo': 'Misture tudo, leve ao forno e sirva quente com ' + aleatorio.choice(SABORES),
+    }
+
+
+def usuario_sintetico(nome: str) -> dict:
+    return {'nome_usuario': nome, 'email': f'{nome}@carga.com', 'senha': SENHA}
+
+
+async def popular(volume: int) -> None:
+    # 1. Receitas pelo repositório, para manter a busca e os índices em dia
+    create_db_and_tables()
+    aleatorio = random.Random(42)
+    inicio = time.perf_counter()
+    with SessionLocal() as db:
+        repositorio = ReceitaRepository(db)
+        # Todo o vocabulário já gravado: escritas concorrentes não disputam
+        # a criação dos mesmos ingredientes novos
+        repositorio._ids_ingredientes(INGREDIENTES)
+        existentes = len(repositorio)
+        for lote in em_lotes(range(existentes, volume), 5000):
+            repositorio.add_muitos([
+                BaseReceita(**receita_sintetica(
+                    aleatorio, f'{aleatorio.choice(PRATOS)} de {aleatorio.choice(SABORES)} {i}'
+                ))
+                for i in lote
+            ])
+
+        # 2. Usuários direto na tabela, todos com o mesmo hash (o scrypt de
+        #    cada um levaria horas em 1m de linhas e não é o que se mede aqui)
+        existentes = db.scalar(select(func.count()).select_from(User))
+        senha = await main.senhas.gerar_hash(SENHA)
+        for lote in em_lotes(range(existentes, volume), 10_000):
+            db.execute(insert(User), [
+                {'nome_usuario': f'semente_{i}', 'email': f'semente_{i}@carga.com', 'senha': senha}
+                for i in lote
+            ])
+        db.commit()
+    print(f'banco com {volume} receitas e usuários em {time.perf_counter() - inicio:.1f}s')
+
+
+@dataclass
+class Amostra:
+    """Linhas existentes sorteadas para as leituras, e os ids criados nas escritas."""
+
+    receitas: List[Tuple[int, str]]
+    usuarios: List[Tuple[int, str, str]]
+    ultima_receita: int
+    ultimo_usuario: int
+    receitas_criadas: Dict[int, int] = field(default_factory=dict)
+    usuarios_criados: Dict[int, int] = field(default_factory=dict)
+
+    @classmethod
+    def sortear(cls, tamanho: int = 1000) -> 'Amostra':
+        with SessionLocal() as db:
+            return cls(
+                receitas=db.execute(
+                    select(Receita.id, Receita.nome).order_by(func.random()).limit(tamanho)
+                ).all(),
+                usuarios=db.execute(
+                    select(User.id, User.nome_usuario, User.email).order_by(func.random()).limit(tamanho)
+                ).all(),
+                ultima_receita=db.scalar(select(func.max(Receita.id))),
+                ultimo_usuario=db.scalar(select(func.max(User.id))),
+            )
+
+
+# None: pula o índice (ex.: PUT de uma receita cujo POST foi recusado)
+Requisicao = Optional[Tuple[str, str, Dict[str, Any]]]
+
+
+@dataclass
+class Cenario:
+    metodo: str
+    rota: str
+    requisicao: Callable[[int], Requisicao]
+    status: int = 200
+    ao_responder: Optional[Callable[[int, httpx.Response], None]] = None
+
+    @property
+    def nome(self) -> str:
+        return f'{self.metodo} {self.rota}'
+
+
+def cenarios(amostra: Amostra, prefixo: str) -> List[Cenario]:
+    """Uma entrada por rota do ``main.py``: leituras primeiro, depois as escritas.
+
+    As escritas criam suas próprias linhas (nomes com ``prefixo``), e PUT e
+    DELETE agem sobre as criadas pelo POST, então as fases não se atrapalham.
+    """
+    aleatorio = random.Random(7)
+
+    def receita(i):
+        return amostra.receitas[i % len(amostra.receitas)]
+
+    def usuario(i):
+        return amostra.usuarios[i % len(amostra.usuarios)]
+
+    def guardar(destino):
+        def ao_responder(i, resposta):
+            if resposta.status_code == 201:
+                destino[i] = resposta.json()['id']
+        return ao_responder
+
+    def na_criada(destino, metodo, caminho, corpo=None):
+        # PUT/DELETE na linha criada pelo POST de mesmo índice, se ele passou
+        def requisicao(i):
+            if i not in destino:
+                return None
+            return metodo, caminho.format(destino[i]), {'json': corpo(i)} if corpo else {}
+        return requisicao
+
+    perto_do_fim_r = max(amostra.ultima_receita - 1000, 0)
+    perto_do_fim_u = max(amostra.ultimo_usuario - 1000, 0)
+
+    return [
+        # Leituras de receitas
+        Cenario('GET', '/receitas', lambda i: ('GET', '/receitas', {'params': {'after': receita(i)[0]}})),
+        Cenario('GET', '/receitas?ids', lambda i: ('GET', '/receitas', {
+            'params': {'ids': ','.join(str(receita(i + j)[0]) for j in range(50))},
+        })),
+        Cenario('GET', '/receitas/compativeis', lambda i: ('GET', '/receitas/compativeis', {
+            'params': {'despensa': aleatorio.sample(INGREDIENTES, 8)},
+        })),
+        Cenario('GET', '/receitas/search', lambda i: ('GET', '/receitas/search', {
+            'params': {'q': CONSULTAS[i % len(CONSULTAS)]},
+        })),
+        Cenario('GET', '/receitas/export', lambda i: ('GET', '/receitas/export', {'params': {'after': perto_do_fim_r}})),
+        Cenario('GET', '/receitas/{receita_id}', lambda i: ('GET', f'/receitas/{receita(i)[0]}', {})),
+        # Autocompletar: prefixos de 1 a 4 letras, como a cada tecla
+        Cenario('GET', '/autocomplete/ingredientes', lambda i: ('GET', '/autocomplete/ingredientes', {
+            'params': {'prefix': INGREDIENTES[i % len(INGREDIENTES)][:i % 4 + 1]},
+        })),
+        Cenario('GET', '/autocomplete/receitas', lambda i: ('GET', '/autocomplete/receitas', {
+            'params': {'prefix': receita(i)[1][:i % 4 + 1]},
+        })),
+        Cenario('GET', '/receitas/{receita_id}/similares', lambda i: ('GET', f'/receitas/{receita(i)[0]}/similares', {})),
+        Cenario('GET', '/receitas/nome/{receita_nome}', lambda i: ('GET', f'/receitas/nome/{receita(i)[1]}', {})),
+        # Leituras de usuários
+        Cenario('GET', '/usuarios', lambda i: ('GET', '/usuarios', {'params': {'after': usuario(i)[0]}})),
+        Cenario('GET', '/usuarios?ids', lambda i: ('GET', '/usuarios', {
+            'params': {'ids': ','.join(str(usuario(i + j)[0]) for j in range(50))},
+        })),
+        Cenario('GET', '/usuarios/export', lambda i: ('GET', '/usuarios/export', {'params': {'after': perto_do_fim_u}})),
+        Cenario('GET', '/usuarios/{id}', lambda i: ('GET', f'/usuarios/{usuario(i)[0]}', {})),
+        Cenario('GET', '/usuarios/nome/{nome_usuario}', lambda i: ('GET', f'/usuarios/nome/{usuario(i)[1]}', {})),
+        # Registro de alterações: uma página do começo (sincronização completa)
+        Cenario('GET', '/changes', lambda i: ('GET', '/changes', {'params': {'since': i % 1000}})),
+        Cenario('GET', '/stats', lambda i: ('GET', '/stats', {})),
+        Cenario('GET', '/metrics', lambda i: ('GET', '/metrics', {})),
+        Cenario('GET', '/ready', lambda i: ('GET', '/ready', {})),
+        Cenario('POST', '/usuarios/login', lambda i: ('POST', '/usuarios/login', {
+            'json': {'email': usuario(i)[2], 'senha': SENHA},
+        })),
+        # Escritas de receitas
+        Cenario('POST', '/receitas', lambda i: ('POST', '/receitas', {
+            'json': receita_sintetica(aleatorio, f'{prefixo} {i}'),
+        }), status=201, ao_responder=guardar(amostra.receitas_criadas)),
+        Cenario('PUT', '/receitas/{receita_id}', na_criada(
+            amostra.receitas_criadas, 'PUT', '/receitas/{}', lambda i: receita_sintetica(aleatorio, f'{prefixo} {i} v2'),
+        )),
+        Cenario('DELETE', '/receitas/{receita_id}', na_criada(amostra.receitas_criadas, 'DELETE', '/receitas/{}')),
+        Cenario('POST', '/receitas/bulk', lambda i: ('POST', '/receitas/bulk', {
+            'json': [receita_sintetica(aleatorio, f'{prefixo} lote {i} {j}') for j in range(10)],
+        })),
+        # Escritas de usuários
+        Cenario('POST', '/usuarios', lambda i: ('POST', '/usuarios', {
+            'json': usuario_sintetico(f'{prefixo}_{i}'),
+        }), status=201, ao_responder=guardar(amostra.usuarios_criados)),
+        Cenario('PUT', '/usuarios/{id}', na_criada(
+            amostra.usuarios_criados, 'PUT', '/usuarios/{}', lambda i: usuario_sintetico(f'{prefixo}_{i}_v2'),
+        )),
+        Cenario('DELETE', '/usuarios/{id}', na_criada(amostra.usuarios_criados, 'DELETE', '/usuarios/{}')),
+        Cenario('POST', '/usuarios/bulk', lambda i: ('POST', '/usuarios/bulk', {
+            'json': [usuario_sintetico(f'{prefixo}_lote_{i}_{j}') for j in range(10)],
+        })),
+    ]
+
+
+def rotas_sem_cenario(lista: List[Cenario]) -> List[str]:
+    cobertas = {cenario.nome for cenario in lista}
+    return sorted(
+        f'{metodo} {rota.path}'
+        for rota in main.app.routes if isinstance(rota, APIRoute)
+        for metodo in rota.methods
+        if f'{metodo} {rota.path}' not in cobertas
+    )
+
+
+async def fase(client, cenario: Cenario, n: int, concorrencia: int, contador: ContadorSQL) -> dict:
+    latencias, inesperados = [], {}
+    recusadas = 0
+    pendentes = iter(range(n))
+
+    async def trabalhador():
+        nonlocal recusadas
+        # Os trabalhadores dividem o mesmo iterador: cada índice sai uma vez
+        for i in pendentes:
+            requisicao = cenario.requisicao(i)
+            if requisicao is None:
+                continue
+            metodo, caminho, opcoes = requisicao
+            inicio = time.perf_counter()
+            resposta = await client.request(metodo, caminho, **opcoes)
+            if resposta.status_code in RECUSAS:
+                recusadas += 1
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code != cenario.status:
+                inesperados[resposta.status_code] = inesperados.get(resposta.status_code, 0) + 1
+            if cenario.ao_responder:
+                cenario.ao_responder(i, resposta)
+
+    sql_antes = contador.total
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    atendidas = max(len(latencias), 1)
+    return {
+        'req_s': len(latencias) / duracao,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'sql_por_req': (contador.total - sql_antes) / atendidas,
+        'rss_pico_mb': rss_pico_mb(),
+        'recusadas': recusadas,
+        'status_inesperados': {str(status): total for status, total in sorted(inesperados.items())},
+    }
+
+
+async def executar_cenarios(client, alvo, n, concorrencia, contador) -> Dict[str, dict]:
+    lista = cenarios(Amostra.sortear(), f'carga_{alvo}_{int(time.time()) % 100_000}')
+
+    # Uma requisição de cada leitura antes de medir (monta os índices em memória)
+    for cenario in lista:
+        if cenario.metodo == 'GET':
+            metodo, caminho, opcoes = cenario.requisicao(0)
+            await client.request(metodo, caminho, **opcoes)
+
+    resultados = {}
+    print(f'\n[{alvo}] {n} requisições por rota, {concorrencia} concorrentes')
+    print(f'{"rota":<36}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"SQL/req":>9}{"recus.":>7}{"erros":>7}')
+    for cenario in lista:
+        resultado = await fase(client, cenario, n, concorrencia, contador)
+        resultados[cenario.nome] = resultado
+        print(f'{cenario.nome:<36}{resultado["req_s"]:>9.1f}{resultado["p50_ms"]:>9.2f}'
+              f'{resultado["p95_ms"]:>9.2f}{resultado["p99_ms"]:>9.2f}'
+              f'{resultado["sql_por_req"]:>9.2f}{resultado["recusadas"]:>7}'
+              f'{sum(resultado["status_inesperados"].values()):>7}')
+    return resultados
+
+
+async def via_asgi(n, concorrencia, contador):
+    # O transporte ASGI não roda o lifespan: aqui ele roda em volta das fases,
+    # e no fim fecha as conexões assíncronas (presas a este event loop)
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://carga') as client:
+            return await executar_cenarios(client, 'asgi', n, concorrencia, contador)
+
+
+async def via_uvicorn(n, concorrencia, contador):
+    # Servidor em outra thread (com o próprio event loop) e porta livre do SO
+    servidor = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=0, log_level='warning'))
+    thread = threading.Thread(target=servidor.run, daemon=True)
+    thread.start()
+    while not servidor.started:
+        await asyncio.sleep(0.05)
+    porta = servidor.servers[0].sockets[0].getsockname()[1]
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    try:
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{porta}', limits=limites, timeout=60) as client:
+            return await executar_cenarios(client, 'uvicorn', n, concorrencia, contador)
+    finally:
+        servidor.should_exit = True
+        thread.join()
+
+
+def regressoes(atual: dict, base: dict, tolerancia: float) -> List[str]:
+    encontradas = []
+    for alvo, rotas in atual['resultados'].items():
+        for rota, novo in rotas.items():
+            antigo = base.get('resultados', {}).get(alvo, {}).get(rota)
+            if antigo is None:
+                continue
+            if novo['req_s'] < antigo['req_s'] * (1 - tolerancia):
+                encontradas.append(f'{alvo} {rota}: req/s {antigo["req_s"]:.1f} -> {novo["req_s"]:.1f}')
+            for metrica in ('p95_ms', 'p99_ms'):
+                if novo[metrica] > antigo[metrica] * (1 + tolerancia):
+                    encontradas.append(f'{alvo} {rota}: {metrica} {antigo[metrica]:.2f} -> {novo[metrica]:.2f}')
+            if novo['sql_por_req'] > antigo['sql_por_req'] + FOLGA_SQL:
+                encontradas.append(
+                    f'{alvo} {rota}: SQL/req {antigo["sql_por_req"]:.2f} -> {novo["sql_por_req"]:.2f}'
+                )
+    if 'rss_pico_mb' in base and atual['rss_pico_mb'] > base['rss_pico_mb'] * (1 + tolerancia):
+        encontradas.append(f'RSS de pico {base["rss_pico_mb"]:.0f} MB -> {atual["rss_pico_mb"]:.0f} MB')
+    return encontradas
+
+
+async def executar(argumentos) -> int:
+    volume = VOLUMES[argumentos.volume]
+    await popular(volume)
+
+    contador = ContadorSQL(engine, async_engine.sync_engine, *(e.sync_engine for e in engines_de_leitura))
+    resultados = {}
+    for alvo in argumentos.alvo:
+        executor = via_asgi if alvo == 'asgi' else via_uvicorn
+        resultados[alvo] = await executor(argumentos.requisicoes, argumentos.concorrencia, contador)
+
+    lista = cenarios(Amostra([(0, '')], [(0, '', '')], 0, 0), '')
+    sem_cenario = rotas_sem_cenario(lista)
+    if sem_cenario:
+        print('\nrotas sem cenário (não medidas):', ', '.join(sem_cenario))
+
+    relatorio = {
+        'execucao': {
+            'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'volume': argumentos.volume,
+            'requisicoes': argumentos.requisicoes,
+            'concorrencia': argumentos.concorrencia,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'cache': main.settings.CACHE_BACKEND,
+            'rotas_sem_cenario': sem_cenario,
+        },
+        'rss_pico_mb': rss_pico_mb(),
+        'resultados': resultados,
+    }
+    print(f'\nRSS de pico: {relatorio["rss_pico_mb"]:.0f} MB')
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        print(f'resultados gravados em {argumentos.saida}')
+
+    falhas = [
+        f'{alvo} {rota}: status inesperados {r["status_inesperados"]}'
+        for alvo, rotas in resultados.items() for rota, r in rotas.items()
+        if r['status_inesperados']
+    ]
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding='utf-8') as arquivo:
+            falhas += regressoes(relatorio, json.load(arquivo), argumentos.tolerancia)
+    if falhas:
+        print('\nFALHOU:')
+        for falha in falhas:
+            print(f'  {falha}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--volume', choices=VOLUMES, default='1k')
+    parser.add_argument('--requisicoes', type=int, default=200, help='requisições por rota')
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--alvo', nargs='+', choices=['asgi', 'uvicorn'], default=['asgi', 'uvicorn'])
+    parser.add_argument('--banco', help='arquivo SQLite a reaproveitar entre execuções')
+    parser.add_argument('--saida', help='arquivo JSON com os resultados')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior usada como base')
+    parser.add_argument('--tolerancia', type=float, default=0.25)
+    sys.exit(asyncio.run(executar(parser.parse_args())))
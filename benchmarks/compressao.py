@@ -0,0 +1,68 @@
+"""Bytes e CPU de compressão das listagens, por codificação, com e sem cache.
+
+Para cada codificação disponível (gzip sempre; br e zstd com os pacotes
+brotli e zstandard) lê ``/receitas`` e ``/usuarios`` com ``limit=1000``
+``--repeticoes`` vezes pelo transporte ASGI e reporta o tamanho do corpo, a
+razão de compressão, o tempo de CPU do processo na primeira leitura (que
+comprime e guarda) e a média das repetidas, servidas já comprimidas do
+cache de respostas.
+
+A exportação NDJSON é medida à parte: comprimida em fluxo a cada leitura.
+
+Uso:
+    python -m benchmarks.compressao [--volume 1k] [--repeticoes 50]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_compressao.db'
+)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.carga import VOLUMES, popular  # noqa: E402
+from compressao import DISPONIVEIS  # noqa: E402
+
+ROTAS = ['/receitas?limit=1000', '/usuarios?limit=1000', '/receitas/export']
+
+
+async def medir(client, rota, codificacao, repeticoes):
+    cabecalhos = {'Accept-Encoding': codificacao}
+    leituras = []
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        async with client.stream('GET', rota, headers=cabecalhos) as response:
+            corpo = b''.join([pedaco async for pedaco in response.aiter_raw()])
+        leituras.append((time.process_time() - inicio) * 1000)
+        assert response.headers.get('content-encoding', 'identity') == codificacao, rota
+    return len(corpo), leituras[0], sum(leituras[1:]) / max(len(leituras) - 1, 1)
+
+
+async def executar(volume, repeticoes):
+    await popular(VOLUMES[volume])
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            print(f'{"rota":<24}{"codificação":<13}{"bytes":>10}{"razão":>8}{"1ª leitura":>14}{"repetidas":>14}')
+            for rota in ROTAS:
+                original = None
+                for codificacao in ['identity', *DISPONIVEIS]:
+                    tamanho, primeira, repetidas = await medir(client, rota, codificacao, repeticoes)
+                    original = original or tamanho
+                    print(
+                        f'{rota:<24}{codificacao:<13}{tamanho:>10}{original / tamanho:>7.1f}x'
+                        f'{primeira:>11.2f} ms{repetidas:>11.2f} ms'
+                    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--volume', choices=VOLUMES, default='1k')
+    parser.add_argument('--repeticoes', type=int, default=50)
+    argumentos = parser.parse_args()
+    asyncio.run(executar(argumentos.volume, argumentos.repeticoes))
@@ -0,0 +1,98 @@
+"""Comandos SQL por requisição nas escritas de usuários, antes e depois.
+
+"antes" reproduz o fluxo antigo (SELECT de conferência + INSERT/UPDATE/DELETE +
+refresh); "depois" chama as rotas atuais, que usam a restrição unique e
+INSERT/UPDATE/DELETE ... RETURNING.
+
+Uso:
+    python -m benchmarks.escritas_usuarios [--n 200]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_escritas.db'
+)
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from benchmarks.medicao import ContadorSQL  # noqa: E402
+from database import AsyncSessionLocal, async_engine, create_db_and_tables  # noqa: E402
+from main import app  # noqa: E402
+from models import User  # noqa: E402
+
+
+async def antes_criar(dados):
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(User).where(User.email == dados['email'])):
+            return None
+        usuario = User(**dados)
+        db.add(usuario)
+        await db.commit()
+        await db.refresh(usuario)
+        return usuario.id
+
+
+async def antes_atualizar(id, dados):
+    async with AsyncSessionLocal() as db:
+        usuario = await db.scalar(select(User).where(User.id == id))
+        await db.scalar(select(User).where(User.email == dados['email'], User.id != id))
+        usuario.nome_usuario = dados['nome_usuario']
+        usuario.email = dados['email']
+        await db.commit()
+        await db.refresh(usuario)
+
+
+async def antes_deletar(id):
+    async with AsyncSessionLocal() as db:
+        usuario = await db.scalar(select(User).where(User.id == id))
+        await db.delete(usuario)
+        await db.commit()
+
+
+def dados(prefixo, i):
+    return {'nome_usuario': f'{prefixo}{i}', 'email': f'{prefixo}{i}@bench.com', 'senha': 'Senha123'}
+
+
+async def medir(nome, n, operacao, contador, resultados):
+    inicio_sql, inicio = contador.total, time.perf_counter()
+    for i in range(n):
+        await operacao(i)
+    duracao = time.perf_counter() - inicio
+    resultados.append((nome, (contador.total - inicio_sql) / n, duracao / n * 1000))
+
+
+async def executar(n):
+    create_db_and_tables()
+    contador = ContadorSQL(async_engine.sync_engine)
+    resultados = []
+
+    ids = []
+    async def criar_antes(i):
+        ids.append(await antes_criar(dados('antes', i)))
+    await medir('antes  POST', n, criar_antes, contador, resultados)
+    await medir('antes  PUT', n, lambda i: antes_atualizar(ids[i], dados('antes_novo', i)), contador, resultados)
+    await medir('antes  DELETE', n, lambda i: antes_deletar(ids[i]), contador, resultados)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        ids = []
+        async def criar_depois(i):
+            ids.append((await client.post('/usuarios', json=dados('depois', i))).json()['id'])
+        await medir('depois POST', n, criar_depois, contador, resultados)
+        await medir('depois PUT', n, lambda i: client.put(f'/usuarios/{ids[i]}', json=dados('depois_novo', i)), contador, resultados)
+        await medir('depois DELETE', n, lambda i: client.delete(f'/usuarios/{ids[i]}'), contador, resultados)
+
+    print(f'{"operação":<15}{"SQL/req":>10}{"ms/req":>10}')
+    for nome, comandos, ms in resultados:
+        print(f'{nome:<15}{comandos:>10.1f}{ms:>10.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200)
+    asyncio.run(executar(parser.parse_args().n))
@@ -0,0 +1,138 @@
+"""Estatísticas do catálogo: agregados mantidos na escrita contra consultas ad hoc.
+
+Grava ``--n`` receitas sintéticas (6 ingredientes de um vocabulário de
+2000) e ``--usuarios`` usuários cadastrados ao longo de um ano, e compara,
+por atualização do painel:
+
+- ad hoc: contagem de receitas e usuários, média de ingredientes, top-10
+  ingredientes e cadastros por dia, varrendo as tabelas de origem;
+- agregados: ``estatisticas.ler`` (o que o GET /stats executa).
+
+Mede também a reconciliação completa e o custo dos agregados em cada
+escrita (POST de uma receita pelo repositório, com e sem eles).
+
+Uso:
+    python -m benchmarks.estatisticas [--n 100000] [--usuarios 100000] [--repeticoes 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import distinct, func, insert, select
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_estatisticas.db'
+)
+
+import repositorio  # noqa: E402
+from benchmarks.medicao import percentil  # noqa: E402
+from database import AsyncSessionLocal, SessionLocal, async_engine, create_db_and_tables  # noqa: E402
+from estatisticas import ler, reconciliar  # noqa: E402
+from importacao import em_lotes  # noqa: E402
+from models import Ingrediente, Receita, ReceitaIngrediente, User  # noqa: E402
+from schema import BaseReceita  # noqa: E402
+
+INGREDIENTES = [f'ingrediente {i}' for i in range(2000)]
+
+
+def popular(n, usuarios):
+    create_db_and_tables()
+    aleatorio = random.Random(42)
+    receitas = [
+        BaseReceita(nome=f'receita {i}', ingredientes=aleatorio.sample(INGREDIENTES, 6), modo_de_preparo='Misture.')
+        for i in range(n)
+    ]
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    inicio = time.perf_counter()
+    with SessionLocal() as db:
+        for lote in em_lotes(receitas, 5000):
+            repositorio.ReceitaRepository(db).add_muitos(lote)
+        # Usuários direto na tabela: os cadastros por dia vêm da reconciliação
+        for lote in em_lotes(list(range(usuarios)), 5000):
+            db.execute(insert(User), [
+                {'nome_usuario': f'u{i}', 'email': f'u{i}@email.com', 'senha': 'x',
+                 'created_at': agora - timedelta(days=aleatorio.random() * 365)}
+                for i in lote
+            ])
+        db.commit()
+    print(f'{n} receitas e {usuarios} usuários gravados em {time.perf_counter() - inicio:.1f}s')
+
+
+def ad_hoc(db):
+    receitas = db.scalar(select(func.count()).select_from(Receita))
+    usuarios = db.scalar(select(func.count()).select_from(User))
+    itens = db.scalar(select(func.count()).select_from(ReceitaIngrediente))
+    top = db.execute(
+        select(Ingrediente.nome, func.count(distinct(ReceitaIngrediente.receita_id)).label('n'))
+        .join(Ingrediente)
+        .group_by(Ingrediente.nome)
+        .order_by(func.count(distinct(ReceitaIngrediente.receita_id)).desc())
+        .limit(10)
+    ).all()
+    dia = func.date(User.created_at)
+    por_dia = db.execute(select(dia, func.count()).group_by(dia).order_by(dia)).all()
+    return receitas, usuarios, itens / receitas, top, por_dia
+
+
+async def medir_agregados(repeticoes):
+    tempos = []
+    async with AsyncSessionLocal() as db:
+        await ler(db, 10, 366)
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            await ler(db, 10, 366)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        inicio = time.perf_counter()
+        corrigidos = await reconciliar(db)
+        reconciliacao = time.perf_counter() - inicio
+    await async_engine.dispose()
+    return tempos, reconciliacao, corrigidos
+
+
+def medir_escritas(n):
+    aleatorio = random.Random(7)
+    tempos = []
+    with SessionLocal() as db:
+        for i in range(n):
+            dados = BaseReceita(nome=f'escrita {i} {time.time_ns()}', ingredientes=aleatorio.sample(INGREDIENTES, 6), modo_de_preparo='Misture.')
+            inicio = time.perf_counter()
+            repositorio.ReceitaRepository(db).add(dados)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def executar(n, usuarios, repeticoes):
+    popular(n, usuarios)
+
+    tempos = []
+    with SessionLocal() as db:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            ad_hoc(db)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    agregados, reconciliacao, corrigidos = asyncio.run(medir_agregados(repeticoes))
+
+    print(f'{"leitura":<12}{"p50 ms":>10}{"p99 ms":>10}')
+    print(f'{"ad hoc":<12}{percentil(tempos, 50):>10.2f}{percentil(tempos, 99):>10.2f}')
+    print(f'{"agregados":<12}{percentil(agregados, 50):>10.2f}{percentil(agregados, 99):>10.2f}')
+    print(f'reconciliação: {reconciliacao:.2f}s ({corrigidos} valores corrigidos: os cadastros inseridos por fora)')
+
+    com = medir_escritas(200)
+    aplicar, repositorio.aplicar = repositorio.aplicar, lambda db, variacao: None
+    sem = medir_escritas(200)
+    repositorio.aplicar = aplicar
+    print(f'escrita (POST /receitas): p50 {percentil(com, 50):.2f} ms com agregados, '
+          f'{percentil(sem, 50):.2f} ms sem')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=100_000)
+    parser.add_argument('--usuarios', type=int, default=100_000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    argumentos = parser.parse_args()
+    executar(argumentos.n, argumentos.usuarios, argumentos.repeticoes)
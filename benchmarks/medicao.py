@@ -0,0 +1,32 @@
+"""Medições compartilhadas pelos benchmarks: comandos SQL, percentis e memória."""
+import math
+import resource
+import sys
+from typing import Sequence
+
+from sqlalchemy import event
+
+
+class ContadorSQL:
+    def __init__(self, *engines):
+        self.total = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+
+def percentil(valores: Sequence[float], p: float) -> float:
+    # Método "nearest rank": sempre um valor observado, sem interpolação
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = max(math.ceil(p / 100 * len(ordenados)), 1)
+    return ordenados[posicao - 1]
+
+
+def rss_pico_mb() -> float:
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == 'darwin' else 1024)
@@ -0,0 +1,123 @@
+"""Tempo de import e tempo até a primeira requisição rápida, com e sem aquecimento.
+
+Mede em processos novos (um worker frio de verdade):
+
+- o tempo de ``import main`` (mediana de ``--repeticoes`` execuções);
+- um uvicorn subindo com ``AQUECER_ROTAS`` ligado e desligado: quanto leva
+  para aceitar conexões, a pior latência da primeira rodada de leituras e o
+  tempo desde o início do processo até uma rodada inteira ficar abaixo de
+  ``--limiar-ms``.
+
+As leituras usam parâmetros diferentes dos do aquecimento, então não são
+respondidas pelo cache preenchido na partida.
+
+Uso:
+    python -m benchmarks.partida [--volume 1k] [--limiar-ms 20] [--repeticoes 5]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_partida.db'
+)
+
+import httpx  # noqa: E402
+
+from benchmarks.carga import VOLUMES, popular  # noqa: E402
+
+LEITURAS = [
+    '/receitas?limit=20&after=3',
+    '/receitas/2',
+    '/receitas/compativeis?despensa=ovos&despensa=leite&despensa=farinha',
+    '/receitas/search?q=bolo+chocolate',
+    '/usuarios?limit=20&after=3',
+    '/usuarios/2',
+    '/usuarios/nome/semente_5',
+]
+
+MEDIR_IMPORT = (
+    'import time; inicio = time.perf_counter(); import main; '
+    'print(time.perf_counter() - inicio)'
+)
+
+
+def tempo_de_import(repeticoes):
+    tempos = [
+        float(subprocess.run(
+            [sys.executable, '-c', MEDIR_IMPORT], capture_output=True, text=True, check=True,
+        ).stdout)
+        for _ in range(repeticoes)
+    ]
+    return statistics.median(tempos) * 1000
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rodada(client):
+    latencias = []
+    for caminho in LEITURAS:
+        inicio = time.perf_counter()
+        client.get(caminho).raise_for_status()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return max(latencias)
+
+
+def partida(aquecer, limiar_ms, tempo_maximo=120):
+    porta = porta_livre()
+    ambiente = dict(os.environ, AQUECER_ROTAS=str(aquecer).lower())
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(porta), '--log-level', 'warning'],
+        env=ambiente,
+    )
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{porta}', timeout=60) as client:
+            # 1. Até aceitar conexões (o uvicorn só escuta depois do lifespan)
+            while True:
+                try:
+                    client.get('/ready').raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    if time.perf_counter() - inicio > tempo_maximo:
+                        raise
+                    time.sleep(0.01)
+            pronto = (time.perf_counter() - inicio) * 1000
+
+            # 2. Rodadas de leituras até todas ficarem abaixo do limiar
+            primeira = pior = rodada(client)
+            while pior > limiar_ms and time.perf_counter() - inicio < tempo_maximo:
+                pior = rodada(client)
+            rapida = (time.perf_counter() - inicio) * 1000
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    return pronto, primeira, rapida
+
+
+def executar(volume, limiar_ms, repeticoes):
+    asyncio.run(popular(VOLUMES[volume]))
+    print(f'import main: {tempo_de_import(repeticoes):.0f} ms (mediana de {repeticoes})')
+    print(f'{"aquecimento":<13}{"aceita conexões":>17}{"1ª rodada (pior)":>18}{"até rodada rápida":>19}')
+    for aquecer in (False, True):
+        pronto, primeira, rapida = partida(aquecer, limiar_ms)
+        print(f'{"ligado" if aquecer else "desligado":<13}{pronto:>14.0f} ms{primeira:>15.1f} ms{rapida:>16.0f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--volume', choices=VOLUMES, default='1k')
+    parser.add_argument('--limiar-ms', type=float, default=20)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    argumentos = parser.parse_args()
+    executar(argumentos.volume, argumentos.limiar_ms, argumentos.repeticoes)
@@ -0,0 +1,83 @@
+"""Cadastros por segundo em função do tamanho do pool de senhas.
+
+Dispara ``--n`` POST /usuarios concorrentes para cada combinação de executor
+(thread/processo) e número de workers, e mede também o maior atraso do event
+loop durante a rajada (um loop travado pelo scrypt apareceria aqui).
+
+Uso:
+    python -m benchmarks.senhas [--n 64] [--workers 1 2 4 8]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_senhas.db'
+)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from database import create_db_and_tables, settings  # noqa: E402
+from senhas import ServicoDeSenhas  # noqa: E402
+
+
+async def atraso_maximo(parar: asyncio.Event, intervalo: float = 0.005) -> float:
+    maior = 0.0
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        maior = max(maior, time.perf_counter() - inicio - intervalo)
+    return maior
+
+
+async def rajada(client, prefixo, n):
+    parar = asyncio.Event()
+    monitor = asyncio.create_task(atraso_maximo(parar))
+    inicio = time.perf_counter()
+    respostas = await asyncio.gather(*(
+        client.post('/usuarios', json={
+            'nome_usuario': f'{prefixo}_{i}',
+            'email': f'{prefixo}_{i}@bench.com',
+            'senha': 'Senha123',
+        })
+        for i in range(n)
+    ))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    assert all(r.status_code == 201 for r in respostas), {r.status_code for r in respostas}
+    return n / duracao, await monitor * 1000
+
+
+async def executar(n, lista_workers):
+    create_db_and_tables()
+    print(f'scrypt n={settings.SENHA_SCRYPT_N} r={settings.SENHA_SCRYPT_R} p={settings.SENHA_SCRYPT_P}, '
+          f'{n} cadastros concorrentes, {os.cpu_count()} CPUs')
+    print(f'{"executor":<10}{"workers":>8}{"cadastros/s":>13}{"atraso máx. do loop (ms)":>27}')
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for executor in ('thread', 'processo'):
+            for workers in lista_workers:
+                main.senhas = ServicoDeSenhas(
+                    n=settings.SENHA_SCRYPT_N,
+                    r=settings.SENHA_SCRYPT_R,
+                    p=settings.SENHA_SCRYPT_P,
+                    workers=workers,
+                    fila_maxima=n,
+                    executor=executor,
+                )
+                # Aquece o pool (no executor de processos, sobe os workers)
+                await asyncio.gather(*(main.senhas.gerar_hash('Senha123') for _ in range(workers)))
+                por_segundo, atraso = await rajada(client, f'{executor}{workers}', n)
+                main.senhas.fechar()
+                print(f'{executor:<10}{workers:>8}{por_segundo:>13.1f}{atraso:>27.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    argumentos = parser.parse_args()
+    asyncio.run(executar(argumentos.n, argumentos.workers))
@@ -0,0 +1,111 @@
+"""CPU por requisição nas listagens, com e sem o caminho pré-serializado.
+
+"antes" carrega objetos ORM e deixa o FastAPI revalidá-los contra o
+``response_model`` (``from_attributes``, ``EmailStr``...); "depois" lê só as
+colunas do schema, monta os modelos com ``model_construct`` e devolve uma
+``RespostaJSON`` gerada por ``TypeAdapter.dump_json``. O cache de respostas não
+participa: as rotas são montadas em um app próprio.
+
+Uso:
+    python -m benchmarks.serializacao [--n 300] [--tamanho 100]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault(
+    'DATABASE_URL', f'sqlite:///{tempfile.mkdtemp()}/bench_serializacao.db'
+)
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import insert, select  # noqa: E402
+
+from database import SessionLocal, create_db_and_tables  # noqa: E402
+from models import User  # noqa: E402
+from repositorio import ReceitaRepository  # noqa: E402
+from schema import BaseReceita, Receita, UsuarioPublic  # noqa: E402
+from serializacao import RespostaJSON, colunas, construir  # noqa: E402
+
+
+def popular(tamanho):
+    create_db_and_tables()
+    with SessionLocal() as db:
+        ReceitaRepository(db).add_muitos([
+            BaseReceita(
+                nome=f'Receita de teste {i}',
+                ingredientes=['farinha', 'ovos', 'leite', 'açúcar', f'especial {i}'],
+                modo_de_preparo='Misture tudo e leve ao forno por 40 minutos.',
+            )
+            for i in range(tamanho)
+        ])
+        db.execute(insert(User), [
+            {'nome_usuario': f'bench{i}', 'email': f'bench{i}@example.com', 'senha': 'Senha123'}
+            for i in range(tamanho)
+        ])
+        db.commit()
+
+
+def montar_app(tamanho):
+    app = FastAPI()
+
+    @app.get('/receitas/antes', response_model=List[Receita])
+    def receitas_antes():
+        with SessionLocal() as db:
+            return ReceitaRepository(db).listar(limit=tamanho)
+
+    @app.get('/receitas/depois', response_model=List[Receita], response_class=RespostaJSON)
+    def receitas_depois():
+        with SessionLocal() as db:
+            itens = ReceitaRepository(db).listar_schemas(limit=tamanho)
+        return RespostaJSON.de(List[Receita], itens, validar=False)
+
+    @app.get('/usuarios/antes', response_model=List[UsuarioPublic])
+    def usuarios_antes():
+        with SessionLocal() as db:
+            return db.scalars(select(User).order_by(User.id).limit(tamanho)).all()
+
+    @app.get('/usuarios/depois', response_model=List[UsuarioPublic], response_class=RespostaJSON)
+    def usuarios_depois():
+        with SessionLocal() as db:
+            linhas = db.execute(select(*colunas(UsuarioPublic, User)).order_by(User.id).limit(tamanho))
+            usuarios = construir(UsuarioPublic, linhas.mappings())
+        return RespostaJSON.de(List[UsuarioPublic], usuarios, validar=False)
+
+    return app
+
+
+async def medir(client, rota, n):
+    await client.get(rota)
+    inicio_cpu, inicio = time.process_time(), time.perf_counter()
+    for _ in range(n):
+        response = await client.get(rota)
+    cpu = (time.process_time() - inicio_cpu) / n * 1000
+    parede = (time.perf_counter() - inicio) / n * 1000
+    return cpu, parede, response.json()
+
+
+async def executar(n, tamanho):
+    popular(tamanho)
+    transport = httpx.ASGITransport(app=montar_app(tamanho))
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        print(f'{tamanho} itens por página, {n} requisições')
+        print(f'{"rota":<18}{"CPU ms/req":>12}{"ms/req":>10}{"redução":>10}')
+        for recurso in ('receitas', 'usuarios'):
+            antes = await medir(client, f'/{recurso}/antes', n)
+            depois = await medir(client, f'/{recurso}/depois', n)
+            # Os dois caminhos precisam gerar exatamente o mesmo corpo
+            assert antes[2] == depois[2]
+            print(f'{"/" + recurso + "/antes":<18}{antes[0]:>12.3f}{antes[1]:>10.3f}')
+            print(f'{"/" + recurso + "/depois":<18}{depois[0]:>12.3f}{depois[1]:>10.3f}{1 - depois[0] / antes[0]:>10.0%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=300)
+    parser.add_argument('--tamanho', type=int, default=100)
+    argumentos = parser.parse_args()
+    asyncio.run(executar(argumentos.n, argumentos.tamanho))
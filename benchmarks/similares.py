@@ -0,0 +1,110 @@
+"""Receitas similares: MinHash/LSH contra a força bruta, em recall e latência.
+
+Gera ``--n`` receitas sintéticas em famílias (uma receita base de 8
+ingredientes e variações que trocam de 1 a 4 deles, sobre um vocabulário de
+2000 ingredientes) direto no índice, sem banco. Para ``--consultas`` receitas
+sorteadas compara as ``--k`` mais similares do índice com as da força bruta
+(Jaccard contra todo o catálogo), para cada configuração de bandas x linhas:
+
+- recall@k: fração das k do índice com similaridade no nível das k exatas
+  (empates na k-ésima posição contam como acerto);
+- latência p50/p95 por consulta;
+- tempo de montagem e memória que o índice mantém alocada (tracemalloc).
+
+Uso:
+    python -m benchmarks.similares [--n 100000] [--consultas 200] [--k 10]
+"""
+import argparse
+import heapq
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from benchmarks.medicao import percentil
+from similares import IndiceSimilares
+
+VOCABULARIO = [f'ingrediente {i}' for i in range(2000)]
+CONFIGURACOES = [(8, 2), (16, 2), (32, 2), (16, 3), (32, 1)]
+
+
+def catalogo(n, aleatorio):
+    receitas = []
+    while len(receitas) < n:
+        base = aleatorio.sample(VOCABULARIO, 8)
+        for _ in range(aleatorio.randint(1, 10)):
+            variacao = list(base)
+            for posicao in aleatorio.sample(range(8), aleatorio.randint(1, 4)):
+                variacao[posicao] = aleatorio.choice(VOCABULARIO)
+            receitas.append(SimpleNamespace(id=len(receitas) + 1, ingredientes=variacao))
+    return receitas[:n]
+
+
+def forca_bruta(receitas, conjuntos, receita_id, k):
+    consulta = conjuntos[receita_id]
+    return heapq.nlargest(k, (
+        len(consulta & conjuntos[r.id]) / len(consulta | conjuntos[r.id])
+        for r in receitas if r.id != receita_id
+    ))
+
+
+def medir_forca_bruta(receitas, consultas, k):
+    conjuntos = {r.id: set(r.ingredientes) for r in receitas}
+    tempos, exatas = [], {}
+    for receita_id in consultas:
+        inicio = time.perf_counter()
+        exatas[receita_id] = forca_bruta(receitas, conjuntos, receita_id, k)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos, exatas
+
+
+def medir_indice(receitas, consultas, exatas, k, bandas, linhas):
+    # A memória é medida numa segunda montagem: o tracemalloc deixa tudo mais lento
+    tracemalloc.start()
+    indice = IndiceSimilares(bandas, linhas)
+    indice.reconstruir(receitas)
+    memoria = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    del indice
+
+    inicio = time.perf_counter()
+    indice = IndiceSimilares(bandas, linhas)
+    indice.reconstruir(receitas)
+    montagem = time.perf_counter() - inicio
+
+    tempos, acertos, total = [], 0, 0
+    for receita_id in consultas:
+        inicio = time.perf_counter()
+        encontradas = indice.similares(receita_id, k)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        esperadas = [s for s in exatas[receita_id] if s > 0]
+        if esperadas:
+            acertos += sum(1 for s in encontradas[:len(esperadas)] if s.similaridade >= esperadas[-1])
+            total += len(esperadas)
+    return tempos, acertos / max(total, 1), montagem, memoria
+
+
+def executar(n, n_consultas, k):
+    aleatorio = random.Random(42)
+    receitas = catalogo(n, aleatorio)
+    consultas = [r.id for r in aleatorio.sample(receitas, n_consultas)]
+
+    tempos, exatas = medir_forca_bruta(receitas, consultas, k)
+    print(f'{n} receitas, {n_consultas} consultas, k={k}')
+    print(f'{"método":<22}{"recall@k":>9}{"p50 ms":>10}{"p95 ms":>10}{"montagem s":>12}{"memória MB":>12}')
+    print(f'{"força bruta":<22}{1:>9.3f}{percentil(tempos, 50):>10.2f}{percentil(tempos, 95):>10.2f}{"-":>12}{"-":>12}')
+    for bandas, linhas in CONFIGURACOES:
+        tempos, recall, montagem, memoria = medir_indice(receitas, consultas, exatas, k, bandas, linhas)
+        print(
+            f'{f"LSH {bandas} bandas x {linhas}":<22}{recall:>9.3f}{percentil(tempos, 50):>10.2f}'
+            f'{percentil(tempos, 95):>10.2f}{montagem:>12.1f}{memoria:>12.1f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=100_000)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    argumentos = parser.parse_args()
+    executar(argumentos.n, argumentos.consultas, argumentos.k)
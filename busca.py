@@ -0,0 +1,432 @@
+import heapq
+import math
+import re
+import sqlite3
+import threading
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from normalizacao import normalizar
+
+# Peso de cada campo na relevância (nome > ingredientes > modo de preparo)
+PESO_NOME = 3.0
+PESO_INGREDIENTES = 2.0
+PESO_PREPARO = 1.0
+
+# Similaridade mínima (trigramas) para um termo valer como erro de digitação
+SIMILARIDADE_MINIMA = 0.4
+# Quantos termos do vocabulário cada palavra da consulta pode virar
+EXPANSOES_POR_PALAVRA = 5
+# Termos com mais receitas que isso só pontuam candidatos já encontrados
+LIMIAR_TERMO_COMUM = 2000
+# Receitas pontuadas quando a consulta só tem termos comuns (índice em memória)
+MAXIMO_CANDIDATOS = 5000
+
+PALAVRAS_VAZIAS = frozenset({
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'no', 'na',
+    'nos', 'nas', 'com', 'por', 'para', 'um', 'uma', 'ao', 'aos', 'ou', 'se', 'que',
+})
+
+_PALAVRA = re.compile(r'\w+')
+
+
+class Encontrada(NamedTuple):
+    receita_id: int
+    relevancia: float
+
+
+def palavras(texto: str) -> List[str]:
+    return _PALAVRA.findall(normalizar(texto))
+
+
+def palavras_da_consulta(consulta: str) -> List[str]:
+    # Sem as palavras vazias, a menos que a consulta só tenha elas
+    todas = list(dict.fromkeys(palavras(consulta)))
+    return [p for p in todas if p not in PALAVRAS_VAZIAS] or todas
+
+
+def trigramas(palavra: str) -> Set[str]:
+    marcada = f' {palavra} '
+    return {marcada[i:i + 3] for i in range(len(marcada) - 2)}
+
+
+def similaridade(a: str, b: str) -> float:
+    ta, tb = trigramas(a), trigramas(b)
+    return len(ta & tb) / len(ta | tb)
+
+
+def expandir(palavra: str, candidatos: Iterable[str]) -> List[Tuple[str, float]]:
+    """Termos do vocabulário que a palavra pode representar, com um peso.
+
+    O próprio termo vale 1; termos que começam com a palavra (busca parcial,
+    "queij" -> "queijo") valem 0.9; os demais valem a similaridade de
+    trigramas, se passarem de ``SIMILARIDADE_MINIMA`` ("moqeca" -> "moqueca").
+    """
+    termos = []
+    for termo in candidatos:
+        if termo in PALAVRAS_VAZIAS and termo != palavra:
+            continue
+        if termo == palavra:
+            peso = 1.0
+        elif len(palavra) >= 3 and termo.startswith(palavra):
+            peso = 0.9
+        else:
+            peso = similaridade(palavra, termo)
+            if peso < SIMILARIDADE_MINIMA:
+                continue
+        termos.append((termo, peso))
+    return heapq.nlargest(EXPANSOES_POR_PALAVRA, termos, key=lambda t: (t[1], t[0]))
+
+
+class IndiceBusca:
+    """Índice invertido de palavras em memória, com correção por trigramas.
+
+    Usado quando o banco não tem busca textual (ver ``BuscaMemoria``). Cada
+    palavra aponta para as receitas que a contêm, com o peso do campo mais
+    relevante em que aparece; o vocabulário é indexado por trigramas para
+    corrigir erros de digitação sem percorrer todas as palavras.
+    """
+
+    def __init__(self):
+        self._receitas_por_termo: Dict[str, Dict[int, float]] = {}
+        self._termos_por_receita: Dict[int, Tuple[str, ...]] = {}
+        self._termos_por_trigrama: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.carregado = False
+
+    def __len__(self) -> int:
+        return len(self._termos_por_receita)
+
+    def _remover(self, receita_id: int) -> None:
+        for termo in self._termos_por_receita.pop(receita_id, ()):
+            receitas = self._receitas_por_termo[termo]
+            del receitas[receita_id]
+            if not receitas:
+                del self._receitas_por_termo[termo]
+                for trigrama in trigramas(termo):
+                    termos = self._termos_por_trigrama[trigrama]
+                    termos.discard(termo)
+                    if not termos:
+                        del self._termos_por_trigrama[trigrama]
+
+    def _adicionar(self, receita) -> None:
+        self._remover(receita.id)
+        pesos: Dict[str, float] = {}
+        campos = (
+            (receita.nome, PESO_NOME),
+            (' '.join(receita.ingredientes), PESO_INGREDIENTES),
+            (receita.modo_de_preparo, PESO_PREPARO),
+        )
+        for texto, peso in campos:
+            for termo in palavras(texto):
+                if pesos.get(termo, 0) < peso:
+                    pesos[termo] = peso
+
+        self._termos_por_receita[receita.id] = tuple(pesos)
+        for termo, peso in pesos.items():
+            receitas = self._receitas_por_termo.get(termo)
+            if receitas is None:
+                receitas = self._receitas_por_termo[termo] = {}
+                for trigrama in trigramas(termo):
+                    self._termos_por_trigrama.setdefault(trigrama, set()).add(termo)
+            receitas[receita.id] = peso
+
+    def adicionar(self, receita) -> None:
+        with self._lock:
+            self._adicionar(receita)
+
+    def remover(self, receita_id: int) -> None:
+        with self._lock:
+            self._remover(receita_id)
+
+    def reconstruir(self, receitas: Iterable) -> None:
+        with self._lock:
+            self.carregado = False
+            self._receitas_por_termo.clear()
+            self._termos_por_receita.clear()
+            self._termos_por_trigrama.clear()
+            for receita in receitas:
+                self._adicionar(receita)
+            self.carregado = True
+
+    def _candidatos(self, palavra: str) -> Set[str]:
+        # Termos que compartilham algum trigrama com a palavra
+        vazio: Set[str] = set()
+        return vazio.union(*(self._termos_por_trigrama.get(t, vazio) for t in trigramas(palavra)))
+
+    def buscar(self, consulta: str, limite: int = 20) -> List[Encontrada]:
+        with self._lock:
+            total = len(self._termos_por_receita) or 1
+            grupos = []
+            for palavra in palavras_da_consulta(consulta):
+                termos = expandir(palavra, self._candidatos(palavra))
+                if termos:
+                    grupos.append(termos)
+
+            # Termos raros primeiro: eles definem os candidatos
+            grupos.sort(key=lambda termos: min(len(self._receitas_por_termo[t]) for t, _ in termos))
+            pontos: Dict[int, float] = {}
+            for termos in grupos:
+                melhor: Dict[int, float] = {}
+                for termo, similar in termos:
+                    receitas = self._receitas_por_termo[termo]
+                    idf = math.log(1 + total / len(receitas))
+                    if pontos and len(receitas) > LIMIAR_TERMO_COMUM:
+                        # Termo comum: só reforça quem já é candidato
+                        alvo = ((r, receitas[r]) for r in pontos if r in receitas)
+                    elif not pontos and len(receitas) > MAXIMO_CANDIDATOS:
+                        # Consulta só com termos comuns: limita os candidatos
+                        alvo = islice(receitas.items(), MAXIMO_CANDIDATOS)
+                    else:
+                        alvo = receitas.items()
+                    for receita_id, peso in alvo:
+                        valor = similar * peso * idf
+                        if melhor.get(receita_id, 0) < valor:
+                            melhor[receita_id] = valor
+                # Cada palavra da consulta conta uma vez por receita
+                for receita_id, valor in melhor.items():
+                    pontos[receita_id] = pontos.get(receita_id, 0) + valor
+
+        return [
+            Encontrada(receita_id, round(valor, 4))
+            for receita_id, valor in heapq.nlargest(limite, pontos.items(), key=lambda p: (p[1], -p[0]))
+        ]
+
+
+indice_busca = IndiceBusca()
+
+
+class BuscaMemoria:
+    """Busca pelo ``IndiceBusca``, que o repositório mantém como os demais
+    índices em memória; não cria nada no banco."""
+
+    nome = 'memoria'
+
+    def instalar(self, conexao: Connection) -> None:
+        pass
+
+    def buscar(self, db: Session, consulta: str, limite: int = 20) -> List[Encontrada]:
+        return indice_busca.buscar(consulta, limite)
+
+
+def _ids(sql: str):
+    return text(sql).bindparams(bindparam('ids', expanding=True))
+
+
+class BuscaFTS5:
+    """Busca com uma tabela FTS5 do SQLite.
+
+    ``receitas_busca`` usa o id da receita como rowid e é reescrita pelo
+    repositório, na mesma transação da escrita, com ``indexar``/``remover``
+    (um comando por lote, não um gatilho por ingrediente: nas importações em
+    lote os gatilhos deixavam a gravação várias vezes mais lenta). Erros de
+    digitação são tratados expandindo cada palavra com o vocabulário da
+    própria tabela (``fts5vocab``) antes do MATCH.
+    """
+
+    nome = 'fts5'
+
+    DDL = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS receitas_busca USING fts5("
+        "nome, ingredientes, modo_de_preparo, tokenize='unicode61 remove_diacritics 2')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS receitas_busca_vocab USING fts5vocab(receitas_busca, 'row')",
+    ]
+
+    _DOCUMENTOS = (
+        "SELECT r.id, r.nome, coalesce(group_concat(i.nome, ' '), ''), r.modo_de_preparo "
+        "FROM receitas r "
+        "LEFT JOIN receita_ingredientes ri ON ri.receita_id = r.id "
+        "LEFT JOIN ingredientes i ON i.id = ri.ingrediente_id "
+    )
+
+    @staticmethod
+    def disponivel() -> bool:
+        # Mesma biblioteca SQLite usada pelo pysqlite e pelo aiosqlite
+        with sqlite3.connect(':memory:') as conexao:
+            opcoes = {linha[0] for linha in conexao.execute('PRAGMA compile_options')}
+        return 'ENABLE_FTS5' in opcoes
+
+    def instalar(self, conexao: Connection) -> None:
+        existia = conexao.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'receitas_busca'"
+        ).first() is not None
+        for comando in self.DDL:
+            conexao.exec_driver_sql(comando)
+        if not existia:
+            # Receitas gravadas antes da busca existir
+            conexao.exec_driver_sql(
+                "INSERT INTO receitas_busca (rowid, nome, ingredientes, modo_de_preparo) "
+                + self._DOCUMENTOS + "GROUP BY r.id"
+            )
+
+    def indexar(self, db: Session, ids: List[int]) -> None:
+        self.remover(db, ids)
+        db.execute(
+            _ids(
+                "INSERT INTO receitas_busca (rowid, nome, ingredientes, modo_de_preparo) "
+                + self._DOCUMENTOS + "WHERE r.id IN :ids GROUP BY r.id"
+            ),
+            {'ids': ids},
+        )
+
+    def remover(self, db: Session, ids: List[int]) -> None:
+        db.execute(_ids("DELETE FROM receitas_busca WHERE rowid IN :ids"), {'ids': ids})
+
+    def _termos(self, db: Session, palavra: str) -> List[Tuple[str, float, int]]:
+        # Só o trecho do vocabulário com o mesmo início: a consulta usa o
+        # índice do fts5vocab e erros nas duas primeiras letras não são corrigidos
+        inicio = palavra[:2] if len(palavra) >= 4 else palavra
+        documentos = dict(db.execute(
+            text("SELECT term, doc FROM receitas_busca_vocab WHERE term >= :inicio AND term < :fim"),
+            {'inicio': inicio, 'fim': inicio + '\U0010ffff'},
+        ).all())
+        return [(termo, peso, documentos[termo]) for termo, peso in expandir(palavra, documentos)]
+
+    def _consultar(self, db: Session, expressao: str, limite: int, ranquear: bool, exceto=()) -> List[Encontrada]:
+        limite += len(exceto)
+        if not ranquear:
+            # Todos os termos estão em mais da metade das receitas: o idf do
+            # bm25 é zero e ordenar dezenas de milhares de linhas não muda nada
+            linhas = db.execute(
+                text("SELECT rowid, 0.0 FROM receitas_busca WHERE receitas_busca MATCH :expressao LIMIT :limite"),
+                {'expressao': expressao, 'limite': limite},
+            )
+        else:
+            linhas = db.execute(
+                text(
+                    "SELECT rowid, bm25(receitas_busca, :nome, :ingredientes, :preparo) AS pontos "
+                    "FROM receitas_busca WHERE receitas_busca MATCH :expressao "
+                    "ORDER BY pontos, rowid LIMIT :limite"
+                ),
+                {
+                    'expressao': expressao,
+                    'nome': PESO_NOME,
+                    'ingredientes': PESO_INGREDIENTES,
+                    'preparo': PESO_PREPARO,
+                    'limite': limite,
+                },
+            )
+        # bm25 é negativo (menor é melhor); a API devolve maior = mais relevante
+        return [Encontrada(receita_id, round(-pontos, 4) or 0.0) for receita_id, pontos in linhas if receita_id not in exceto]
+
+    def buscar(self, db: Session, consulta: str, limite: int = 20) -> List[Encontrada]:
+        grupos = [t for t in (self._termos(db, p) for p in palavras_da_consulta(consulta)) if t]
+        if not grupos:
+            return []
+
+        # Palavras comuns só restringem o resultado se não houver palavras raras
+        raros = [g for g in grupos if min(docs for _, _, docs in g) <= LIMIAR_TERMO_COMUM]
+        grupos = raros or grupos
+        # Maior id como aproximação do total (count(*) percorreria a tabela)
+        total = db.execute(text("SELECT max(id) FROM receitas")).scalar() or 0
+        ranquear = any(docs <= total / 2 for grupo in grupos for _, _, docs in grupo)
+
+        # Termos vêm do vocabulário (só letras e dígitos), mas vão entre aspas
+        disjuncoes = ['(' + ' OR '.join(f'"{termo}"' for termo, _, _ in grupo) + ')' for grupo in grupos]
+        # 1. Receitas com todas as palavras; 2. se faltar, com qualquer uma
+        encontradas = self._consultar(db, ' AND '.join(disjuncoes), limite, ranquear)
+        if len(encontradas) < limite and len(disjuncoes) > 1:
+            vistas = {e.receita_id for e in encontradas}
+            encontradas += self._consultar(db, ' OR '.join(disjuncoes), limite - len(encontradas), ranquear, vistas)
+        return encontradas
+
+
+class BuscaPostgres:
+    """Busca com ``tsvector`` e ``pg_trgm`` no PostgreSQL.
+
+    ``receitas_busca`` guarda o nome sem acentos e um ``tsvector`` com pesos
+    A/B/C (nome, ingredientes, modo de preparo), reescritos pelo repositório
+    na mesma transação da escrita. O ``tsvector`` cobre palavras e prefixos;
+    ``word_similarity`` sobre o nome cobre erros de digitação.
+    """
+
+    nome = 'postgres'
+
+    DDL = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE EXTENSION IF NOT EXISTS unaccent",
+        "CREATE TABLE IF NOT EXISTS receitas_busca ("
+        " receita_id integer PRIMARY KEY REFERENCES receitas (id) ON DELETE CASCADE,"
+        " nome text NOT NULL,"
+        " documento tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_receitas_busca_documento ON receitas_busca USING gin (documento)",
+        "CREATE INDEX IF NOT EXISTS ix_receitas_busca_nome ON receitas_busca USING gin (nome gin_trgm_ops)",
+    ]
+
+    _DOCUMENTOS = (
+        "SELECT r.id, unaccent(lower(r.nome)), "
+        "setweight(to_tsvector('simple', unaccent(lower(r.nome))), 'A') "
+        "|| setweight(to_tsvector('simple', unaccent(lower(coalesce(string_agg(i.nome, ' '), '')))), 'B') "
+        "|| setweight(to_tsvector('simple', unaccent(lower(r.modo_de_preparo))), 'C') "
+        "FROM receitas r "
+        "LEFT JOIN receita_ingredientes ri ON ri.receita_id = r.id "
+        "LEFT JOIN ingredientes i ON i.id = ri.ingrediente_id "
+    )
+
+    def instalar(self, conexao: Connection) -> None:
+        for comando in self.DDL:
+            conexao.exec_driver_sql(comando)
+        # Receitas gravadas antes da busca existir
+        conexao.exec_driver_sql(
+            "INSERT INTO receitas_busca (receita_id, nome, documento) "
+            + self._DOCUMENTOS
+            + "WHERE NOT EXISTS (SELECT 1 FROM receitas_busca b WHERE b.receita_id = r.id) GROUP BY r.id"
+        )
+
+    def indexar(self, db: Session, ids: List[int]) -> None:
+        self.remover(db, ids)
+        db.execute(
+            _ids(
+                "INSERT INTO receitas_busca (receita_id, nome, documento) "
+                + self._DOCUMENTOS + "WHERE r.id IN :ids GROUP BY r.id"
+            ),
+            {'ids': ids},
+        )
+
+    def remover(self, db: Session, ids: List[int]) -> None:
+        db.execute(_ids("DELETE FROM receitas_busca WHERE receita_id IN :ids"), {'ids': ids})
+
+    def _consultar(self, db: Session, texto: str, expressao: str, limite: int) -> List[Encontrada]:
+        linhas = db.execute(
+            text(
+                "SELECT receita_id, ts_rank(documento, q) + word_similarity(:texto, nome) AS pontos "
+                "FROM receitas_busca, to_tsquery('simple', :expressao) q "
+                "WHERE documento @@ q OR :texto <% nome "
+                "ORDER BY pontos DESC, receita_id LIMIT :limite"
+            ),
+            {'texto': texto, 'expressao': expressao, 'limite': limite},
+        )
+        return [Encontrada(receita_id, round(pontos, 4)) for receita_id, pontos in linhas]
+
+    def buscar(self, db: Session, consulta: str, limite: int = 20) -> List[Encontrada]:
+        todas = palavras_da_consulta(consulta)
+        if not todas:
+            return []
+        texto = ' '.join(todas)
+        # Cada palavra também casa como prefixo ("queij" -> "queijo")
+        prefixos = [f'{palavra}:*' for palavra in todas]
+        # 1. Receitas com todas as palavras; 2. se faltar, com qualquer uma
+        encontradas = self._consultar(db, texto, ' & '.join(prefixos), limite)
+        if len(encontradas) < limite and len(prefixos) > 1:
+            vistas = {e.receita_id for e in encontradas}
+            encontradas += [
+                e for e in self._consultar(db, texto, ' | '.join(prefixos), limite + len(vistas))
+                if e.receita_id not in vistas
+            ][:limite - len(encontradas)]
+        return encontradas
+
+
+def escolher_busca(engine: Engine, preferencia: str = 'auto'):
+    """Backend de busca para o banco: FTS5, PostgreSQL ou o índice em memória."""
+    if preferencia == 'memoria':
+        return BuscaMemoria()
+    dialeto = engine.dialect.name
+    if dialeto == 'postgresql':
+        return BuscaPostgres()
+    if dialeto == 'sqlite' and BuscaFTS5.disponivel():
+        return BuscaFTS5()
+    return BuscaMemoria()
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from compressao import Compressao, servidas_do_cache
+from serializacao import RespostaJSON
+
+
+@dataclass
+class Entrada:
+    """Resposta pré-serializada: corpo JSON, ETag forte e cabeçalhos extras."""
+
+    corpo: bytes
+    etag: str
+    cabecalhos: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def criar(cls, corpo: bytes, cabecalhos: Optional[Dict[str, str]] = None) -> 'Entrada':
+        etag = '"' + hashlib.blake2b(corpo, digest_size=16).hexdigest() + '"'
+        return cls(corpo, etag, cabecalhos or {})
+
+    def para_bytes(self) -> bytes:
+        meta = json.dumps({'etag': self.etag, 'cabecalhos': self.cabecalhos})
+        return meta.encode() + b'\n' + self.corpo
+
+    @classmethod
+    def de_bytes(cls, dados: bytes) -> 'Entrada':
+        meta, corpo = dados.split(b'\n', 1)
+        meta = json.loads(meta)
+        return cls(corpo, meta['etag'], meta['cabecalhos'])
+
+
+class CacheMemoria:
+    """LRU limitado por número de entradas, com expiração por TTL."""
+
+    def __init__(self, max_entradas: int = 1024, ttl: float = 60):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self._contadores: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._entradas.get(chave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira < time.monotonic():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return valor
+
+    def set(self, chave: str, valor: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entradas[chave] = (time.monotonic() + (self.ttl if ttl is None else ttl), valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def delete(self, *chaves: str) -> None:
+        with self._lock:
+            for chave in chaves:
+                self._entradas.pop(chave, None)
+
+    def versao(self, grupo: str) -> int:
+        return self._contadores.get(grupo, 0)
+
+    def nova_versao(self, grupo: str) -> None:
+        with self._lock:
+            self._contadores[grupo] = self._contadores.get(grupo, 0) + 1
+
+
+class CacheRedis:
+    """Backend compartilhado entre workers, sobre um cliente compatível com Redis.
+
+    Usa apenas ``get``, ``set(ex=...)``, ``delete`` e ``incr``, então qualquer
+    cliente com essa interface (inclusive um falso, nos testes) serve.
+    """
+
+    def __init__(self, cliente, ttl: float = 60, prefixo: str = 'api-receitas:'):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefixo = prefixo
+
+    @classmethod
+    def a_partir_da_url(cls, url: str, ttl: float = 60) -> 'CacheRedis':
+        import redis
+
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def get(self, chave: str) -> Optional[bytes]:
+        return self.cliente.get(self.prefixo + chave)
+
+    def set(self, chave: str, valor: bytes, ttl: Optional[float] = None) -> None:
+        self.cliente.set(self.prefixo + chave, valor, ex=max(1, math.ceil(self.ttl if ttl is None else ttl)))
+
+    def delete(self, *chaves: str) -> None:
+        if chaves:
+            self.cliente.delete(*(self.prefixo + chave for chave in chaves))
+
+    def versao(self, grupo: str) -> int:
+        return int(self.cliente.get(self.prefixo + 'versao:' + grupo) or 0)
+
+    def nova_versao(self, grupo: str) -> None:
+        self.cliente.incr(self.prefixo + 'versao:' + grupo)
+
+
+class SemCache:
+    """Não guarda nada; as respostas ainda levam ETag e respondem 304."""
+
+    def get(self, chave: str) -> Optional[bytes]:
+        return None
+
+    def set(self, chave: str, valor: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    def delete(self, *chaves: str) -> None:
+        pass
+
+    def versao(self, grupo: str) -> int:
+        return 0
+
+    def nova_versao(self, grupo: str) -> None:
+        pass
+
+
+# Invalidações contadas em faixas fixas de chaves (memória limitada; uma
+# colisão só faz uma leitura deixar de gravar)
+FAIXAS_DE_GERACAO = 1024
+
+
+# Instante (epoch) da última invalidação, visto por todos os workers do backend
+ULTIMA_INVALIDACAO = 'ultima_invalidacao'
+
+
+def _geracao(chave: str) -> str:
+    # crc32, não hash(): a faixa precisa ser a mesma em todos os workers
+    return f'geracao:{zlib.crc32(chave.encode()) % FAIXAS_DE_GERACAO}'
+
+
+def _etag_confere(request: Request, *etags: str) -> bool:
+    cabecalho = request.headers.get('if-none-match')
+    if not cabecalho:
+        return False
+    if cabecalho.strip() == '*':
+        return True
+    # If-None-Match usa comparação fraca: ignora o prefixo W/
+    return any(valor.strip().removeprefix('W/') in etags for valor in cabecalho.split(','))
+
+
+def etag_codificado(etag: str, codificacao: str) -> str:
+    # Cada representação comprimida tem seu próprio ETag forte
+    return etag[:-1] + '-' + codificacao + '"'
+
+
+class CacheDeRespostas:
+    """Cache de respostas GET com ETag e GET condicional.
+
+    As rotas passam uma chave e uma função que produz a ``Entrada``; a
+    função só é chamada quando a chave não está no cache. Escritas removem as
+    chaves afetadas com ``invalidar`` e, para listagens, trocam a versão do
+    grupo com ``nova_versao`` (as páginas antigas deixam de ser encontradas
+    e expiram pelo TTL/LRU). Uma entrada produzida antes de uma invalidação
+    da sua chave não é gravada depois dela.
+
+    Com ``janela_replicas``, o lido de uma réplica (``de_replica``) não é
+    gravado até ``janela_replicas`` segundos depois de qualquer invalidação,
+    de qualquer worker: a réplica pode ainda não ter a escrita.
+
+    Com ``compressao``, o corpo vai na codificação negociada. A versão
+    comprimida fica no backend sob o ETag e a codificação, então leituras
+    repetidas da mesma versão não gastam CPU comprimindo.
+    """
+
+    def __init__(self, backend, compressao: Optional[Compressao] = None, janela_replicas: float = 0):
+        self.backend = backend
+        self.compressao = compressao
+        self.janela_replicas = janela_replicas
+
+    @classmethod
+    def a_partir_de(cls, settings) -> 'CacheDeRespostas':
+        compressao = Compressao.a_partir_de(settings)
+        # O pool só de leitura (sem DATABASE_REPLICAS) nunca está atrasado
+        janela = settings.DATABASE_LEITURA_APOS_ESCRITA if settings.DATABASE_REPLICAS else 0
+        if settings.CACHE_BACKEND == 'redis':
+            backend = CacheRedis.a_partir_da_url(settings.REDIS_URL, settings.CACHE_TTL)
+        elif settings.CACHE_BACKEND == 'memoria':
+            backend = CacheMemoria(settings.CACHE_MAX_ENTRADAS, settings.CACHE_TTL)
+        else:
+            backend = SemCache()
+        return cls(backend, compressao, janela)
+
+    def chave_versionada(self, grupo: str, *partes) -> str:
+        return ':'.join([grupo, f'v{self.backend.versao(grupo)}', *map(str, partes)])
+
+    def responder(
+        self, request: Request, chave: str, produzir: Callable[[], Entrada], de_replica: bool = False
+    ) -> Response:
+        dados = self.backend.get(chave)
+        if dados is not None:
+            return self._resposta(request, Entrada.de_bytes(dados))
+        geracao = self.backend.versao(_geracao(chave))
+        entrada = produzir()
+        self._guardar(chave, entrada, geracao, de_replica)
+        return self._resposta(request, entrada)
+
+    async def responder_async(
+        self, request: Request, chave: str, produzir: Callable[[], Awaitable[Entrada]], de_replica: bool = False
+    ) -> Response:
+        dados = self.backend.get(chave)
+        if dados is not None:
+            return self._resposta(request, Entrada.de_bytes(dados))
+        geracao = self.backend.versao(_geracao(chave))
+        entrada = await produzir()
+        self._guardar(chave, entrada, geracao, de_replica)
+        return self._resposta(request, entrada)
+
+    def _guardar(self, chave: str, entrada: Entrada, geracao: int, de_replica: bool) -> None:
+        # Lido de uma réplica logo depois de uma escrita (aqui ou em outro
+        # worker): responde com ETag, mas não grava (dados possivelmente atrasados)
+        if de_replica and self._invalidou_ha_pouco():
+            return
+        # Uma invalidação depois de ``geracao`` pode ter vindo de uma escrita
+        # que ``produzir`` não viu: não grava, e se ela cair entre a conferência
+        # e o set, a segunda conferência apaga o que foi gravado
+        if self.backend.versao(_geracao(chave)) != geracao:
+            return
+        self.backend.set(chave, entrada.para_bytes())
+        if self.backend.versao(_geracao(chave)) != geracao:
+            self.backend.delete(chave)
+
+    def _resposta(self, request: Request, entrada: Entrada) -> Response:
+        cabecalhos = {**entrada.cabecalhos, 'ETag': entrada.etag, 'Cache-Control': 'no-cache'}
+        codificacao = None
+        if self.compressao is not None:
+            cabecalhos['Vary'] = 'Accept-Encoding'
+            if len(entrada.corpo) >= self.compressao.minimo:
+                codificacao = self.compressao.escolher(request.headers)
+        if codificacao is not None:
+            cabecalhos['ETag'] = etag_codificado(entrada.etag, codificacao)
+        if _etag_confere(request, entrada.etag, cabecalhos['ETag']):
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=cabecalhos)
+        if codificacao is None:
+            return RespostaJSON(entrada.corpo, headers=cabecalhos)
+        cabecalhos['Content-Encoding'] = codificacao
+        return RespostaJSON(self._comprimida(entrada, codificacao), headers=cabecalhos)
+
+    def _comprimida(self, entrada: Entrada, codificacao: str) -> bytes:
+        # A chave usa o ETag (hash do corpo): uma versão nova do recurso
+        # nunca encontra a compressão da antiga
+        chave = f'comprimida:{codificacao}:{entrada.etag}'
+        corpo = self.backend.get(chave)
+        if corpo is not None:
+            servidas_do_cache.inc((codificacao,))
+            return corpo
+        # Sem cache, cada requisição paga a compressão: usa o nível rápido
+        guardar = not isinstance(self.backend, SemCache)
+        corpo = self.compressao.comprimir(codificacao, entrada.corpo, para_cache=guardar)
+        self.backend.set(chave, corpo)
+        return corpo
+
+    def _invalidou_ha_pouco(self) -> bool:
+        dados = self.backend.get(ULTIMA_INVALIDACAO)
+        return dados is not None and time.time() - float(dados) < self.janela_replicas
+
+    def _marcar_invalidacao(self) -> None:
+        # Antes da geração: quem leu a geração nova também vê a marca
+        if self.janela_replicas:
+            self.backend.set(ULTIMA_INVALIDACAO, f'{time.time():.3f}'.encode(), ttl=self.janela_replicas)
+
+    def invalidar(self, *chaves: str) -> None:
+        # A geração sobe antes de apagar: uma leitura em andamento desde antes
+        # da escrita não regrava a entrada velha (ver _guardar)
+        self._marcar_invalidacao()
+        for chave in chaves:
+            self.backend.nova_versao(_geracao(chave))
+        self.backend.delete(*chaves)
+
+    def nova_versao(self, grupo: str) -> None:
+        self._marcar_invalidacao()
+        self.backend.nova_versao(grupo)
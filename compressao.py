@@ -0,0 +1,236 @@
+import gzip
+import zlib
+from typing import Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from metricas import registro
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependência opcional
+    zstandard = None
+
+# Tipos comprimidos; o resto (imagens, já comprimidos...) passa direto
+TIPOS_COMPRIMIVEIS = ('application/json', 'application/x-ndjson', 'text/')
+
+compressoes = registro.contador(
+    'http_response_compressions_total', 'Corpos comprimidos, por codificação e origem', ('encoding', 'source'))
+bytes_economizados = registro.contador(
+    'http_response_compression_saved_bytes_total', 'Bytes a menos enviados graças à compressão', ('encoding',))
+servidas_do_cache = registro.contador(
+    'http_precompressed_responses_total', 'Respostas entregues já comprimidas, do cache', ('encoding',))
+
+
+class Codificacao:
+    """Um Content-Encoding: compressão de um corpo inteiro ou em fluxo.
+
+    ``nivel_cache`` vale para as representações guardadas no cache (o custo é
+    pago uma vez por versão); ``nivel_rapido`` para o que é comprimido a cada
+    requisição.
+    """
+
+    nome = ''
+    nivel_cache = 0
+    nivel_rapido = 0
+
+    def comprimir(self, dados: bytes, nivel: int) -> bytes:
+        raise NotImplementedError
+
+    def fluxo(self, nivel: int) -> 'Fluxo':
+        raise NotImplementedError
+
+
+class Fluxo:
+    def __init__(self, comprimir, finalizar):
+        self.comprimir = comprimir
+        self.finalizar = finalizar
+
+
+class Gzip(Codificacao):
+    nome = 'gzip'
+    nivel_cache = 9
+    nivel_rapido = 5
+
+    def comprimir(self, dados, nivel):
+        # mtime=0: o mesmo corpo gera sempre os mesmos bytes
+        return gzip.compress(dados, compresslevel=nivel, mtime=0)
+
+    def fluxo(self, nivel):
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return Fluxo(compressor.compress, compressor.flush)
+
+
+class Brotli(Codificacao):
+    nome = 'br'
+    nivel_cache = 9
+    nivel_rapido = 4
+
+    def comprimir(self, dados, nivel):
+        return brotli.compress(dados, quality=nivel)
+
+    def fluxo(self, nivel):
+        compressor = brotli.Compressor(quality=nivel)
+        return Fluxo(compressor.process, compressor.finish)
+
+
+class Zstd(Codificacao):
+    nome = 'zstd'
+    nivel_cache = 12
+    nivel_rapido = 3
+
+    def comprimir(self, dados, nivel):
+        return zstandard.ZstdCompressor(level=nivel).compress(dados)
+
+    def fluxo(self, nivel):
+        compressor = zstandard.ZstdCompressor(level=nivel).compressobj()
+        return Fluxo(compressor.compress, compressor.flush)
+
+
+# Só as codificações cuja biblioteca está instalada (gzip sempre está)
+DISPONIVEIS: Dict[str, Codificacao] = {'gzip': Gzip()}
+if brotli is not None:
+    DISPONIVEIS['br'] = Brotli()
+if zstandard is not None:
+    DISPONIVEIS['zstd'] = Zstd()
+
+
+def negociar(accept_encoding: Optional[str], preferencia: Sequence[str]) -> Optional[str]:
+    """Escolhe a codificação pelo Accept-Encoding; None é a identidade.
+
+    Vence o maior q do cliente; no empate, a ordem de ``preferencia``.
+    """
+    if not accept_encoding:
+        return None
+    pesos = {}
+    for item in accept_encoding.split(','):
+        nome, _, parametros = item.partition(';')
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        pesos[nome.strip().lower()] = peso
+
+    escolhida, maior = None, 0.0
+    for nome in preferencia:
+        peso = pesos.get(nome, pesos.get('*', 0.0))
+        if peso > maior:
+            escolhida, maior = nome, peso
+    return escolhida
+
+
+class Compressao:
+    """Configuração da compressão: codificações aceitas, em ordem, e tamanho mínimo."""
+
+    def __init__(self, preferencia: Sequence[str] = ('zstd', 'br', 'gzip'), minimo: int = 1024):
+        self.preferencia = [nome for nome in preferencia if nome in DISPONIVEIS]
+        self.minimo = minimo
+
+    @classmethod
+    def a_partir_de(cls, settings) -> Optional['Compressao']:
+        if not settings.COMPRESSAO_HABILITADA:
+            return None
+        return cls(settings.COMPRESSAO_CODIFICACOES, settings.COMPRESSAO_TAMANHO_MINIMO)
+
+    def escolher(self, headers: Headers) -> Optional[str]:
+        return negociar(headers.get('accept-encoding'), self.preferencia)
+
+    def comprimir(self, nome: str, dados: bytes, para_cache: bool = False) -> bytes:
+        codificacao = DISPONIVEIS[nome]
+        comprimido = codificacao.comprimir(dados, codificacao.nivel_cache if para_cache else codificacao.nivel_rapido)
+        compressoes.inc((nome, 'cache' if para_cache else 'requisicao'))
+        bytes_economizados.inc((nome,), len(dados) - len(comprimido))
+        return comprimido
+
+
+def _comprimivel(cabecalhos: MutableHeaders) -> bool:
+    tipo = cabecalhos.get('content-type', '')
+    # SSE não passa pelo compressor, que seguraria os eventos no buffer
+    return tipo.startswith(TIPOS_COMPRIMIVEIS) and not tipo.startswith('text/event-stream')
+
+
+class MiddlewareDeCompressao:
+    """Comprime, na hora, as respostas que não vieram comprimidas do cache.
+
+    Corpos inteiros abaixo do mínimo passam sem compressão; respostas em
+    streaming (NDJSON) são comprimidas pedaço a pedaço, com um único
+    compressor por resposta. Respostas com ETag são do cache de respostas,
+    que já entrega a representação comprimida guardada, e não são tocadas.
+    """
+
+    def __init__(self, app, compressao: Compressao):
+        self.app = app
+        self.compressao = compressao
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        nome = self.compressao.escolher(Headers(scope=scope))
+        if nome is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        fluxo = None
+
+        async def enviar(mensagem):
+            nonlocal inicio, fluxo
+            if mensagem['type'] == 'http.response.start':
+                # Os cabeçalhos esperam o primeiro pedaço do corpo
+                inicio = mensagem
+                return
+            if mensagem['type'] != 'http.response.body':
+                await send(mensagem)
+                return
+
+            corpo = mensagem.get('body', b'')
+            mais = mensagem.get('more_body', False)
+
+            if inicio is not None:
+                cabecalhos = MutableHeaders(raw=inicio['headers'])
+                comprimivel = _comprimivel(cabecalhos) and 'content-encoding' not in cabecalhos
+                if comprimivel:
+                    cabecalhos.add_vary_header('Accept-Encoding')
+                if not comprimivel or 'etag' in cabecalhos or (not mais and len(corpo) < self.compressao.minimo):
+                    await send(inicio)
+                    await send(mensagem)
+                    inicio = None
+                    return
+
+                cabecalhos['Content-Encoding'] = nome
+                if mais:
+                    # 1. Streaming: sem Content-Length, um compressor para a resposta toda
+                    del cabecalhos['content-length']
+                    codificacao = DISPONIVEIS[nome]
+                    fluxo = codificacao.fluxo(codificacao.nivel_rapido)
+                    compressoes.inc((nome, 'fluxo'))
+                    corpo = fluxo.comprimir(corpo)
+                else:
+                    # 2. Corpo inteiro
+                    corpo = self.compressao.comprimir(nome, corpo)
+                    cabecalhos['Content-Length'] = str(len(corpo))
+                await send(inicio)
+                inicio = None
+                await send({'type': 'http.response.body', 'body': corpo, 'more_body': mais})
+                return
+
+            if fluxo is None:
+                await send(mensagem)
+                return
+            dados = fluxo.comprimir(corpo)
+            if not mais:
+                dados += fluxo.finalizar()
+            # Pedaços que só encheram o buffer do compressor não viram mensagem
+            if dados or not mais:
+                await send({'type': 'http.response.body', 'body': dados, 'more_body': mais})
+
+        await self.app(scope, receive, enviar)
@@ -1,14 +1,128 @@
-from sqlalchemy import create_engine
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
-from settings import Settings
+from settings import get_settings
 from models import table_registry
+from repositorio import INDICES, INDICES_NO_BANCO, RECEITAS_INICIAIS, ReceitaRepository
+from busca import BuscaMemoria, escolher_busca, indice_busca
+from metricas import instrumentar
+from replicas import RoteadorDeLeituras
+from similares import IndiceSimilares
+from autocompletar import autocompletar_ingredientes, autocompletar_receitas
 
-settings = Settings()
+settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL)
+DRIVERS_ASSINCRONOS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+def url_assincrona(url: str) -> URL:
+    url = make_url(url)
+    return url.set(drivername=DRIVERS_ASSINCRONOS.get(url.get_backend_name(), url.drivername))
+
+def opcoes_do_pool(url) -> dict:
+    opcoes = {
+        'pool_pre_ping': settings.DATABASE_POOL_PRE_PING,
+        'pool_recycle': settings.DATABASE_POOL_RECYCLE,
+    }
+    # SQLite em memória usa um pool de conexão única, sem dimensionamento
+    if make_url(url).database not in (None, '', ':memory:'):
+        opcoes.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        )
+    return opcoes
+
+def em_arquivo_sqlite(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def perfil_sqlite(engine, somente_leitura: bool = False) -> None:
+    """PRAGMAs de desempenho em cada conexão SQLite nova do engine.
+
+    WAL deixa leitores e o escritor trabalharem ao mesmo tempo; com ele,
+    ``synchronous=NORMAL`` só perde as últimas transações numa queda de
+    energia, sem corromper o banco.
+    """
+    comandos = [
+        f'PRAGMA busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}',
+        'PRAGMA synchronous = NORMAL',
+        f'PRAGMA mmap_size = {settings.SQLITE_MMAP_MB * 1024 * 1024}',
+        # Negativo: tamanho em KiB, não em páginas
+        f'PRAGMA cache_size = -{settings.SQLITE_CACHE_MB * 1024}',
+    ]
+    comandos.insert(0, 'PRAGMA query_only = ON' if somente_leitura else 'PRAGMA journal_mode = WAL')
+
+    @event.listens_for(engine, 'connect')
+    def configurar(conexao_dbapi, registro_conexao):
+        cursor = conexao_dbapi.cursor()
+        for comando in comandos:
+            cursor.execute(comando)
+        cursor.close()
+
+engine = create_engine(settings.DATABASE_URL, **opcoes_do_pool(settings.DATABASE_URL))
+
+instrumentar(engine, 'sync')
+
+SQLITE_DESEMPENHO = settings.SQLITE_DESEMPENHO and em_arquivo_sqlite(settings.DATABASE_URL)
+if SQLITE_DESEMPENHO:
+    perfil_sqlite(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+busca = escolher_busca(engine, settings.BUSCA_BACKEND)
+if isinstance(busca, BuscaMemoria):
+    # Sem busca no banco: o índice em memória passa a ser mantido pelo repositório
+    INDICES.append(indice_busca)
+else:
+    INDICES_NO_BANCO.append(busca)
+
+indice_similares = IndiceSimilares(
+    settings.SIMILARES_BANDAS, settings.SIMILARES_LINHAS, settings.SIMILARES_MAX_CANDIDATOS
+)
+INDICES.append(indice_similares)
+INDICES.extend([autocompletar_ingredientes, autocompletar_receitas])
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or url_assincrona(settings.DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **opcoes_do_pool(ASYNC_DATABASE_URL))
+
+instrumentar(async_engine.sync_engine, 'async')
+
+if SQLITE_DESEMPENHO:
+    perfil_sqlite(async_engine.sync_engine)
+
+# expire_on_commit=False evita recarregar atributos (E/S implícita) após o commit
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Engines só de leitura: as réplicas configuradas ou, no SQLite em arquivo sem
+# réplicas, um pool próprio com query_only (em WAL não disputa com as escritas)
+engines_de_leitura = []
+for indice, url in enumerate(settings.DATABASE_REPLICAS):
+    url_replica = url_assincrona(url)
+    engines_de_leitura.append(create_async_engine(url_replica, **opcoes_do_pool(url_replica)))
+    instrumentar(engines_de_leitura[-1].sync_engine, f'replica{indice}')
+    if settings.SQLITE_DESEMPENHO and em_arquivo_sqlite(url_replica):
+        perfil_sqlite(engines_de_leitura[-1].sync_engine, somente_leitura=True)
+if not engines_de_leitura and SQLITE_DESEMPENHO:
+    engines_de_leitura.append(create_async_engine(ASYNC_DATABASE_URL, **opcoes_do_pool(ASYNC_DATABASE_URL)))
+    instrumentar(engines_de_leitura[-1].sync_engine, 'leitura')
+    perfil_sqlite(engines_de_leitura[-1].sync_engine, somente_leitura=True)
+
+roteador = RoteadorDeLeituras(
+    AsyncSessionLocal,
+    [async_sessionmaker(e, autoflush=False, expire_on_commit=False) for e in engines_de_leitura],
+    janela=settings.DATABASE_LEITURA_APOS_ESCRITA,
+    # O pool só de leitura usa o mesmo arquivo: nunca está atrasado
+    com_atraso=bool(settings.DATABASE_REPLICAS),
+    pausa_apos_falha=settings.DATABASE_PAUSA_REPLICA_COM_FALHA,
+)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -16,5 +130,55 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def destino_de_leitura(request: Request) -> str:
+    return roteador.destino(request)
+
+async def get_async_db_leitura(destino: str = Depends(destino_de_leitura)):
+    # Sessão das rotas GET: réplica (ou pool só de leitura), com volta para a primária
+    async with roteador.sessao(destino) as db:
+        yield db
+
+def _conexoes_a_abrir(engine, n: int) -> int:
+    # Pools sem dimensionamento (SQLite em memória) mantêm uma única conexão
+    return min(n, engine.pool.size()) if hasattr(engine.pool, 'size') else 1
+
+async def abrir_conexoes(n: int) -> None:
+    """Abre ``n`` conexões em cada pool e as devolve, já conectadas.
+
+    Chamada na partida (lifespan): a conexão assíncrona fica presa ao event
+    loop em que foi aberta, que é o mesmo que atenderá as requisições.
+    """
+    sincronas = [engine.connect() for _ in range(_conexoes_a_abrir(engine, n))]
+    for conexao in sincronas:
+        conexao.close()
+    for assincrono in [async_engine, *engines_de_leitura]:
+        try:
+            assincronas = [await assincrono.connect() for _ in range(_conexoes_a_abrir(assincrono.sync_engine, n))]
+        except (DBAPIError, OSError):
+            # Réplica fora do ar na partida: o roteador usa a primária
+            if assincrono is async_engine:
+                raise
+            continue
+        for conexao in assincronas:
+            await conexao.close()
+
+async def fechar_conexoes() -> None:
+    for assincrono in [async_engine, *engines_de_leitura]:
+        await assincrono.dispose()
+    engine.dispose()
+
 def create_db_and_tables():
     table_registry.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        busca.instalar(conexao)
+
+    # Popula o catálogo com as receitas de exemplo quando estiver vazio
+    with SessionLocal() as db:
+        receitas = ReceitaRepository(db)
+        if not receitas:
+            for receita in RECEITAS_INICIAIS:
+                receitas.add(receita)
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, NamedTuple
+
+from sqlalchemy import distinct, exists, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from alteracoes import TRAVA_POSTGRES
+from metricas import registro
+from models import CadastrosPorDia, Estatistica, EstatisticaIngrediente, Ingrediente, Receita, ReceitaIngrediente, User
+from schema import CadastrosDoDia, Estatisticas, FrequenciaIngrediente
+
+log = logging.getLogger('estatisticas')
+
+# Chaves da tabela de contadores
+RECEITAS = 'receitas'
+# Itens de receita (ingredientes contados com repetição): a média por receita é ITENS / RECEITAS
+ITENS = 'itens'
+USUARIOS = 'usuarios'
+
+corrigidos = registro.contador(
+    'stats_reconciliation_corrections_total', 'Agregados de /stats corrigidos pela reconciliação', ('table',))
+
+
+class Variacao(NamedTuple):
+    """O que uma escrita soma aos agregados; só as chaves com delta diferente de zero."""
+
+    contadores: Dict[str, int] = {}
+    ingredientes: Dict[int, int] = {}
+    cadastros: Dict[date, int] = {}
+
+
+def de_receitas(removidas: Iterable[List[int]] = (), criadas: Iterable[List[int]] = ()) -> Variacao:
+    """Variação de receitas removidas e criadas, dadas pelos ids dos seus ingredientes.
+
+    Uma receita alterada é a antiga removida e a nova criada: só os
+    ingredientes que entraram ou saíram dela mudam de frequência.
+    """
+    contadores = Counter()
+    ingredientes = Counter()
+    for sinal, receitas in ((-1, removidas), (+1, criadas)):
+        for ids in receitas:
+            contadores[RECEITAS] += sinal
+            contadores[ITENS] += sinal * len(ids)
+            # A frequência conta receitas: um ingrediente repetido conta uma vez
+            for ingrediente_id in set(ids):
+                ingredientes[ingrediente_id] += sinal
+    return Variacao(
+        {c: n for c, n in contadores.items() if n},
+        {i: n for i, n in ingredientes.items() if n},
+    )
+
+
+def de_usuarios(removidos: Iterable[datetime] = (), criados: Iterable[datetime] = ()) -> Variacao:
+    """Variação de usuários removidos e criados, dados pelo created_at de cada um."""
+    contadores = Counter()
+    cadastros = Counter()
+    for sinal, datas in ((-1, removidos), (+1, criados)):
+        for criado_em in datas:
+            contadores[USUARIOS] += sinal
+            cadastros[criado_em.date()] += sinal
+    return Variacao({c: n for c, n in contadores.items() if n}, {}, {d: n for d, n in cadastros.items() if n})
+
+
+def _insert(dialeto: str):
+    # Os dois bancos suportados têm INSERT ... ON CONFLICT DO UPDATE
+    return (postgresql if dialeto == 'postgresql' else sqlite).insert
+
+
+def _somar(dialeto: str, tabela, chave: str, coluna: str, deltas: dict) -> tuple:
+    comando = _insert(dialeto)(tabela)
+    comando = comando.on_conflict_do_update(
+        index_elements=[chave],
+        set_={coluna: getattr(tabela, coluna) + comando.excluded[coluna]},
+    )
+    return comando, [{chave: k, coluna: n} for k, n in deltas.items()]
+
+
+def _comandos(dialeto: str, variacao: Variacao) -> list:
+    # O(1) por escrita: um UPDATE por chave afetada, nunca uma varredura.
+    # No PostgreSQL a trava do registro de alterações (reentrante) vem
+    # primeiro, para escritas e reconciliação sempre travarem na mesma ordem
+    comandos = [(TRAVA_POSTGRES, None)] if dialeto == 'postgresql' else []
+    for tabela, chave, coluna, deltas in (
+        (Estatistica, 'chave', 'valor', variacao.contadores),
+        (EstatisticaIngrediente, 'ingrediente_id', 'receitas', variacao.ingredientes),
+        (CadastrosPorDia, 'dia', 'usuarios', variacao.cadastros),
+    ):
+        if deltas:
+            comandos.append(_somar(dialeto, tabela, chave, coluna, deltas))
+    return comandos
+
+
+def aplicar(db: Session, variacao: Variacao) -> None:
+    """Soma a variação na transação corrente; o commit fica com quem chama."""
+    if not any(variacao):
+        return
+    # Pela conexão (Core): o session.execute passaria pelo bulk INSERT do ORM,
+    # cerca de 0,3 ms a mais por escrita
+    conexao = db.connection()
+    for comando, parametros in _comandos(db.get_bind().dialect.name, variacao):
+        conexao.execute(comando, parametros)
+
+
+async def aplicar_async(db: AsyncSession, variacao: Variacao) -> None:
+    if not any(variacao):
+        return
+    conexao = await db.connection()
+    for comando, parametros in _comandos(db.get_bind().dialect.name, variacao):
+        await conexao.execute(comando, parametros)
+
+
+async def ler(db: AsyncSession, limite: int, dias: int) -> Estatisticas:
+    """Os agregados, só com leituras por chave: nenhuma varredura das tabelas de origem."""
+    contadores = dict((await db.execute(select(Estatistica.chave, Estatistica.valor))).all())
+    mais_usados = await db.execute(
+        select(Ingrediente.nome, EstatisticaIngrediente.receitas)
+        .join(Ingrediente, Ingrediente.id == EstatisticaIngrediente.ingrediente_id)
+        .where(EstatisticaIngrediente.receitas > 0)
+        # No empate, o ingrediente mais novo primeiro: a mesma ordem do índice, ao contrário
+        .order_by(EstatisticaIngrediente.receitas.desc(), EstatisticaIngrediente.ingrediente_id.desc())
+        .limit(limite)
+    )
+    desde = datetime.now(timezone.utc).date() - timedelta(days=dias - 1)
+    cadastros = await db.execute(
+        select(CadastrosPorDia.dia, CadastrosPorDia.usuarios)
+        .where(CadastrosPorDia.dia >= desde, CadastrosPorDia.usuarios > 0)
+        .order_by(CadastrosPorDia.dia)
+    )
+
+    receitas = contadores.get(RECEITAS, 0)
+    return Estatisticas.model_construct(
+        receitas=receitas,
+        usuarios=contadores.get(USUARIOS, 0),
+        media_ingredientes_por_receita=round(contadores.get(ITENS, 0) / receitas, 2) if receitas else 0.0,
+        ingredientes_mais_usados=[FrequenciaIngrediente.model_construct(nome=n, receitas=r) for n, r in mais_usados],
+        cadastros_por_dia=[CadastrosDoDia.model_construct(dia=d, usuarios=u) for d, u in cadastros],
+    )
+
+
+async def reconciliar(db: AsyncSession) -> int:
+    """Recalcula os agregados a partir das tabelas de origem e corrige os que divergem.
+
+    Tudo numa transação que trava as escritas (advisory lock no PostgreSQL;
+    no SQLite o primeiro comando já é uma escrita), para nenhuma escrita
+    ficar entre o recálculo e a correção. Devolve quantos valores mudaram:
+    fora de zero, algo gravou sem passar pelo repositório ou pelas rotas.
+    """
+    dialeto = db.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        await db.execute(TRAVA_POSTGRES)
+    insert = _insert(dialeto)
+    correcoes = {}
+
+    # 1. Frequência dos ingredientes: zera os que nenhuma receita usa e
+    #    regrava os que diferem da contagem
+    correcoes['estatisticas_ingredientes'] = (await db.execute(
+        update(EstatisticaIngrediente)
+        .where(
+            EstatisticaIngrediente.receitas != 0,
+            ~exists().where(ReceitaIngrediente.ingrediente_id == EstatisticaIngrediente.ingrediente_id),
+        )
+        .values(receitas=0)
+    )).rowcount
+    comando = insert(EstatisticaIngrediente).from_select(
+        ['ingrediente_id', 'receitas'],
+        select(ReceitaIngrediente.ingrediente_id, func.count(distinct(ReceitaIngrediente.receita_id)))
+        .group_by(ReceitaIngrediente.ingrediente_id),
+    )
+    correcoes['estatisticas_ingredientes'] += (await db.execute(comando.on_conflict_do_update(
+        index_elements=['ingrediente_id'],
+        set_={'receitas': comando.excluded.receitas},
+        where=EstatisticaIngrediente.receitas != comando.excluded.receitas,
+    ))).rowcount
+
+    # 2. Cadastros por dia, do mesmo jeito
+    dia = func.date(User.created_at)
+    correcoes['estatisticas_cadastros'] = (await db.execute(
+        update(CadastrosPorDia)
+        .where(CadastrosPorDia.usuarios != 0, CadastrosPorDia.dia.not_in(select(dia)))
+        .values(usuarios=0)
+    )).rowcount
+    comando = insert(CadastrosPorDia).from_select(['dia', 'usuarios'], select(dia, func.count()).group_by(dia))
+    correcoes['estatisticas_cadastros'] += (await db.execute(comando.on_conflict_do_update(
+        index_elements=['dia'],
+        set_={'usuarios': comando.excluded.usuarios},
+        where=CadastrosPorDia.usuarios != comando.excluded.usuarios,
+    ))).rowcount
+
+    # 3. Contadores
+    contagens = (await db.execute(select(
+        select(func.count()).select_from(Receita).scalar_subquery(),
+        select(func.count()).select_from(ReceitaIngrediente).scalar_subquery(),
+        select(func.count()).select_from(User).scalar_subquery(),
+    ))).one()
+    esperados = dict(zip((RECEITAS, ITENS, USUARIOS), contagens))
+    atuais = dict((await db.execute(select(Estatistica.chave, Estatistica.valor))).all())
+    divergentes = [{'chave': c, 'valor': v} for c, v in esperados.items() if atuais.get(c) != v]
+    if divergentes:
+        comando = insert(Estatistica)
+        await db.execute(comando.on_conflict_do_update(
+            index_elements=['chave'], set_={'valor': comando.excluded.valor}), divergentes)
+    correcoes['estatisticas'] = len(divergentes)
+
+    await db.commit()
+    for tabela, n in correcoes.items():
+        if n:
+            corrigidos.inc((tabela,), n)
+    return sum(correcoes.values())
+
+
+async def manter(sessoes: Callable[[], AsyncSession], intervalo: float) -> None:
+    """Tarefa do lifespan: reconcilia os agregados a cada ``intervalo`` segundos."""
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            async with sessoes() as db:
+                corrigidos_agora = await reconciliar(db)
+            if corrigidos_agora:
+                log.warning('%d agregados de /stats divergiam das tabelas e foram corrigidos', corrigidos_agora)
+        except Exception:
+            # Banco ocupado ou fora do ar: tenta de novo no próximo intervalo
+            log.warning('falha ao reconciliar os agregados de /stats', exc_info=True)
@@ -0,0 +1,124 @@
+import json
+from http import HTTPStatus
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple, TypeVar
+
+from fastapi import HTTPException, Request
+from pydantic import TypeAdapter, ValidationError
+
+from schema import RelatorioImportacao, ResultadoLinha
+
+# Linhas validadas por chamada ao TypeAdapter e inseridas por comando INSERT
+TAMANHO_LOTE = 500
+# Limite de linhas aceitas em uma única requisição de importação
+MAXIMO_LINHAS = 50_000
+
+T = TypeVar('T')
+
+
+def em_lotes(itens: List[T], tamanho: int = TAMANHO_LOTE) -> Iterable[List[T]]:
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+async def ler_linhas(request: Request) -> List[Any]:
+    """Lê o corpo como NDJSON (uma linha por objeto) ou como um array JSON.
+
+    Linhas NDJSON com JSON inválido viram ``None`` e são reportadas como
+    inválidas, sem invalidar o restante do lote.
+    """
+    corpo = await request.body()
+    if 'ndjson' in request.headers.get('content-type', ''):
+        linhas = []
+        for linha in corpo.splitlines():
+            if not linha.strip():
+                continue
+            try:
+                linhas.append(json.loads(linha))
+            except ValueError:
+                linhas.append(None)
+    else:
+        try:
+            linhas = json.loads(corpo)
+        except ValueError:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Corpo não é um JSON válido")
+        if not isinstance(linhas, list):
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Envie um array JSON ou NDJSON")
+
+    if len(linhas) > MAXIMO_LINHAS:
+        raise HTTPException(
+            status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Envie no máximo {MAXIMO_LINHAS} linhas por requisição",
+        )
+    return linhas
+
+
+def validar_em_lotes(
+    tipo: type,
+    linhas: List[Any],
+    resultados: List[Optional[ResultadoLinha]],
+) -> List[Tuple[int, Any]]:
+    """Valida as linhas com um ``TypeAdapter`` por lote.
+
+    Um lote sem erros é validado em uma única chamada; se algum item falhar,
+    os erros são atribuídos às linhas pelo índice e só os itens restantes são
+    revalidados. Retorna os pares (linha, modelo) válidos e preenche
+    ``resultados`` com as linhas inválidas.
+    """
+    adaptador_lote = TypeAdapter(List[tipo])
+    adaptador = TypeAdapter(tipo)
+    validos = []
+    for inicio in range(0, len(linhas), TAMANHO_LOTE):
+        lote = linhas[inicio:inicio + TAMANHO_LOTE]
+        try:
+            modelos = adaptador_lote.validate_python(lote)
+            validos.extend(enumerate(modelos, start=inicio))
+            continue
+        except ValidationError as erro:
+            invalidos = {}
+            for detalhe in erro.errors():
+                invalidos.setdefault(detalhe['loc'][0], detalhe['msg'])
+
+        for posicao, item in enumerate(lote):
+            linha = inicio + posicao
+            if posicao in invalidos:
+                resultados[linha] = ResultadoLinha(linha=linha, status='invalido', erro=invalidos[posicao])
+            else:
+                validos.append((linha, adaptador.validate_python(item)))
+    return validos
+
+
+def deduplicar(
+    validos: List[Tuple[int, T]],
+    chaves: Callable[[T], Iterable[Tuple[str, str]]],
+    ja_gravados: Set[Tuple[str, str]],
+    resultados: List[Optional[ResultadoLinha]],
+) -> List[Tuple[int, T]]:
+    """Remove duplicados dentro do lote e contra os dados já gravados.
+
+    ``chaves`` devolve os pares (campo, valor) únicos de cada item e
+    ``ja_gravados`` contém os pares que já existem no banco, obtidos com uma
+    única consulta. A primeira ocorrência dentro do lote vence.
+    """
+    vistos = set()
+    unicos = []
+    for linha, item in validos:
+        repetida = next((chave for chave in chaves(item) if chave in vistos or chave in ja_gravados), None)
+        if repetida is not None:
+            resultados[linha] = ResultadoLinha(
+                linha=linha,
+                status='duplicado',
+                erro=f"{repetida[0]} já existe: {repetida[1]}",
+            )
+            continue
+        vistos.update(chaves(item))
+        unicos.append((linha, item))
+    return unicos
+
+
+def relatorio(resultados: List[Optional[ResultadoLinha]]) -> RelatorioImportacao:
+    criados = sum(1 for r in resultados if r.status == 'criado')
+    return RelatorioImportacao(
+        criados=criados,
+        rejeitados=len(resultados) - criados,
+        resultados=resultados,
+    )
@@ -0,0 +1,224 @@
+import heapq
+import threading
+from itertools import islice
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Set
+
+from normalizacao import normalizar
+
+# A partir de quantas receitas um ingrediente também ganha um bitmap
+LIMIAR_DENSO = 256
+
+
+class Resultado(NamedTuple):
+    receita_id: int
+    cobertos: int
+    total: int
+
+
+def _chave(resultado: Resultado):
+    # Mais ingredientes cobertos primeiro; no empate, menos ingredientes faltando
+    return (-resultado.cobertos, resultado.total - resultado.cobertos, resultado.receita_id)
+
+
+def _somar(planos: List[int], bitmap: int) -> None:
+    # Contador bit a bit: o plano i guarda o bit i da contagem de cada receita
+    vai_um = bitmap
+    for i, plano in enumerate(planos):
+        planos[i] = plano ^ vai_um
+        vai_um &= plano
+        if not vai_um:
+            return
+    planos.append(vai_um)
+
+
+def _bitmap(ids: Iterable[int]) -> int:
+    ids = list(ids)
+    if not ids:
+        return 0
+    dados = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        dados[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(dados, 'little')
+
+
+def _bits(bitmap: int) -> Iterator[int]:
+    while bitmap:
+        menor = bitmap & -bitmap
+        yield menor.bit_length() - 1
+        bitmap ^= menor
+
+
+class IndiceIngredientes:
+    """Índice invertido ingrediente normalizado -> ids das receitas.
+
+    Cada ingrediente guarda o conjunto de ids das receitas que o usam; os
+    ingredientes presentes em muitas receitas (sal, ovos...) também guardam um
+    bitmap, para que a contagem não precise percorrer dezenas de milhares de
+    ids. É atualizado pelo ``ReceitaRepository`` a cada escrita.
+    """
+
+    def __init__(self):
+        self._receitas_por_ingrediente: Dict[str, Set[int]] = {}
+        self._bitmaps: Dict[str, int] = {}
+        self._ingredientes_por_receita: Dict[int, FrozenSet[str]] = {}
+        self._por_tamanho: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.carregado = False
+
+    def __len__(self) -> int:
+        return len(self._ingredientes_por_receita)
+
+    def _remover(self, receita_id: int) -> None:
+        ingredientes = self._ingredientes_por_receita.pop(receita_id, None)
+        if ingredientes is None:
+            return
+        bit = 1 << receita_id
+        if len(ingredientes) in self._por_tamanho:
+            self._por_tamanho[len(ingredientes)] &= ~bit
+        for ingrediente in ingredientes:
+            receitas = self._receitas_por_ingrediente[ingrediente]
+            receitas.discard(receita_id)
+            if ingrediente in self._bitmaps:
+                if len(receitas) < LIMIAR_DENSO // 2:
+                    del self._bitmaps[ingrediente]
+                else:
+                    self._bitmaps[ingrediente] &= ~bit
+            if not receitas:
+                del self._receitas_por_ingrediente[ingrediente]
+
+    def _adicionar(self, receita_id: int, ingredientes: Iterable[str]) -> None:
+        self._remover(receita_id)
+        normalizados = frozenset(normalizar(i) for i in ingredientes)
+        self._ingredientes_por_receita[receita_id] = normalizados
+        if not self.carregado:
+            # Durante a reconstrução os bitmaps são montados uma vez no final
+            for ingrediente in normalizados:
+                self._receitas_por_ingrediente.setdefault(ingrediente, set()).add(receita_id)
+            return
+
+        bit = 1 << receita_id
+        tamanho = len(normalizados)
+        self._por_tamanho[tamanho] = self._por_tamanho.get(tamanho, 0) | bit
+        for ingrediente in normalizados:
+            receitas = self._receitas_por_ingrediente.setdefault(ingrediente, set())
+            receitas.add(receita_id)
+            if ingrediente in self._bitmaps:
+                self._bitmaps[ingrediente] |= bit
+            elif len(receitas) >= LIMIAR_DENSO:
+                self._bitmaps[ingrediente] = _bitmap(receitas)
+
+    def adicionar(self, receita) -> None:
+        with self._lock:
+            self._adicionar(receita.id, receita.ingredientes)
+
+    def remover(self, receita_id: int) -> None:
+        with self._lock:
+            self._remover(receita_id)
+
+    def reconstruir(self, receitas: Iterable) -> None:
+        with self._lock:
+            self.carregado = False
+            self._receitas_por_ingrediente.clear()
+            self._bitmaps.clear()
+            self._ingredientes_por_receita.clear()
+            self._por_tamanho.clear()
+            for receita in receitas:
+                self._adicionar(receita.id, receita.ingredientes)
+
+            for ingrediente, ids in self._receitas_por_ingrediente.items():
+                if len(ids) >= LIMIAR_DENSO:
+                    self._bitmaps[ingrediente] = _bitmap(ids)
+            por_tamanho: Dict[int, List[int]] = {}
+            for receita_id, itens in self._ingredientes_por_receita.items():
+                por_tamanho.setdefault(len(itens), []).append(receita_id)
+            for tamanho, ids in por_tamanho.items():
+                self._por_tamanho[tamanho] = _bitmap(ids)
+            self.carregado = True
+
+    def buscar(
+        self,
+        despensa: Iterable[str],
+        incluir: Iterable[str] = (),
+        excluir: Iterable[str] = (),
+        limite: int = 20,
+    ) -> List[Resultado]:
+        despensa = {normalizar(i) for i in despensa}
+        incluir = {normalizar(i) for i in incluir}
+        excluir = {normalizar(i) for i in excluir}
+
+        with self._lock:
+            postings = self._receitas_por_ingrediente
+            ingredientes = self._ingredientes_por_receita
+            vazio: Set[int] = set()
+
+            if any(i not in postings for i in incluir):
+                return []
+
+            def exato(receita_id: int) -> Resultado:
+                itens = ingredientes[receita_id]
+                return Resultado(receita_id, len(itens & despensa), len(itens))
+
+            def aceito(receita_id: int) -> bool:
+                itens = ingredientes[receita_id]
+                return incluir <= itens and not (excluir & itens)
+
+            raros_incluidos = [postings[i] for i in incluir if i not in self._bitmaps]
+            if raros_incluidos:
+                # Algum ingrediente obrigatório é raro: poucos candidatos, contagem exata
+                raros_incluidos.sort(key=len)
+                candidatos = raros_incluidos[0].intersection(*raros_incluidos[1:])
+                return heapq.nsmallest(
+                    limite,
+                    (exato(r) for r in candidatos if aceito(r)),
+                    key=_chave,
+                )
+
+            # Receitas que usam algum ingrediente raro da despensa: contagem exata
+            raros = vazio.union(*(
+                postings[i] for i in despensa if i in postings and i not in self._bitmaps
+            ))
+            exatos = heapq.nsmallest(
+                limite,
+                (exato(r) for r in raros if aceito(r)),
+                key=_chave,
+            )
+
+            # As demais só usam ingredientes densos: contagem com bitmaps
+            planos: List[int] = []
+            densos = [self._bitmaps[i] for i in despensa if i in self._bitmaps]
+            for bitmap in densos:
+                _somar(planos, bitmap)
+
+            universo = -1
+            for i in incluir:
+                universo &= self._bitmaps[i]
+            for i in excluir:
+                universo &= ~self._bitmaps.get(i, 0)
+            ignorar = raros.union(*(postings[i] for i in excluir if i in postings and i not in self._bitmaps))
+
+            por_bitmap = list(islice(
+                self._extrair(planos, len(densos), universo, ignorar, nivel_minimo=0 if incluir else 1),
+                limite,
+            ))
+
+        return list(islice(heapq.merge(exatos, por_bitmap, key=_chave), limite))
+
+    def _extrair(self, planos, maximo, universo, ignorar, nivel_minimo) -> Iterator[Resultado]:
+        tamanhos = sorted(self._por_tamanho)
+        for nivel in range(maximo, nivel_minimo - 1, -1):
+            if nivel >> len(planos):
+                continue
+            mascara = universo
+            for bit, plano in enumerate(planos):
+                mascara &= plano if (nivel >> bit) & 1 else ~plano
+            if mascara == -1 or not mascara:
+                continue
+            for tamanho in tamanhos:
+                if tamanho < nivel:
+                    continue
+                for receita_id in _bits(mascara & self._por_tamanho[tamanho]):
+                    if receita_id not in ignorar:
+                        yield Resultado(receita_id, nivel, tamanho)
+
+
+indice_ingredientes = IndiceIngredientes()
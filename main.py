@@ -1,170 +1,665 @@
-from fastapi import FastAPI, HTTPException, Depends 
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from http import HTTPStatus
-from typing import List
+from typing import List, Literal, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 
-from schema import Receita, BaseReceita, BaseUsuario, UsuarioPublic
+from schema import Receita, BaseReceita, ReceitaCompativel, ReceitaEncontrada, ReceitaSimilar, SugestaoIngrediente, SugestaoReceita, AlteracaoPublic, Estatisticas, BaseUsuario, UsuarioPublic, Login, RelatorioImportacao, ResultadoLinha
 from models import User
-from database import get_db
-
-app = FastAPI()
-
-receitas: List[Receita] = [
-    Receita(id=1, nome="Bolo de Chocolate", ingredientes=["farinha", "açúcar", "chocolate em pó", "ovos", "leite", "óleo"], modo_de_preparo="Misture tudo e asse."),
-    Receita(id=2, nome="Brigadeiro", ingredientes=["leite condensado", "chocolate em pó", "manteiga"], modo_de_preparo="Misture no fogo até desgrudar da panela."),
-    Receita(id=3, nome="Pudim", ingredientes=["leite condensado", "leite", "ovos", "açúcar"], modo_de_preparo="Faça a calda, misture os ingredientes e asse em banho-maria."),
-    Receita(id=4, nome="Feijoada", ingredientes=["feijão preto", "carne seca", "linguiça", "costelinha", "bacon", "alho", "cebola"], modo_de_preparo="Cozinhe o feijão e as carnes separadamente, depois junte tudo e tempere."),
-    Receita(id=5, nome="Moqueca de Peixe", ingredientes=["peixe", "azeite de dendê", "leite de coco", "tomate", "cebola", "pimentões", "coentro"], modo_de_preparo="Refogue os temperos, adicione o peixe e cozinhe com leite de coco e azeite de dendê."),
-    Receita(id=6, nome="Pão de Queijo", ingredientes=["polvilho doce", "queijo minas", "leite", "óleo", "ovos", "sal"], modo_de_preparo="Misture os ingredientes, faça bolinhas e asse.")
-]
-
-@app.get("/receitas", response_model=List[Receita], status_code=HTTPStatus.OK)
-async def get_receitas():
-    return receitas
-
-@app.get("/receitas/{receita_id}", response_model=Receita, status_code=HTTPStatus.OK)
-async def get_receita_by_id(receita_id: int):
-    for receita in receitas:
-        if receita.id == receita_id:
-            return receita
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Receita não encontrada")
-
-@app.get("/receitas/nome/{receita_nome}", response_model=Receita, status_code=HTTPStatus.OK)
-async def get_receita_by_name(receita_nome: str):
-    for receita in receitas:
-        if receita.nome.lower() == receita_nome.lower():
-            return receita
-    raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Receita não encontrada")
+from database import AsyncSessionLocal, abrir_conexoes, busca, destino_de_leitura, fechar_conexoes, get_db, get_async_db, get_async_db_leitura, indice_similares, roteador, settings, SessionLocal
+from repositorio import ReceitaRepository
+from indice_ingredientes import indice_ingredientes
+from normalizacao import normalizar
+from paginacao import LIMITE_MAXIMO, LIMITE_PADRAO, Pagina, ids_do_lote, ndjson, no_lote
+from importacao import deduplicar, em_lotes, ler_linhas, relatorio, validar_em_lotes
+from cache import CacheDeRespostas, Entrada
+from serializacao import RespostaJSON, colunas, construir, json_bytes
+from senhas import ServicoDeSenhas
+from metricas import MiddlewareDeMetricas, TIPO_PROMETHEUS, registro
+from aquecimento import aquecer_rotas, aquecer_serializadores
+from admissao import ControleDeAdmissao, MiddlewareDeAdmissao
+from compressao import Compressao, MiddlewareDeCompressao
+from agrupamento import CarregadorEmLote
+from replicas import PRIMARIA, REPLICA
+from autocompletar import TOPO_K, autocompletar_ingredientes, autocompletar_receitas
+from alteracoes import AVISOS, ATUALIZADO, CRIADO, REMOVIDO, USUARIO, Aviso, aguardar, eventos, horizonte, ler, manter, registrar_async, ultimo_seq
+import estatisticas
+from estatisticas import aplicar_async, de_usuarios
+
+log = logging.getLogger('partida')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 1. Conexões, serializadores, pool de senhas e rotas prontos antes do /ready
+    inicio = time.perf_counter()
+    app.state.pronto = False
+    await abrir_conexoes(settings.DATABASE_POOL_AQUECIDAS)
+    aquecer_serializadores(app)
+    await senhas.gerar_hash("aquecimento")
+    if settings.AQUECER_ROTAS:
+        await aquecer_rotas(app)
+    app.state.pronto = True
+    log.info("pronto para receber tráfego em %.0f ms", (time.perf_counter() - inicio) * 1000)
+
+    # 2. Expurgo periódico das lápides vencidas do registro de alterações
+    expurgo = None
+    if settings.ALTERACOES_INTERVALO_EXPURGO:
+        expurgo = asyncio.create_task(manter(
+            AsyncSessionLocal, settings.ALTERACOES_RETENCAO_DIAS, settings.ALTERACOES_INTERVALO_EXPURGO
+        ))
+
+    # 3. Reconciliação periódica dos agregados de /stats com as tabelas
+    reconciliacao = None
+    if settings.ESTATISTICAS_INTERVALO_RECONCILIACAO:
+        reconciliacao = asyncio.create_task(estatisticas.manter(
+            AsyncSessionLocal, settings.ESTATISTICAS_INTERVALO_RECONCILIACAO
+        ))
+
+    yield
+
+    # 4. Encerramento: tarefas periódicas (esperadas até saírem, para não
+    #    usarem conexões já fechadas), pool de senhas e conexões do banco
+    tarefas = [tarefa for tarefa in (expurgo, reconciliacao) if tarefa is not None]
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+    # O shutdown espera os scrypts em andamento: fora do event loop
+    await asyncio.to_thread(senhas.fechar)
+    await fechar_conexoes()
+
+# Rotas que calculam scrypt têm limite próprio no controle de admissão. O
+# /changes fica de fora (grupo sem limite): o long-poll e o SSE ficam abertos
+# sem conexão com o banco e derrubariam o limite adaptado pela latência
+GRUPOS_DE_ROTAS = {
+    ("POST", "/usuarios"): "senha",
+    ("POST", "/usuarios/bulk"): "senha",
+    ("POST", "/usuarios/login"): "senha",
+    ("PUT", "/usuarios/{id}"): "senha",
+    ("GET", "/changes"): "alteracoes",
+}
+admissao = ControleDeAdmissao.a_partir_de(settings, GRUPOS_DE_ROTAS)
+
+app = FastAPI(lifespan=lifespan)
+# O último middleware adicionado é o mais externo: as métricas veem as recusas
+# e o tamanho já comprimido
+compressao = Compressao.a_partir_de(settings)
+if compressao is not None:
+    app.add_middleware(MiddlewareDeCompressao, compressao=compressao)
+if settings.ADMISSAO_HABILITADA:
+    app.add_middleware(MiddlewareDeAdmissao, controle=admissao)
+app.add_middleware(
+    MiddlewareDeMetricas,
+    limiar_lentas_ms=settings.METRICAS_LIMIAR_LENTAS_MS,
+    max_comandos=settings.METRICAS_MAX_COMANDOS_LENTAS,
+)
+
+respostas = CacheDeRespostas.a_partir_de(settings)
+senhas = ServicoDeSenhas.a_partir_de(settings)
+aviso = Aviso(settings.ALTERACOES_VERIFICACAO, settings.ALTERACOES_MAXIMO_ESPERAS)
+AVISOS.append(aviso)
+
+def carregadores_de_usuarios(coluna):
+    # Um carregador por destino: quem acabou de escrever não entra no lote da réplica
+    def buscar_em(destino):
+        # Sessão própria: o lote atende requisições diferentes
+        async def buscar(chaves):
+            async with roteador.sessao(destino) as db:
+                linhas = await db.execute(select(*colunas(UsuarioPublic, User)).where(coluna.in_(chaves)))
+                return {getattr(u, coluna.key): u for u in construir(UsuarioPublic, linhas.mappings())}
+        return buscar
+
+    return {
+        destino: CarregadorEmLote(
+            f"usuarios_por_{coluna.key}", buscar_em(destino),
+            settings.AGRUPAMENTO_JANELA_MS / 1000, settings.AGRUPAMENTO_LOTE_MAXIMO,
+        )
+        for destino in (PRIMARIA, REPLICA)
+    }
+
+usuarios_por_id = carregadores_de_usuarios(User.id)
+usuarios_por_nome = carregadores_de_usuarios(User.nome_usuario)
+
+def usuarios_alterados(response: Response, *ids: int):
+    # Caches do usuário e das listagens, consultas em lote já em andamento e
+    # leitura na primária para quem escreveu
+    respostas.invalidar(*(f"usuario:{id}" for id in ids))
+    respostas.nova_versao("usuarios")
+    for carregador in (*usuarios_por_id.values(), *usuarios_por_nome.values()):
+        carregador.esquecer()
+    roteador.registrar_escrita(response)
+
+def get_repositorio(db: Session = Depends(get_db)) -> ReceitaRepository:
+    return ReceitaRepository(db)
+
+def exportar_receitas(after: int):
+    # Sessão própria: a resposta continua sendo enviada depois do fim da rota
+    with SessionLocal() as db:
+        yield from ReceitaRepository(db).iterar(after)
+
+def invalidar_receita(receita_id: int, *nomes: str):
+    respostas.invalidar(f"receita:{receita_id}", *(f"receita:nome:{nome.casefold()}" for nome in nomes))
+    respostas.nova_versao("receitas")
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Formato de texto do Prometheus
+    return Response(registro.expor(), media_type=TIPO_PROMETHEUS)
+
+@app.get("/ready", include_in_schema=False)
+def ready():
+    # Readiness: 503 até o lifespan terminar o aquecimento
+    if not getattr(app.state, "pronto", False):
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail="Aquecendo")
+    return {"status": "pronto"}
+
+@app.get("/receitas", response_model=List[Receita], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+def get_receitas(
+    request: Request,
+    pagina: Pagina = Depends(),
+    ids: Optional[List[int]] = Depends(ids_do_lote),
+    receitas: ReceitaRepository = Depends(get_repositorio),
+):
+    if ids is not None:
+        # Várias receitas por id em uma consulta, na ordem pedida
+        encontradas, cabecalhos = no_lote(receitas.get_muitos(ids), ids)
+        return RespostaJSON.de(List[Receita], encontradas, headers=cabecalhos)
+
+    if pagina.formato == "ndjson":
+        return ndjson(exportar_receitas(pagina.after))
+
+    def produzir():
+        # Lidas como linhas e serializadas sem revalidar o response_model
+        itens = receitas.listar_schemas(limit=pagina.limit + 1, after=pagina.after)
+        itens, cabecalhos = pagina.cortar(itens, request)
+        return Entrada.criar(json_bytes(List[Receita], itens, validar=False), cabecalhos)
+
+    chave = respostas.chave_versionada("receitas", pagina.limit, pagina.after)
+    return respostas.responder(request, chave, produzir)
+
+@app.get("/receitas/compativeis", response_model=List[ReceitaCompativel], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+def get_receitas_compativeis(
+    despensa: List[str] = Query(default=[]),
+    incluir: List[str] = Query(default=[]),
+    excluir: List[str] = Query(default=[]),
+    limite: int = Query(default=20, ge=1, le=100),
+    receitas: ReceitaRepository = Depends(get_repositorio),
+):
+    # 1. Garante que o índice invertido foi montado neste processo
+    receitas.carregar_indices()
+
+    # 2. Ranqueia pelo número de ingredientes da despensa cobertos
+    resultados = indice_ingredientes.buscar(despensa, incluir, excluir, limite)
+
+    # 3. Carrega as receitas encontradas em uma única consulta
+    encontradas = receitas.get_muitos(r.receita_id for r in resultados)
+    disponiveis = {normalizar(i) for i in despensa}
+    resposta = []
+    for resultado in resultados:
+        receita = encontradas.get(resultado.receita_id)
+        if receita is None:
+            continue
+        resposta.append(ReceitaCompativel(
+            id=receita.id,
+            nome=receita.nome,
+            ingredientes=receita.ingredientes,
+            modo_de_preparo=receita.modo_de_preparo,
+            ingredientes_cobertos=resultado.cobertos,
+            ingredientes_faltantes=[i for i in receita.ingredientes if normalizar(i) not in disponiveis],
+        ))
+
+    # 4. Os itens já são schemas validados: serializa sem revalidar
+    return RespostaJSON.de(List[ReceitaCompativel], resposta, validar=False)
+
+@app.get("/receitas/search", response_model=List[ReceitaEncontrada], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+def buscar_receitas(
+    q: str = Query(min_length=1, max_length=200),
+    limite: int = Query(default=20, ge=1, le=100),
+    receitas: ReceitaRepository = Depends(get_repositorio),
+):
+    # 1. Sem busca no banco, o índice em memória precisa estar montado
+    receitas.carregar_indices()
+
+    # 2. Busca no nome, nos ingredientes e no modo de preparo, por relevância
+    encontradas = busca.buscar(receitas.db, q, limite)
+
+    # 3. Carrega as receitas encontradas em uma única consulta
+    por_id = receitas.get_muitos(e.receita_id for e in encontradas)
+    resposta = [
+        ReceitaEncontrada(
+            id=receita.id,
+            nome=receita.nome,
+            ingredientes=receita.ingredientes,
+            modo_de_preparo=receita.modo_de_preparo,
+            relevancia=encontrada.relevancia,
+        )
+        for encontrada in encontradas
+        if (receita := por_id.get(encontrada.receita_id)) is not None
+    ]
+    return RespostaJSON.de(List[ReceitaEncontrada], resposta, validar=False)
+
+@app.get("/receitas/export", status_code=HTTPStatus.OK)
+def exportar_todas_receitas(after: int = Query(default=0, ge=0)):
+    # NDJSON em ordem de id; use `after` para retomar uma exportação interrompida
+    return ndjson(exportar_receitas(after))
+
+def gravar_receitas(linhas: list, receitas: ReceitaRepository) -> RelatorioImportacao:
+    resultados = [None] * len(linhas)
+
+    # 1. Validação dos tipos em lote e das regras de cada receita
+    validos = []
+    for linha, receita in validar_em_lotes(BaseReceita, linhas, resultados):
+        try:
+            validar_tamanhos(receita)
+        except HTTPException as erro:
+            resultados[linha] = ResultadoLinha(linha=linha, status="invalido", erro=erro.detail)
+            continue
+        validos.append((linha, receita))
+
+    # 2. Nomes repetidos no lote ou já cadastrados (consulta por conjunto de nomes)
+    ja_gravados = {("nome", nome) for nome in receitas.nomes_em_uso(r.nome.casefold() for _, r in validos)}
+    unicos = deduplicar(validos, lambda r: [("nome", r.nome.casefold())], ja_gravados, resultados)
+
+    # 3. Inserção em lotes, em uma única transação
+    try:
+        ids = receitas.add_muitos([receita for _, receita in unicos])
+    except IntegrityError:
+        receitas.db.rollback()
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Outra requisição gravou receitas com os mesmos nomes; reenvie o lote")
+
+    respostas.nova_versao("receitas")
+    for (linha, _), receita_id in zip(unicos, ids):
+        resultados[linha] = ResultadoLinha(linha=linha, status="criado", id=receita_id)
+    return relatorio(resultados)
+
+@app.post("/receitas/bulk", response_model=RelatorioImportacao, status_code=HTTPStatus.OK)
+async def importar_receitas(request: Request, receitas: ReceitaRepository = Depends(get_repositorio)):
+    # Aceita um array JSON ou NDJSON (Content-Type: application/x-ndjson)
+    linhas = await ler_linhas(request)
+    return await run_in_threadpool(gravar_receitas, linhas, receitas)
+
+def carregar_indices():
+    with SessionLocal() as db:
+        ReceitaRepository(db).carregar_indices()
+
+async def indice_em_dia(indice):
+    # Em dia com as escritas dos outros workers: a consulta ao registro de
+    # alterações (e a montagem, se o aquecimento não a fez) roda fora do event loop
+    await run_in_threadpool(carregar_indices)
+    return indice
+
+# Sugestões a cada tecla: podem ficar um pouco no cache do navegador
+CACHE_SUGESTOES = {"Cache-Control": "max-age=30"}
+
+@app.get("/autocomplete/ingredientes", response_model=List[SugestaoIngrediente], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+async def autocompletar_ingrediente(
+    prefix: str = Query(min_length=1, max_length=100),
+    limite: int = Query(default=10, ge=1, le=TOPO_K),
+):
+    # Só memória: ingredientes que começam com o prefixo, dos mais usados aos menos
+    indice = await indice_em_dia(autocompletar_ingredientes)
+    sugestoes = [SugestaoIngrediente.model_construct(nome=nome, receitas=receitas) for nome, receitas in indice.buscar(prefix, limite)]
+    return RespostaJSON.de(List[SugestaoIngrediente], sugestoes, validar=False, headers=CACHE_SUGESTOES)
+
+@app.get("/autocomplete/receitas", response_model=List[SugestaoReceita], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+async def autocompletar_receita(
+    prefix: str = Query(min_length=1, max_length=100),
+    limite: int = Query(default=10, ge=1, le=TOPO_K),
+):
+    # Receitas cujo nome (ou uma palavra dele) começa com o prefixo
+    indice = await indice_em_dia(autocompletar_receitas)
+    sugestoes = [SugestaoReceita.model_construct(id=id, nome=nome) for id, nome in indice.buscar(prefix, limite)]
+    return RespostaJSON.de(List[SugestaoReceita], sugestoes, validar=False, headers=CACHE_SUGESTOES)
+
+@app.get("/receitas/{receita_id}/similares", response_model=List[ReceitaSimilar], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+def get_receitas_similares(
+    receita_id: int,
+    k: int = Query(default=10, ge=1, le=100),
+    receitas: ReceitaRepository = Depends(get_repositorio),
+):
+    # 1. Candidatas pelo LSH, ordenadas pelo Jaccard exato dos ingredientes
+    receitas.carregar_indices()
+    similares = indice_similares.similares(receita_id, k)
+    if similares is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Receita não encontrada")
 
+    # 2. Carrega as receitas encontradas em uma única consulta
+    por_id = receitas.get_muitos([receita_id, *(s.receita_id for s in similares)])
+    base = {normalizar(i) for i in por_id[receita_id].ingredientes} if receita_id in por_id else set()
+    resposta = [
+        ReceitaSimilar(
+            id=receita.id,
+            nome=receita.nome,
+            ingredientes=receita.ingredientes,
+            modo_de_preparo=receita.modo_de_preparo,
+            similaridade=round(similar.similaridade, 4),
+            ingredientes_em_comum=[i for i in receita.ingredientes if normalizar(i) in base],
+        )
+        for similar in similares
+        if (receita := por_id.get(similar.receita_id)) is not None
+    ]
+    return RespostaJSON.de(List[ReceitaSimilar], resposta, validar=False)
+
+@app.get("/receitas/{receita_id}", response_model=Receita, status_code=HTTPStatus.OK, response_class=RespostaJSON)
+def get_receita_by_id(receita_id: int, request: Request, receitas: ReceitaRepository = Depends(get_repositorio)):
+    def produzir():
+        receita = receitas.get(receita_id)
+        if receita is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Receita não encontrada")
+        return Entrada.criar(json_bytes(Receita, receita))
+
+    return respostas.responder(request, f"receita:{receita_id}", produzir)
+
+@app.get("/receitas/nome/{receita_nome}", response_model=Receita, status_code=HTTPStatus.OK, response_class=RespostaJSON)
+def get_receita_by_name(receita_nome: str, request: Request, receitas: ReceitaRepository = Depends(get_repositorio)):
+    def produzir():
+        receita = receitas.get_by_nome(receita_nome)
+        if receita is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Receita não encontrada")
+        return Entrada.criar(json_bytes(Receita, receita))
+
+    return respostas.responder(request, f"receita:nome:{receita_nome.casefold()}", produzir)
 
-@app.post("/receitas", response_model=Receita, status_code=HTTPStatus.CREATED)
-async def create_receita(receita: BaseReceita):
-    for r in receitas:
-        if r.nome.lower() == receita.nome.lower():
-            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Receita com este nome já existe") 
 
+def validar_tamanhos(receita: BaseReceita):
     if not (2 <= len(receita.nome) <= 50):
-       raise HTTPException (status_code=HTTPStatus.BAD_REQUEST, detail= "O nome da receita deve ter entre 2 e 50 caracteres")
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="O nome da receita deve ter entre 2 e 50 caracteres")
 
     if not (1 <= len(receita.ingredientes) <= 20):
-       raise HTTPException (status_code=HTTPStatus.BAD_REQUEST, detail= "A receita deve ter entre 1 e 20 ingredientes")
-    
-    if len(receitas) > 0:
-        novo_id = receitas[-1].id + 1
-    else:
-        novo_id=1
-    nova_receita = Receita(
-        id=novo_id,
-        nome=receita.nome,
-        ingredientes = receita.ingredientes,
-        modo_de_preparo = receita.modo_de_preparo
-    )
-    receitas.append(nova_receita)
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="A receita deve ter entre 1 e 20 ingredientes")
+
+@app.post("/receitas", response_model=Receita, status_code=HTTPStatus.CREATED)
+def create_receita(receita: BaseReceita, receitas: ReceitaRepository = Depends(get_repositorio)):
+    if receitas.nome_em_uso(receita.nome):
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Receita com este nome já existe") 
+
+    validar_tamanhos(receita)
+
+    try:
+        nova_receita = receitas.add(receita)
+    except IntegrityError:
+        # Outra requisição gravou o mesmo nome entre a verificação e o commit
+        receitas.db.rollback()
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Receita com este nome já existe")
+
+    respostas.nova_versao("receitas")
     return nova_receita
 
 @app.put("/receitas/{receita_id}",response_model=Receita, status_code=HTTPStatus.OK)
-async def update_receita(receita_id: int, receita: BaseReceita):
-    found_index = -1
-    for i, r in enumerate(receitas):
-        if r.id == receita_id:
-            found_index = i
-            break
-
-    if found_index == -1:
+def update_receita(receita_id: int, receita: BaseReceita, receitas: ReceitaRepository = Depends(get_repositorio)):
+    antiga = receitas.get(receita_id)
+    if antiga is None:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail= "Receita não encontrada")
+    nome_antigo = antiga.nome
 
-    for i, r in enumerate(receitas):
-        if i != found_index and r.nome.lower() == receita.nome.lower():
-            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Receita com este nome já existe")
+    if receitas.nome_em_uso(receita.nome, exceto_id=receita_id):
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Receita com este nome já existe")
 
     if not receita.nome or not receita.ingredientes or not receita.modo_de_preparo:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Nenhum campo pode ser vazio")
     if any(not ing for ing in receita.ingredientes):
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Nenhum ingrediente pode ser vazio")
 
-    if not (2 <= len(receita.nome) <= 50):
-        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="O nome da receita deve ter entre 2 e 50 caracteres")
+    validar_tamanhos(receita)
 
-    if not (1 <= len(receita.ingredientes) <= 20):
-        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="A receita deve ter entre 1 e 20 ingredientes")
+    try:
+        atualizada = receitas.update(receita_id, receita)
+    except IntegrityError:
+        receitas.db.rollback()
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Receita com este nome já existe")
 
-    receita.id = receita_id 
-    receitas[found_index] = receita
-    return receita
+    invalidar_receita(receita_id, nome_antigo, receita.nome)
+    return atualizada
 
 
 @app.delete("/receitas/{receita_id}",response_model=Receita, status_code=HTTPStatus.OK)
-async def delete_receita(receita_id: int):
-    if not receitas:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Não há receitas para excluir.")
-    found_index = -1
-    deleted_receita = None
-    for i, r in enumerate(receitas):
-        if r.id == receita_id:
-            found_index = i
-            deleted_receita = r
-            break
-
-    if found_index == -1:
+def delete_receita(receita_id: int, receitas: ReceitaRepository = Depends(get_repositorio)):
+    deleted_receita = receitas.delete(receita_id)
+    if deleted_receita is None:
+        if not receitas:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Não há receitas para excluir.")
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Receita não encontrada")
 
-    receitas.pop(found_index)
-    return {"message": f"Receita '{deleted_receita.nome}' (ID: {deleted_receita.id}) foi deletada com sucesso."}
-
+    invalidar_receita(receita_id, deleted_receita.nome)
+
+    # Retorna a receita deletada, conforme o response_model da rota
+    return deleted_receita
+
+
+# Mensagens de conflito por coluna única violada (users.email / users.nome_usuario)
+CONFLITOS_CRIACAO = {
+    "email": "Já existe um usuário cadastrado com este email.",
+    "nome_usuario": "Já existe um usuário cadastrado com este nome de usuário.",
+}
+CONFLITOS_ATUALIZACAO = {
+    "email": "Já existe outro usuário com este email.",
+    "nome_usuario": "Já existe outro usuário com este nome de usuário.",
+}
+
+# Restrições unique de users -> campo. PostgreSQL: nome padrão da restrição;
+# SQLite: tabela.coluna da mensagem "UNIQUE constraint failed: users.email"
+RESTRICOES_DE_USUARIOS = {
+    "users_email_key": "email",
+    "users_nome_usuario_key": "nome_usuario",
+    "users.email": "email",
+    "users.nome_usuario": "nome_usuario",
+}
+
+def campo_em_conflito(erro: IntegrityError) -> Optional[str]:
+    """O campo de users cuja restrição unique falhou; None para qualquer outra violação."""
+    original = erro.orig
+    # Pelo nome da restrição, nunca pelo texto (o DETAIL traz o valor gravado):
+    # psycopg expõe diag; no asyncpg, a exceção de origem
+    restricao = (
+        getattr(getattr(original, "diag", None), "constraint_name", None)
+        or getattr(original.__cause__, "constraint_name", None)
+    )
+    if restricao is None:
+        restricao = str(original).partition("UNIQUE constraint failed: ")[2] or None
+    return RESTRICOES_DE_USUARIOS.get(restricao)
 
 @app.post("/usuarios", response_model=UsuarioPublic, status_code=HTTPStatus.CREATED)
-def create_usuario(dados: BaseUsuario, db: Session = Depends(get_db)):
-    # 1. Validação de e-mail duplicado (Requisito: Email único)
-    existing_user = db.scalar(select(User).where(User.email == dados.email))
-    if existing_user:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT,
-            detail="Já existe um usuário cadastrado com este email."
-        )
-
-    # 2. Criação do objeto User
-    novo_usuario = User(
+async def create_usuario(dados: BaseUsuario, response: Response, db: AsyncSession = Depends(get_async_db)):
+    # 1. Dados do novo usuário, com a senha hasheada no pool de senhas
+    valores = dict(
         nome_usuario=dados.nome_usuario,
         email=dados.email,
-        senha=dados.senha # A senha deve ser hasheada em um projeto real, mas o requisito não pede
+        senha=await senhas.gerar_hash(dados.senha)
     )
 
-    # 3. Adiciona e commita no banco de dados
-    db.add(novo_usuario)
-    db.commit()
-    db.refresh(novo_usuario)
+    # 2. INSERT ... RETURNING em um único comando. E-mail duplicado (Requisito:
+    #    Email único) é detectado pela restrição unique, sem SELECT prévio
+    try:
+        if db.get_bind().dialect.insert_returning:
+            novo_usuario = await db.scalar(insert(User).values(**valores).returning(User))
+        else:
+            novo_usuario = User(**valores)
+            db.add(novo_usuario)
+            await db.flush()
+            await db.refresh(novo_usuario)
+        await registrar_async(db, USUARIO, CRIADO, [novo_usuario.id])
+        await aplicar_async(db, de_usuarios(criados=[novo_usuario.created_at]))
+        await db.commit()
+    except IntegrityError as erro:
+        await db.rollback()
+        campo = campo_em_conflito(erro)
+        if campo is None:
+            # Não é e-mail nem nome repetido: erro do servidor, não 409
+            raise
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT,
+            detail=CONFLITOS_CRIACAO[campo]
+        )
 
-    # 4. Retorna o usuário público
+    # 3. Retorna o usuário público
+    usuarios_alterados(response)
     return novo_usuario
 
-@app.get("/usuarios", status_code=HTTPStatus.OK, response_model=List[UsuarioPublic])
-def get_todos_usuarios(db: Session = Depends(get_db)):
-    # 1. Consulta todos os usuários
-    usuarios = db.scalars(select(User)).all()
-    
-    # 2. Retorna a lista (vazia ou preenchida)
-    return usuarios
+async def exportar_usuarios(after: int, destino: str):
+    async with roteador.sessao(destino) as db:
+        linhas = await db.stream(
+            select(*colunas(UsuarioPublic, User))
+            .where(User.id > after)
+            .order_by(User.id)
+            .execution_options(yield_per=1000)
+        )
+        async for lote in linhas.mappings().partitions():
+            for usuario in construir(UsuarioPublic, lote):
+                yield usuario
+
+@app.get("/usuarios", status_code=HTTPStatus.OK, response_model=List[UsuarioPublic], response_class=RespostaJSON)
+async def get_todos_usuarios(
+    request: Request,
+    pagina: Pagina = Depends(),
+    ids: Optional[List[int]] = Depends(ids_do_lote),
+    destino: str = Depends(destino_de_leitura),
+    db: AsyncSession = Depends(get_async_db_leitura),
+):
+    # Vários usuários por id, agrupados com as leituras de /usuarios/{id}
+    if ids is not None:
+        encontrados, cabecalhos = no_lote(await usuarios_por_id[destino].carregar_muitos(ids, roteador.escreveu_agora(request)), ids)
+        return RespostaJSON.de(List[UsuarioPublic], encontrados, validar=False, headers=cabecalhos)
+
+    # 1. Exportação completa em NDJSON, com memória constante
+    if pagina.formato == "ndjson":
+        return ndjson(exportar_usuarios(pagina.after, destino))
+
+    async def produzir():
+        # 2. Consulta uma página de usuários, ordenada por id, só com as colunas públicas
+        linhas = await db.execute(
+            select(*colunas(UsuarioPublic, User))
+            .where(User.id > pagina.after)
+            .order_by(User.id)
+            .limit(pagina.limit + 1)
+        )
+        usuarios = construir(UsuarioPublic, linhas.mappings())
+
+        # 3. A página (vazia ou preenchida) com o cursor da próxima, serializada
+        #    sem revalidar (os e-mails já foram validados na escrita)
+        usuarios, cabecalhos = pagina.cortar(usuarios, request)
+        return Entrada.criar(json_bytes(List[UsuarioPublic], usuarios, validar=False), cabecalhos)
+
+    # 4. Respondida do cache, já comprimida, enquanto nenhum usuário mudar
+    chave = respostas.chave_versionada("usuarios", pagina.limit, pagina.after)
+    return await respostas.responder_async(request, chave, produzir, de_replica=roteador.pode_estar_atrasado(destino))
+
+@app.get("/usuarios/export", status_code=HTTPStatus.OK)
+async def exportar_todos_usuarios(after: int = Query(default=0, ge=0), destino: str = Depends(destino_de_leitura)):
+    return ndjson(exportar_usuarios(after, destino))
+
+@app.post("/usuarios/bulk", response_model=RelatorioImportacao, status_code=HTTPStatus.OK)
+async def importar_usuarios(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    # 1. Lê o array JSON ou NDJSON e valida os tipos em lote
+    linhas = await ler_linhas(request)
+    resultados = [None] * len(linhas)
+    validos = validar_em_lotes(BaseUsuario, linhas, resultados)
+
+    # 2. E-mails e nomes já cadastrados, com uma consulta por lote
+    ja_gravados = set()
+    for lote in em_lotes(validos):
+        existentes = await db.execute(
+            select(User.email, User.nome_usuario).where(or_(
+                User.email.in_([u.email for _, u in lote]),
+                User.nome_usuario.in_([u.nome_usuario for _, u in lote]),
+            ))
+        )
+        for email, nome_usuario in existentes:
+            ja_gravados.update({("email", email), ("nome_usuario", nome_usuario)})
+    unicos = deduplicar(
+        validos,
+        lambda u: [("email", u.email), ("nome_usuario", u.nome_usuario)],
+        ja_gravados,
+        resultados,
+    )
 
-@app.get("/usuarios/{id}", response_model=UsuarioPublic, status_code=HTTPStatus.OK)
-def get_usuario_por_id(id: int, db: Session = Depends(get_db)):
-    # 1. Consulta o usuário pelo ID
-    usuario = db.scalar(select(User).where(User.id == id))
-    
-    # 2. Verifica se encontrou
-    if not usuario:
+    # 3. INSERT em lotes, em uma única transação (com o registro de alterações
+    #    e os agregados de /stats)
+    try:
+        criados, criados_em = [], []
+        for lote in em_lotes(unicos):
+            hashes = await senhas.gerar_hashes([u.senha for _, u in lote])
+            linhas_criadas = await db.execute(
+                insert(User).returning(User.id, User.created_at, sort_by_parameter_order=True),
+                [
+                    dict(nome_usuario=u.nome_usuario, email=u.email, senha=senha)
+                    for (_, u), senha in zip(lote, hashes)
+                ],
+            )
+            for (linha, _), (usuario_id, criado_em) in zip(lote, linhas_criadas):
+                resultados[linha] = ResultadoLinha(linha=linha, status="criado", id=usuario_id)
+                criados.append(usuario_id)
+                criados_em.append(criado_em)
+        await registrar_async(db, USUARIO, CRIADO, criados)
+        await aplicar_async(db, de_usuarios(criados=criados_em))
+        await db.commit()
+    except IntegrityError as erro:
+        await db.rollback()
+        if campo_em_conflito(erro) is None:
+            raise
         raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail="Usuário não encontrado"
+            status_code=HTTPStatus.CONFLICT,
+            detail="Outra requisição gravou usuários com os mesmos dados; reenvie o lote"
         )
-        
-    # 3. Retorna o usuário
+
+    usuarios_alterados(response)
+    return relatorio(resultados)
+
+@app.post("/usuarios/login", response_model=UsuarioPublic, status_code=HTTPStatus.OK)
+async def login(dados: Login, db: AsyncSession = Depends(get_async_db)):
+    # 1. Busca o usuário e confere a senha no pool de senhas
+    #    (sem usuário, contra o hash fictício: o mesmo tempo de uma senha errada)
+    usuario = await db.scalar(select(User).where(User.email == dados.email))
+    valida = await senhas.verificar(dados.senha, usuario.senha if usuario else senhas.hash_ficticio)
+    if not usuario or not valida:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail="E-mail ou senha inválidos"
+        )
+
+    # 2. Hash com parâmetros antigos (ou senha em texto puro): regrava com os
+    #    atuais. O WHERE na senha antiga evita sobrescrever uma troca de senha
+    #    concorrente, e updated_at é mantido porque os dados públicos não mudam
+    if senhas.precisa_rehash(usuario.senha):
+        await db.execute(
+            update(User)
+            .where(User.id == usuario.id, User.senha == usuario.senha)
+            .values(senha=await senhas.gerar_hash(dados.senha), updated_at=User.updated_at)
+        )
+        await db.commit()
+
     return usuario
 
-@app.get("/usuarios/nome/{nome_usuario}", response_model=UsuarioPublic, status_code=HTTPStatus.OK)
-def get_usuario_por_nome(nome_usuario: str, db: Session = Depends(get_db)):
-    # 1. Consulta o usuário pelo nome
-    usuario = db.scalar(select(User).where(User.nome_usuario == nome_usuario))
+@app.get("/usuarios/{id}", response_model=UsuarioPublic, status_code=HTTPStatus.OK, response_class=RespostaJSON)
+async def get_usuario_por_id(id: int, request: Request, destino: str = Depends(destino_de_leitura)):
+    async def produzir():
+        # 1. Consulta o usuário pelo ID, no mesmo lote das leituras simultâneas
+        usuario = await usuarios_por_id[destino].carregar(id, roteador.escreveu_agora(request))
+
+        # 2. Verifica se encontrou
+        if not usuario:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail="Usuário não encontrado"
+            )
+
+        # 3. Serializa o usuário público
+        return Entrada.criar(json_bytes(UsuarioPublic, usuario, validar=False))
+
+    # Respondido do cache (ou com 304) quando possível
+    return await respostas.responder_async(request, f"usuario:{id}", produzir, de_replica=roteador.pode_estar_atrasado(destino))
+
+@app.get("/usuarios/nome/{nome_usuario}", response_model=UsuarioPublic, status_code=HTTPStatus.OK, response_class=RespostaJSON)
+async def get_usuario_por_nome(nome_usuario: str, request: Request, destino: str = Depends(destino_de_leitura)):
+    # 1. Consulta o usuário pelo nome, no mesmo lote das leituras simultâneas
+    usuario = await usuarios_por_nome[destino].carregar(nome_usuario, roteador.escreveu_agora(request))
     
     # 2. Verifica se encontrou
     if not usuario:
@@ -173,47 +668,70 @@ def get_usuario_por_nome(nome_usuario: str, db: Session = Depends(get_db)):
             detail="Usuário não encontrado"
         )
         
-    # 3. Retorna o usuário
-    return usuario
+    # 3. Retorna o usuário já serializado
+    return RespostaJSON.de(UsuarioPublic, usuario, validar=False)
 
 @app.put("/usuarios/{id}", response_model=UsuarioPublic, status_code=HTTPStatus.OK)
-def update_usuario(id: int, dados: BaseUsuario, db: Session = Depends(get_db)):
-    # 1. Busca o usuário a ser atualizado
-    usuario = db.scalar(select(User).where(User.id == id))
-    
-    if not usuario:
+async def update_usuario(id: int, dados: BaseUsuario, response: Response, db: AsyncSession = Depends(get_async_db)):
+    # 1. Usuário inexistente responde 404 sem gastar um hash de senha (nem
+    #    esperar vaga no pool de hashes)
+    if await db.scalar(select(User.id).where(User.id == id)) is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail="Usuário não encontrado"
         )
 
-    # 2. Validação de e-mail duplicado (excluindo o próprio usuário)
-    existing_user_with_email = db.scalar(
-        select(User).where(User.email == dados.email, User.id != id)
+    # 2. UPDATE ... RETURNING: atualiza e devolve o usuário em um único comando.
+    #    O campo updated_at é atualizado pelo `onupdate=func.now()` no models.py
+    comando = (
+        update(User)
+        .where(User.id == id)
+        .values(
+            nome_usuario=dados.nome_usuario,
+            email=dados.email,
+            senha=await senhas.gerar_hash(dados.senha),
+        )
     )
-    if existing_user_with_email:
+    try:
+        if db.get_bind().dialect.update_returning:
+            usuario = await db.scalar(comando.returning(User))
+        else:
+            resultado = await db.execute(comando)
+            usuario = await db.get(User, id, populate_existing=True) if resultado.rowcount else None
+        if usuario:
+            await registrar_async(db, USUARIO, ATUALIZADO, [id])
+        await db.commit()
+    except IntegrityError as erro:
+        # 3. E-mail ou nome já usado por outro usuário (restrição unique)
+        await db.rollback()
+        campo = campo_em_conflito(erro)
+        if campo is None:
+            raise
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
-            detail="Já existe outro usuário com este email."
+            detail=CONFLITOS_ATUALIZACAO[campo]
         )
 
-    # 3. Atualiza os campos
-    usuario.nome_usuario = dados.nome_usuario
-    usuario.email = dados.email
-    usuario.senha = dados.senha
-    # O campo updated_at é atualizado automaticamente pelo `onupdate=func.now()` no models.py
+    # 4. Nenhuma linha atualizada: o usuário foi removido nesse meio tempo
+    if not usuario:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Usuário não encontrado"
+        )
 
-    # 4. Commita a transação
-    db.commit()
-    db.refresh(usuario)
-    
     # 5. Retorna o usuário atualizado
+    usuarios_alterados(response, id)
     return usuario
 
 @app.delete("/usuarios/{id}", response_model=UsuarioPublic, status_code=HTTPStatus.OK)
-def delete_usuario(id: int, db: Session = Depends(get_db)):
-    # 1. Busca o usuário a ser deletado
-    usuario = db.scalar(select(User).where(User.id == id))
+async def delete_usuario(id: int, response: Response, db: AsyncSession = Depends(get_async_db)):
+    # 1. DELETE ... RETURNING: remove e devolve os dados em um único comando
+    if db.get_bind().dialect.delete_returning:
+        usuario = await db.scalar(delete(User).where(User.id == id).returning(User))
+    else:
+        usuario = await db.get(User, id)
+        if usuario:
+            await db.delete(usuario)
     
     if not usuario:
         raise HTTPException(
@@ -221,9 +739,77 @@ def delete_usuario(id: int, db: Session = Depends(get_db)):
             detail="Usuário não encontrado"
         )
 
-    # 2. Deleta o usuário
-    db.delete(usuario)
-    db.commit()
+    # 2. Confirma a exclusão, com a lápide no registro de alterações e os agregados
+    await registrar_async(db, USUARIO, REMOVIDO, [id])
+    await aplicar_async(db, de_usuarios(removidos=[usuario.created_at]))
+    await db.commit()
+    usuarios_alterados(response, id)
     
     # 3. Retorna o usuário deletado (Requisito: retornar os dados do usuário deletado)
     return usuario
+
+
+@app.get("/changes", response_model=List[AlteracaoPublic], status_code=HTTPStatus.OK, response_class=RespostaJSON)
+async def get_alteracoes(
+    request: Request,
+    since: int = Query(default=0, ge=0, description="Último seq já aplicado; 0 sincroniza tudo"),
+    limit: int = Query(default=LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO),
+    espera: float = Query(default=0, ge=0, le=settings.ALTERACOES_ESPERA_MAXIMA, description="Long-poll: segundos esperando por alterações"),
+    formato: Literal["json", "sse"] = Query(default="json"),
+    last_event_id: Optional[int] = Header(default=None, ge=0),
+    destino: str = Depends(destino_de_leitura),
+):
+    # 1. Reconexão do SSE: o navegador manda o último id recebido
+    sse = formato == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    if sse and last_event_id is not None:
+        since = last_event_id
+
+    # 2. Lápides anteriores ao horizonte foram expurgadas: quem parou antes
+    #    delas pode ter perdido remoções e precisa recomeçar do zero
+    async with roteador.sessao(destino) as db:
+        expurgado_ate = await horizonte(db)
+    if 0 < since < expurgado_ate:
+        raise HTTPException(
+            status_code=HTTPStatus.GONE,
+            detail=f"Alterações até o seq {expurgado_ate} foram expurgadas; sincronize de novo com since=0",
+        )
+
+    # 3. Sessão curta por consulta: nenhuma conexão fica presa durante a espera
+    async def ler_pagina(desde):
+        async with roteador.sessao(destino) as db:
+            return await ler(db, desde, limit + 1)
+
+    async def mais_recente():
+        async with roteador.sessao(REPLICA) as db:
+            return await ultimo_seq(db)
+
+    if sse:
+        if aviso.lotado:
+            raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail="Muitas conexões esperando alterações", headers={"Retry-After": "5"})
+        return StreamingResponse(
+            eventos(aviso, ler_pagina, since, mais_recente),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # 4. JSON, esperando até `espera` segundos quando não há nada novo. O
+    #    cursor vem sempre em X-Next-Cursor (o próprio since, se vazio)
+    itens = await aguardar(aviso, ler_pagina, since, espera, mais_recente)
+    cabecalhos = {"Cache-Control": "no-store"}
+    if len(itens) > limit:
+        itens = itens[:limit]
+        proxima = request.url.include_query_params(since=itens[-1].seq, limit=limit)
+        cabecalhos["Link"] = f'<{proxima.path}?{proxima.query}>; rel="next"'
+    cabecalhos["X-Next-Cursor"] = str(itens[-1].seq if itens else since)
+    return RespostaJSON.de(List[AlteracaoPublic], itens, validar=False, headers=cabecalhos)
+
+
+@app.get("/stats", response_model=Estatisticas, status_code=HTTPStatus.OK, response_class=RespostaJSON)
+async def get_estatisticas(
+    limite: int = Query(default=10, ge=1, le=100, description="Quantos ingredientes mais usados"),
+    dias: int = Query(default=30, ge=1, le=366, description="Cadastros de usuários dos últimos N dias"),
+    db: AsyncSession = Depends(get_async_db_leitura),
+):
+    # Lidas das tabelas de agregados, mantidas a cada escrita: sem varrer receitas nem usuários
+    resumo = await estatisticas.ler(db, limite, dias)
+    return RespostaJSON.de(Estatisticas, resumo, validar=False)
@@ -0,0 +1,331 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TIPO_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Rótulo das requisições que não casaram com nenhuma rota (404, 405...): o
+# caminho bruto não entra como rótulo para não explodir a cardinalidade
+SEM_ROTA = '<sem rota>'
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_SQL = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+BUCKETS_TAMANHO = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+log_lentas = logging.getLogger('metricas.lentas')
+
+Rotulos = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Metrica:
+    """Série nomeada com rótulos fixos, no formato de texto do Prometheus."""
+
+    tipo = 'untyped'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores: Dict[Rotulos, object] = {}
+        self._lock = threading.Lock()
+
+    def _seletor(self, valores: Rotulos, extra: str = '') -> str:
+        pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(self.rotulos, valores)]
+        if extra:
+            pares.append(extra)
+        return '{' + ','.join(pares) + '}' if pares else ''
+
+    def _amostras(self) -> List[str]:
+        with self._lock:
+            return [
+                f'{self.nome}{self._seletor(rotulos)} {_formatar(valor)}'
+                for rotulos, valor in self._valores.items()
+            ]
+
+    def expor(self) -> str:
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} {self.tipo}']
+        linhas.extend(self._amostras())
+        return '\n'.join(linhas)
+
+
+class Contador(Metrica):
+    tipo = 'counter'
+
+    def inc(self, rotulos: Rotulos = (), valor: float = 1) -> None:
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+
+class Medidor(Metrica):
+    """Gauge. Com ``coletar``, os valores são lidos na hora da exposição."""
+
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, rotulos=(), coletar: Optional[Callable[[], Dict[Rotulos, float]]] = None):
+        super().__init__(nome, ajuda, rotulos)
+        self.coletar = coletar
+
+    def inc(self, rotulos: Rotulos = (), valor: float = 1) -> None:
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def dec(self, rotulos: Rotulos = (), valor: float = 1) -> None:
+        self.inc(rotulos, -valor)
+
+    def _amostras(self) -> List[str]:
+        if self.coletar is not None:
+            valores = self.coletar()
+            with self._lock:
+                self._valores = dict(valores)
+        return super()._amostras()
+
+
+class Histograma(Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, rotulos: Rotulos = ()) -> None:
+        # Contagem por faixa (não acumulada) + soma + total; acumula só ao expor
+        posicao = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._valores.get(rotulos)
+            if serie is None:
+                serie = self._valores[rotulos] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def _amostras(self) -> List[str]:
+        with self._lock:
+            series = [(rotulos, list(faixas), soma, total) for rotulos, (faixas, soma, total) in self._valores.items()]
+        linhas = []
+        for rotulos, faixas, soma, total in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), faixas):
+                acumulado += contagem
+                le = f'le="{_formatar(limite)}"'
+                linhas.append(f'{self.nome}_bucket{self._seletor(rotulos, le)} {acumulado}')
+            linhas.append(f'{self.nome}_sum{self._seletor(rotulos)} {_formatar(soma)}')
+            linhas.append(f'{self.nome}_count{self._seletor(rotulos)} {total}')
+        return linhas
+
+
+class Registro:
+    def __init__(self):
+        self.metricas: List[Metrica] = []
+
+    def _registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=(), coletar=None) -> Medidor:
+        return self._registrar(Medidor(nome, ajuda, rotulos, coletar))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def expor(self) -> str:
+        return '\n'.join(metrica.expor() for metrica in self.metricas) + '\n'
+
+
+registro = Registro()
+
+# Requisições HTTP, por rota (o template, não o caminho com ids)
+requisicoes = registro.contador(
+    'http_requests_total', 'Requisições atendidas', ('method', 'route', 'status'))
+latencia = registro.histograma(
+    'http_request_duration_seconds', 'Duração das requisições, até o fim do corpo', ('method', 'route'))
+em_andamento = registro.medidor(
+    'http_requests_in_flight', 'Requisições em andamento')
+tamanho_resposta = registro.histograma(
+    'http_response_size_bytes', 'Tamanho do corpo das respostas', ('method', 'route'), BUCKETS_TAMANHO)
+consultas_por_requisicao = registro.histograma(
+    'http_request_db_queries', 'Comandos SQL por requisição', ('method', 'route'), BUCKETS_CONSULTAS)
+tempo_sql_por_requisicao = registro.histograma(
+    'http_request_db_duration_seconds', 'Tempo em SQL por requisição', ('method', 'route'))
+
+# Banco de dados, por engine ("sync" ou "async")
+consultas = registro.contador(
+    'db_queries_total', 'Comandos SQL executados', ('engine',))
+tempo_consulta = registro.histograma(
+    'db_query_duration_seconds', 'Duração de cada comando SQL', ('engine',), BUCKETS_SQL)
+espera_pool = registro.histograma(
+    'db_pool_checkout_wait_seconds', 'Espera para obter uma conexão do pool', ('engine',), BUCKETS_SQL)
+uso_pool = registro.histograma(
+    'db_pool_checkout_duration_seconds', 'Tempo em que cada conexão ficou emprestada', ('engine',))
+
+_engines: Dict[str, Engine] = {}
+
+
+def _estado_dos_pools(metodo: str) -> Callable[[], Dict[Rotulos, float]]:
+    def coletar():
+        # O pool é lido a cada coleta: engine.dispose() troca a instância
+        return {
+            (nome,): getattr(engine.pool, metodo)()
+            for nome, engine in _engines.items()
+            if hasattr(engine.pool, metodo)
+        }
+    return coletar
+
+
+registro.medidor('db_pool_connections_in_use', 'Conexões emprestadas agora', ('engine',), _estado_dos_pools('checkedout'))
+registro.medidor('db_pool_size', 'Tamanho configurado do pool', ('engine',), _estado_dos_pools('size'))
+registro.medidor('db_pool_overflow', 'Conexões além do pool_size (negativo: vagas ainda não abertas)', ('engine',), _estado_dos_pools('overflow'))
+
+
+@dataclass
+class MedicaoRequisicao:
+    """SQL executado durante uma requisição; ``comandos`` só com o log de lentas."""
+
+    consultas: int = 0
+    tempo_sql: float = 0.0
+    comandos: Optional[List[Tuple[float, str]]] = None
+    max_comandos: int = 0
+
+
+# A medição é criada pelo middleware e vista pelos hooks do SQLAlchemy; as
+# rotas síncronas rodam no threadpool com uma cópia deste contexto
+_medicao_atual: ContextVar[Optional[MedicaoRequisicao]] = ContextVar('medicao_atual', default=None)
+
+
+def instrumentar(engine: Engine, nome: str) -> None:
+    """Liga os hooks de SQL e de pool da engine (a síncrona, no caso da assíncrona)."""
+    _engines[nome] = engine
+    rotulos = (nome,)
+
+    # A espera pelo pool é medida em volta de engine.connect (que sessões,
+    # engine.begin e a engine assíncrona usam): o pool não tem um evento
+    # "antes do checkout", e o pool recriado por engine.dispose continua medido
+    conectar = engine.connect
+
+    @wraps(conectar)
+    def connect():
+        inicio = time.perf_counter()
+        try:
+            return conectar()
+        finally:
+            espera_pool.observar(time.perf_counter() - inicio, rotulos)
+
+    engine.connect = connect
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('inicio_sql', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info['inicio_sql'].pop()
+        consultas.inc(rotulos)
+        tempo_consulta.observar(duracao, rotulos)
+
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            medicao.consultas += 1
+            medicao.tempo_sql += duracao
+            if medicao.comandos is not None and len(medicao.comandos) < medicao.max_comandos:
+                medicao.comandos.append((duracao, statement))
+
+    @event.listens_for(engine, 'handle_error')
+    def erro(contexto):
+        # Comando que falhou não chega ao after_cursor_execute
+        pilha = contexto.connection.info.get('inicio_sql') if contexto.connection else None
+        if pilha:
+            pilha.pop()
+
+    @event.listens_for(engine.pool, 'checkout')
+    def emprestada(conexao, registro_conexao, proxy):
+        registro_conexao.info['emprestada_em'] = time.perf_counter()
+
+    @event.listens_for(engine.pool, 'checkin')
+    def devolvida(conexao, registro_conexao):
+        inicio = registro_conexao.info.pop('emprestada_em', None)
+        if inicio is not None:
+            uso_pool.observar(time.perf_counter() - inicio, rotulos)
+
+
+class MiddlewareDeMetricas:
+    """Middleware ASGI: latência, tamanho e SQL por rota, e o log de lentas.
+
+    A requisição é medida até o último pedaço do corpo, então exportações em
+    streaming contam o tempo todo. Com ``limiar_lentas_ms`` as requisições
+    mais lentas que o limiar vão para o log ``metricas.lentas`` com o SQL que
+    executaram (até ``max_comandos`` comandos).
+    """
+
+    def __init__(self, app, limiar_lentas_ms: Optional[float] = None, max_comandos: int = 50):
+        self.app = app
+        self.limiar = None if limiar_lentas_ms is None else limiar_lentas_ms / 1000
+        self.max_comandos = max_comandos
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        medicao = MedicaoRequisicao()
+        if self.limiar is not None:
+            medicao.comandos, medicao.max_comandos = [], self.max_comandos
+        token = _medicao_atual.set(medicao)
+        status, tamanho = 500, 0
+
+        async def enviar(mensagem):
+            nonlocal status, tamanho
+            if mensagem['type'] == 'http.response.start':
+                status = mensagem['status']
+            elif mensagem['type'] == 'http.response.body':
+                tamanho += len(mensagem.get('body', b''))
+            await send(mensagem)
+
+        em_andamento.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - inicio
+            em_andamento.dec()
+            _medicao_atual.reset(token)
+
+            # O roteador grava a rota no próprio scope ao encontrá-la
+            rota = getattr(scope.get('route'), 'path', SEM_ROTA)
+            rotulos = (scope['method'], rota)
+            requisicoes.inc(rotulos + (str(status),))
+            latencia.observar(duracao, rotulos)
+            tamanho_resposta.observar(tamanho, rotulos)
+            consultas_por_requisicao.observar(medicao.consultas, rotulos)
+            tempo_sql_por_requisicao.observar(medicao.tempo_sql, rotulos)
+
+            if self.limiar is not None and duracao >= self.limiar:
+                self._registrar_lenta(scope, status, duracao, medicao)
+
+    def _registrar_lenta(self, scope, status, duracao, medicao):
+        comandos = '\n'.join(f'  {tempo * 1000:8.2f} ms  {sql}' for tempo, sql in medicao.comandos)
+        log_lentas.warning(
+            '%s %s -> %s em %.1f ms; %d comandos SQL em %.1f ms\n%s',
+            scope['method'], scope['path'], status, duracao * 1000,
+            medicao.consultas, medicao.tempo_sql * 1000, comandos,
+        )
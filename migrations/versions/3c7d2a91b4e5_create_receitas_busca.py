@@ -0,0 +1,77 @@
+"""create receitas_busca (full-text search)
+
+Revision ID: 3c7d2a91b4e5
+Revises: f5606eb8c0a1
+Create Date: 2026-10-18 15:20:41.512307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7d2a91b4e5'
+down_revision: Union[str, Sequence[str], None] = 'f5606eb8c0a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# DDL e carga inicial congelados nesta revisão: mudanças futuras em busca.py
+# vão em revisões novas
+FTS5 = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS receitas_busca USING fts5("
+    "nome, ingredientes, modo_de_preparo, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS receitas_busca_vocab USING fts5vocab(receitas_busca, 'row')",
+    "INSERT INTO receitas_busca (rowid, nome, ingredientes, modo_de_preparo) "
+    "SELECT r.id, r.nome, coalesce(group_concat(i.nome, ' '), ''), r.modo_de_preparo "
+    "FROM receitas r "
+    "LEFT JOIN receita_ingredientes ri ON ri.receita_id = r.id "
+    "LEFT JOIN ingredientes i ON i.id = ri.ingrediente_id "
+    "WHERE r.id NOT IN (SELECT rowid FROM receitas_busca) GROUP BY r.id",
+]
+
+POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE TABLE IF NOT EXISTS receitas_busca ("
+    " receita_id integer PRIMARY KEY REFERENCES receitas (id) ON DELETE CASCADE,"
+    " nome text NOT NULL,"
+    " documento tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_receitas_busca_documento ON receitas_busca USING gin (documento)",
+    "CREATE INDEX IF NOT EXISTS ix_receitas_busca_nome ON receitas_busca USING gin (nome gin_trgm_ops)",
+    "INSERT INTO receitas_busca (receita_id, nome, documento) "
+    "SELECT r.id, unaccent(lower(r.nome)), "
+    "setweight(to_tsvector('simple', unaccent(lower(r.nome))), 'A') "
+    "|| setweight(to_tsvector('simple', unaccent(lower(coalesce(string_agg(i.nome, ' '), '')))), 'B') "
+    "|| setweight(to_tsvector('simple', unaccent(lower(r.modo_de_preparo))), 'C') "
+    "FROM receitas r "
+    "LEFT JOIN receita_ingredientes ri ON ri.receita_id = r.id "
+    "LEFT JOIN ingredientes i ON i.id = ri.ingrediente_id "
+    "WHERE NOT EXISTS (SELECT 1 FROM receitas_busca b WHERE b.receita_id = r.id) GROUP BY r.id",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Cria a tabela de busca do dialeto e indexa as receitas existentes.
+    # Sem FTS5 nem PostgreSQL a API usa o índice em memória e não há o que criar.
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'postgresql':
+        comandos = POSTGRES
+    elif conexao.dialect.name == 'sqlite' and 'ENABLE_FTS5' in {
+        linha[0] for linha in conexao.exec_driver_sql('PRAGMA compile_options')
+    }:
+        comandos = FTS5
+    else:
+        return
+    for comando in comandos:
+        conexao.exec_driver_sql(comando)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS receitas_busca_vocab")
+    op.execute("DROP TABLE IF EXISTS receitas_busca")
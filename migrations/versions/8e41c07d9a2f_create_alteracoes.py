@@ -0,0 +1,56 @@
+"""create alteracoes (change feed)
+
+Revision ID: 8e41c07d9a2f
+Revises: 3c7d2a91b4e5
+Create Date: 2026-10-18 18:42:10.204113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41c07d9a2f'
+down_revision: Union[str, Sequence[str], None] = '3c7d2a91b4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('alteracoes',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('entidade', sa.String(), nullable=False),
+    sa.Column('entidade_id', sa.Integer(), nullable=False),
+    sa.Column('operacao', sa.String(), nullable=False),
+    sa.Column('criado_em', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True,
+    )
+    op.create_index('ix_alteracoes_entidade', 'alteracoes', ['entidade', 'entidade_id'], unique=False)
+    op.create_index('ix_alteracoes_operacao_criado_em', 'alteracoes', ['operacao', 'criado_em'], unique=False)
+    op.create_table('alteracoes_horizonte',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Os itens que já existem entram no registro como criados: since=0 traz tudo
+    op.execute(
+        "INSERT INTO alteracoes (entidade, entidade_id, operacao) "
+        "SELECT 'receita', id, 'criado' FROM receitas ORDER BY id"
+    )
+    op.execute(
+        "INSERT INTO alteracoes (entidade, entidade_id, operacao) "
+        "SELECT 'usuario', id, 'criado' FROM users ORDER BY id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('alteracoes_horizonte')
+    op.drop_index('ix_alteracoes_operacao_criado_em', table_name='alteracoes')
+    op.drop_index('ix_alteracoes_entidade', table_name='alteracoes')
+    op.drop_table('alteracoes')
@@ -0,0 +1,64 @@
+"""create estatisticas (agregados de /stats)
+
+Revision ID: b7f3e2c95d14
+Revises: 8e41c07d9a2f
+Create Date: 2026-10-18 21:07:33.518240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3e2c95d14'
+down_revision: Union[str, Sequence[str], None] = '8e41c07d9a2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('estatisticas',
+    sa.Column('chave', sa.String(), nullable=False),
+    sa.Column('valor', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('chave')
+    )
+    op.create_table('estatisticas_ingredientes',
+    sa.Column('ingrediente_id', sa.Integer(), nullable=False),
+    sa.Column('receitas', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ingrediente_id'], ['ingredientes.id'], ),
+    sa.PrimaryKeyConstraint('ingrediente_id')
+    )
+    op.create_index('ix_estatisticas_ingredientes_receitas', 'estatisticas_ingredientes', ['receitas', 'ingrediente_id'], unique=False)
+    op.create_table('estatisticas_cadastros',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('usuarios', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia')
+    )
+
+    # Agregados iniciais a partir dos dados existentes; daqui em diante cada
+    # escrita os atualiza
+    op.execute(
+        "INSERT INTO estatisticas (chave, valor) "
+        "SELECT 'receitas', count(*) FROM receitas "
+        "UNION ALL SELECT 'itens', count(*) FROM receita_ingredientes "
+        "UNION ALL SELECT 'usuarios', count(*) FROM users"
+    )
+    op.execute(
+        "INSERT INTO estatisticas_ingredientes (ingrediente_id, receitas) "
+        "SELECT ingrediente_id, count(DISTINCT receita_id) FROM receita_ingredientes GROUP BY ingrediente_id"
+    )
+    op.execute(
+        "INSERT INTO estatisticas_cadastros (dia, usuarios) "
+        "SELECT date(created_at), count(*) FROM users GROUP BY date(created_at)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('estatisticas_cadastros')
+    op.drop_index('ix_estatisticas_ingredientes_receitas', table_name='estatisticas_ingredientes')
+    op.drop_table('estatisticas_ingredientes')
+    op.drop_table('estatisticas')
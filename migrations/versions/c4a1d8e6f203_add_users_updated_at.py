@@ -0,0 +1,34 @@
+"""add users.updated_at
+
+Revision ID: c4a1d8e6f203
+Revises: b7f3e2c95d14
+Create Date: 2026-10-18 23:12:41.377025
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a1d8e6f203'
+down_revision: Union[str, Sequence[str], None] = 'b7f3e2c95d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # O models.User tem updated_at desde o início, mas a tabela foi criada
+    # sem ela. No SQLite uma coluna com default não constante só entra
+    # recriando a tabela (batch); as linhas existentes recebem o horário da
+    # migração
+    with op.batch_alter_table('users', recreate='always' if op.get_context().dialect.name == 'sqlite' else 'auto') as batch:
+        batch.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch:
+        batch.drop_column('updated_at')
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import List
 
-from sqlalchemy import func
-from sqlalchemy.orm import Mapped, mapped_as_dataclass, mapped_column, registry
+from sqlalchemy import ForeignKey, Index, func
+from sqlalchemy.orm import Mapped, mapped_as_dataclass, mapped_column, registry, relationship
 
 table_registry = registry()
 
@@ -11,7 +12,7 @@ class User:
     __tablename__ = 'users'
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
-    nome_usuario: Mapped[str]
+    nome_usuario: Mapped[str] = mapped_column(unique=True)
     senha: Mapped[str]
     email: Mapped[str] = mapped_column(unique=True)
     created_at: Mapped[datetime] = mapped_column(
@@ -21,3 +22,122 @@ class User:
         init=False, server_default=func.now(), onupdate=func.now()
     )
 
+
+@mapped_as_dataclass(table_registry)
+class Ingrediente:
+    __tablename__ = 'ingredientes'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    nome: Mapped[str] = mapped_column(unique=True)
+
+
+@mapped_as_dataclass(table_registry)
+class ReceitaIngrediente:
+    __tablename__ = 'receita_ingredientes'
+    __table_args__ = (
+        # Índice invertido: ingrediente -> receitas que o utilizam
+        Index('ix_receita_ingredientes_ingrediente_id', 'ingrediente_id'),
+    )
+
+    receita_id: Mapped[int] = mapped_column(
+        ForeignKey('receitas.id', ondelete='CASCADE'), init=False, primary_key=True
+    )
+    posicao: Mapped[int] = mapped_column(primary_key=True)
+    ingrediente_id: Mapped[int] = mapped_column(
+        ForeignKey('ingredientes.id'), init=False
+    )
+    ingrediente: Mapped[Ingrediente] = relationship(lazy='joined')
+
+
+@mapped_as_dataclass(table_registry)
+class Receita:
+    __tablename__ = 'receitas'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    nome: Mapped[str]
+    # Nome em casefold, usado nas buscas por nome e na restrição de unicidade
+    nome_normalizado: Mapped[str] = mapped_column(unique=True)
+    modo_de_preparo: Mapped[str]
+    itens: Mapped[List[ReceitaIngrediente]] = relationship(
+        default_factory=list,
+        cascade='all, delete-orphan',
+        order_by=ReceitaIngrediente.posicao,
+        lazy='selectin',
+    )
+
+    @property
+    def ingredientes(self) -> List[str]:
+        return [item.ingrediente.nome for item in self.itens]
+
+
+@mapped_as_dataclass(table_registry)
+class Alteracao:
+    """Entrada do registro de alterações (feed de /changes).
+
+    Gravada na mesma transação da escrita. Só a entrada mais recente de cada
+    receita ou usuário fica no registro; remoções ficam como "lápides" até
+    vencer a retenção.
+    """
+
+    __tablename__ = 'alteracoes'
+    __table_args__ = (
+        Index('ix_alteracoes_entidade', 'entidade', 'entidade_id'),
+        Index('ix_alteracoes_operacao_criado_em', 'operacao', 'criado_em'),
+        # AUTOINCREMENT: o SQLite nunca reaproveita um seq, nem depois do expurgo
+        {'sqlite_autoincrement': True},
+    )
+
+    seq: Mapped[int] = mapped_column(init=False, primary_key=True)
+    entidade: Mapped[str]
+    entidade_id: Mapped[int]
+    operacao: Mapped[str]
+    criado_em: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
+
+
+@mapped_as_dataclass(table_registry)
+class HorizonteAlteracoes:
+    __tablename__ = 'alteracoes_horizonte'
+
+    # Linha única: maior seq de lápide já expurgada. Um cliente com ``since``
+    # abaixo dele pode ter perdido remoções e precisa sincronizar do zero.
+    id: Mapped[int] = mapped_column(primary_key=True)
+    seq: Mapped[int]
+
+
+@mapped_as_dataclass(table_registry)
+class Estatistica:
+    """Contador agregado do catálogo (receitas, itens, usuários).
+
+    Atualizado na mesma transação de cada escrita, com ``valor = valor + n``;
+    ``estatisticas.reconciliar`` o confere de tempos em tempos com as tabelas
+    de origem.
+    """
+
+    __tablename__ = 'estatisticas'
+
+    chave: Mapped[str] = mapped_column(primary_key=True)
+    valor: Mapped[int]
+
+
+@mapped_as_dataclass(table_registry)
+class EstatisticaIngrediente:
+    __tablename__ = 'estatisticas_ingredientes'
+    __table_args__ = (
+        # Top-N direto do índice, percorrido de trás para frente
+        Index('ix_estatisticas_ingredientes_receitas', 'receitas', 'ingrediente_id'),
+    )
+
+    # Receitas que usam o ingrediente (0 quando nenhuma usa mais)
+    ingrediente_id: Mapped[int] = mapped_column(ForeignKey('ingredientes.id'), primary_key=True)
+    receitas: Mapped[int]
+
+
+@mapped_as_dataclass(table_registry)
+class CadastrosPorDia:
+    __tablename__ = 'estatisticas_cadastros'
+
+    # Usuários existentes cadastrados no dia (o dia de created_at)
+    dia: Mapped[date] = mapped_column(primary_key=True)
+    usuarios: Mapped[int]
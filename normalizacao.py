@@ -0,0 +1,8 @@
+import unicodedata
+
+
+def normalizar(texto: str) -> str:
+    """Casefold, remove acentos e espaços repetidos ("Açúcar " -> "acucar")."""
+    decomposto = unicodedata.normalize('NFKD', texto.casefold())
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.split())
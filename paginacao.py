@@ -0,0 +1,78 @@
+from http import HTTPStatus
+from typing import AsyncIterable, Dict, Iterable, List, Literal, Optional, Tuple, TypeVar, Union
+
+from fastapi import HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+# Ids aceitos por requisição em ``?ids=``
+LIMITE_IDS = 100
+
+Formato = Literal['json', 'ndjson']
+
+T = TypeVar('T')
+
+
+class Pagina:
+    """Parâmetros de paginação por chave (keyset) comuns às listagens.
+
+    ``after`` é o id do último item da página anterior; a ordem é sempre por id,
+    então as páginas não se repetem nem pulam itens quando há inserções.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(default=LIMITE_PADRAO, ge=1, le=LIMITE_MAXIMO),
+        after: int = Query(default=0, ge=0),
+        formato: Formato = Query(default='json'),
+    ):
+        self.limit = limit
+        self.after = after
+        self.formato = formato
+
+    def cortar(self, itens: List[T], request: Request) -> Tuple[List[T], Dict[str, str]]:
+        """Recebe até ``limit + 1`` itens e monta os cabeçalhos da próxima página."""
+        cabecalhos = {}
+        if len(itens) > self.limit:
+            itens = itens[:self.limit]
+            cursor = itens[-1].id
+            proxima = request.url.include_query_params(after=cursor, limit=self.limit)
+            cabecalhos['X-Next-Cursor'] = str(cursor)
+            # Link relativo: a página pode vir do cache para qualquer host
+            cabecalhos['Link'] = f'<{proxima.path}?{proxima.query}>; rel="next"'
+        return itens, cabecalhos
+
+
+def ids_do_lote(
+    ids: Optional[str] = Query(default=None, description=f'Até {LIMITE_IDS} ids separados por vírgula'),
+) -> Optional[List[int]]:
+    """Ids de ``?ids=1,2,3``, sem repetições e na ordem pedida; None sem o parâmetro."""
+    if ids is None:
+        return None
+    try:
+        lista = list(dict.fromkeys(int(parte) for parte in ids.split(',') if parte.strip()))
+    except ValueError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Os ids devem ser números inteiros separados por vírgula")
+    if not 1 <= len(lista) <= LIMITE_IDS:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Informe entre 1 e {LIMITE_IDS} ids")
+    return lista
+
+
+def no_lote(itens: Dict[int, T], ids: List[int]) -> Tuple[List[T], Dict[str, str]]:
+    """Os itens encontrados na ordem de ``ids``; os ausentes vão no cabeçalho X-Missing-Ids."""
+    cabecalhos = {}
+    ausentes = [str(i) for i in ids if i not in itens]
+    if ausentes:
+        cabecalhos['X-Missing-Ids'] = ','.join(ausentes)
+    return [itens[i] for i in ids if i in itens], cabecalhos
+
+
+def ndjson(linhas: Union[Iterable[BaseModel], AsyncIterable[BaseModel]]) -> StreamingResponse:
+    # Um objeto JSON por linha, serializado à medida que o cursor avança
+    if isinstance(linhas, AsyncIterable):
+        corpo = (linha.model_dump_json() + '\n' async for linha in linhas)
+    else:
+        corpo = (linha.model_dump_json() + '\n' for linha in linhas)
+    return StreamingResponse(corpo, media_type='application/x-ndjson')
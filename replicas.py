@@ -0,0 +1,105 @@
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Sequence
+
+from fastapi import Request, Response
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from metricas import registro
+
+PRIMARIA = 'primaria'
+REPLICA = 'replica'
+
+# Até quando (epoch, em segundos) o cliente lê da primária depois de escrever
+COOKIE_ESCRITA = 'leitura_primaria_ate'
+
+roteadas = registro.contador(
+    'db_read_sessions_total', 'Sessões de leitura por destino efetivo', ('target',))
+
+
+class RoteadorDeLeituras:
+    """Escolhe o banco das sessões de leitura: réplicas em rodízio ou a primária.
+
+    Uma réplica que não conecta fica fora por ``pausa_apos_falha`` segundos e
+    a leitura vai para a próxima (ou para a primária). Com ``com_atraso``
+    (réplicas de verdade, que podem estar atrás da primária), quem acabou de
+    escrever recebe um cookie e lê da primária por ``janela`` segundos; o
+    cookie vale em qualquer worker. Sem réplicas, tudo vai para a primária.
+    """
+
+    def __init__(
+        self,
+        primaria: async_sessionmaker,
+        replicas: Sequence[async_sessionmaker] = (),
+        janela: float = 5,
+        com_atraso: bool = True,
+        pausa_apos_falha: float = 30,
+    ):
+        self.primaria = primaria
+        self.replicas = list(replicas)
+        self.janela = janela
+        self.com_atraso = com_atraso
+        self.pausa_apos_falha = pausa_apos_falha
+        self._rodizio = itertools.count()
+        self._fora_ate: Dict[int, float] = {}
+
+    def destino(self, request: Request) -> str:
+        if not self.replicas:
+            return PRIMARIA
+        if self.com_atraso and self.escreveu_agora(request):
+            return PRIMARIA
+        return REPLICA
+
+    def escreveu_agora(self, request: Request) -> bool:
+        """Se o cliente escreveu há menos de ``janela`` segundos (pelo cookie, em qualquer worker)."""
+        try:
+            return float(request.cookies.get(COOKIE_ESCRITA, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def registrar_escrita(self, response: Response) -> None:
+        if self.replicas and self.com_atraso:
+            response.set_cookie(
+                COOKIE_ESCRITA, f'{time.time() + self.janela:.3f}',
+                max_age=math.ceil(self.janela), httponly=True, samesite='lax',
+            )
+
+    def pode_estar_atrasado(self, destino: str) -> bool:
+        """Se o lido em ``destino`` pode não ter as últimas escritas (réplica de verdade).
+
+        O cache de respostas não grava essas leituras logo depois de uma
+        invalidação (ver ``CacheDeRespostas``), que vale para todos os workers.
+        """
+        return destino == REPLICA and bool(self.replicas) and self.com_atraso
+
+    async def _abrir_replica(self) -> Optional[AsyncSession]:
+        agora = time.monotonic()
+        inicio = next(self._rodizio)
+        for passo in range(len(self.replicas)):
+            indice = (inicio + passo) % len(self.replicas)
+            if self._fora_ate.get(indice, 0) > agora:
+                continue
+            db = self.replicas[indice]()
+            try:
+                # Conecta já: a falha aparece aqui, não no meio da rota
+                await db.connection()
+            except (DBAPIError, OSError):
+                await db.close()
+                self._fora_ate[indice] = agora + self.pausa_apos_falha
+                continue
+            return db
+        return None
+
+    @asynccontextmanager
+    async def sessao(self, destino: str) -> AsyncIterator[AsyncSession]:
+        db = await self._abrir_replica() if destino == REPLICA else None
+        if db is not None:
+            roteadas.inc((REPLICA,))
+        else:
+            roteadas.inc((PRIMARIA if destino == PRIMARIA else 'primaria_por_falha',))
+            db = self.primaria()
+        async with db:
+            yield db
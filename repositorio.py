@@ -0,0 +1,353 @@
+import threading
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from alteracoes import ATUALIZADO, CRIADO, RECEITA, REMOVIDO, pendentes, registrar
+from estatisticas import aplicar, de_receitas
+from importacao import em_lotes
+from indice_ingredientes import indice_ingredientes
+from models import Alteracao, Ingrediente, Receita, ReceitaIngrediente
+from schema import BaseReceita
+from schema import Receita as ReceitaSchema
+
+# Índices em memória mantidos pelo repositório a cada escrita. Cada um
+# implementa adicionar(receita), remover(receita_id) e reconstruir(receitas).
+INDICES = [indice_ingredientes]
+
+# Até que seq do registro de alterações cada índice está em dia
+# com as escritas dos outros workers; ver ReceitaRepository.carregar_indices
+_EM_DIA: Dict[object, int] = {}
+_sincronizacao = threading.Lock()
+
+# Índices guardados no próprio banco (busca textual), atualizados na mesma
+# transação da escrita. Cada um implementa indexar(db, ids) e remover(db, ids).
+INDICES_NO_BANCO = []
+
+RECEITAS_INICIAIS: List[BaseReceita] = [
+    BaseReceita(nome="Bolo de Chocolate", ingredientes=["farinha", "açúcar", "chocolate em pó", "ovos", "leite", "óleo"], modo_de_preparo="Misture tudo e asse."),
+    BaseReceita(nome="Brigadeiro", ingredientes=["leite condensado", "chocolate em pó", "manteiga"], modo_de_preparo="Misture no fogo até desgrudar da panela."),
+    BaseReceita(nome="Pudim", ingredientes=["leite condensado", "leite", "ovos", "açúcar"], modo_de_preparo="Faça a calda, misture os ingredientes e asse em banho-maria."),
+    BaseReceita(nome="Feijoada", ingredientes=["feijão preto", "carne seca", "linguiça", "costelinha", "bacon", "alho", "cebola"], modo_de_preparo="Cozinhe o feijão e as carnes separadamente, depois junte tudo e tempere."),
+    BaseReceita(nome="Moqueca de Peixe", ingredientes=["peixe", "azeite de dendê", "leite de coco", "tomate", "cebola", "pimentões", "coentro"], modo_de_preparo="Refogue os temperos, adicione o peixe e cozinhe com leite de coco e azeite de dendê."),
+    BaseReceita(nome="Pão de Queijo", ingredientes=["polvilho doce", "queijo minas", "leite", "óleo", "ovos", "sal"], modo_de_preparo="Misture os ingredientes, faça bolinhas e asse."),
+]
+
+
+class ReceitaRepository:
+    """Acesso às receitas persistidas no banco de dados.
+
+    Consultas por id e por nome usam a chave primária e o índice único de
+    ``nome_normalizado``; os ingredientes são carregados em lote (selectin)
+    para que listar N receitas não gere N consultas extras.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _chave(nome: str) -> str:
+        return nome.casefold()
+
+    def __len__(self) -> int:
+        return self.db.scalar(select(func.count()).select_from(Receita))
+
+    def listar(self, limit: Optional[int] = None, after: int = 0) -> List[Receita]:
+        # Paginação por chave (keyset): estável e sem OFFSET
+        consulta = select(Receita).where(Receita.id > after).order_by(Receita.id)
+        if limit is not None:
+            consulta = consulta.limit(limit)
+        return list(self.db.scalars(consulta))
+
+    def listar_schemas(self, limit: int, after: int = 0) -> List[ReceitaSchema]:
+        """Mesma página de ``listar``, montada direto das linhas, sem objetos ORM."""
+        linhas = self.db.execute(
+            select(Receita.id, Receita.nome, Receita.modo_de_preparo)
+            .where(Receita.id > after)
+            .order_by(Receita.id)
+            .limit(limit)
+        ).all()
+        if not linhas:
+            return []
+
+        ingredientes: Dict[int, List[str]] = {}
+        for receita_id, nome in self.db.execute(
+            select(ReceitaIngrediente.receita_id, Ingrediente.nome)
+            .join(Ingrediente)
+            .where(ReceitaIngrediente.receita_id.between(linhas[0].id, linhas[-1].id))
+            .order_by(ReceitaIngrediente.receita_id, ReceitaIngrediente.posicao)
+        ):
+            ingredientes.setdefault(receita_id, []).append(nome)
+
+        return [
+            ReceitaSchema.model_construct(
+                id=linha.id,
+                nome=linha.nome,
+                ingredientes=ingredientes.get(linha.id, []),
+                modo_de_preparo=linha.modo_de_preparo,
+            )
+            for linha in linhas
+        ]
+
+    def get(self, receita_id: int) -> Optional[Receita]:
+        return self.db.get(Receita, receita_id)
+
+    def get_muitos(self, ids: Iterable[int]) -> Dict[int, Receita]:
+        consulta = select(Receita).where(Receita.id.in_(list(ids)))
+        return {receita.id: receita for receita in self.db.scalars(consulta)}
+
+    def get_by_nome(self, nome: str) -> Optional[Receita]:
+        return self.db.scalar(
+            select(Receita).where(Receita.nome_normalizado == self._chave(nome))
+        )
+
+    def nomes_em_uso(self, nomes: Iterable[str]) -> set:
+        """Quais dos nomes (já normalizados) existem, em uma consulta por lote."""
+        em_uso = set()
+        for lote in em_lotes(list(nomes)):
+            em_uso.update(self.db.scalars(
+                select(Receita.nome_normalizado).where(Receita.nome_normalizado.in_(lote))
+            ))
+        return em_uso
+
+    def nome_em_uso(self, nome: str, exceto_id: Optional[int] = None) -> bool:
+        consulta = select(Receita.id).where(
+            Receita.nome_normalizado == self._chave(nome)
+        )
+        if exceto_id is not None:
+            consulta = consulta.where(Receita.id != exceto_id)
+        return self.db.scalar(consulta) is not None
+
+    def _inserir_ingredientes(self, nomes: List[str]) -> None:
+        # ON CONFLICT DO NOTHING: duas escritas que trazem o mesmo ingrediente
+        # novo não colidem no índice único; quem chama relê os ids
+        dialeto = postgresql if self.db.get_bind().dialect.name == 'postgresql' else sqlite
+        comando = dialeto.insert(Ingrediente).on_conflict_do_nothing(index_elements=['nome'])
+        for lote in em_lotes(nomes):
+            self.db.execute(comando, [{'nome': nome} for nome in lote])
+
+    def _ingredientes(self, nomes: Iterable[str]) -> Dict[str, Ingrediente]:
+        # Busca todos os ingredientes de uma vez e cria só os que faltam
+        nomes = set(nomes)
+        consulta = select(Ingrediente).where(Ingrediente.nome.in_(nomes))
+        existentes = {ingrediente.nome: ingrediente for ingrediente in self.db.scalars(consulta)}
+        if len(existentes) < len(nomes):
+            self._inserir_ingredientes([nome for nome in nomes if nome not in existentes])
+            existentes = {ingrediente.nome: ingrediente for ingrediente in self.db.scalars(consulta)}
+        return existentes
+
+    def _ids_ingredientes(self, nomes: Iterable[str]) -> Dict[str, int]:
+        nomes = list(set(nomes))
+        ids = {}
+        for lote in em_lotes(nomes):
+            ids.update(self.db.execute(
+                select(Ingrediente.nome, Ingrediente.id).where(Ingrediente.nome.in_(lote))
+            ).all())
+        faltando = [nome for nome in nomes if nome not in ids]
+        if faltando:
+            self._inserir_ingredientes(faltando)
+            for lote in em_lotes(faltando):
+                ids.update(self.db.execute(
+                    select(Ingrediente.nome, Ingrediente.id).where(Ingrediente.nome.in_(lote))
+                ).all())
+        return ids
+
+    def _itens(self, nomes: List[str]) -> List[ReceitaIngrediente]:
+        ingredientes = self._ingredientes(nomes)
+        return [
+            ReceitaIngrediente(posicao=posicao, ingrediente=ingredientes[nome])
+            for posicao, nome in enumerate(nomes)
+        ]
+
+    def add(self, dados: BaseReceita) -> Receita:
+        nova_receita = Receita(
+            nome=dados.nome,
+            nome_normalizado=self._chave(dados.nome),
+            modo_de_preparo=dados.modo_de_preparo,
+            itens=self._itens(dados.ingredientes),
+        )
+        self.db.add(nova_receita)
+        self.db.flush()
+        self._indexar_no_banco([nova_receita.id])
+        registrar(self.db, RECEITA, CRIADO, [nova_receita.id])
+        aplicar(self.db, de_receitas(criadas=[self._ids_dos_itens(nova_receita)]))
+        self.db.commit()
+        self._indexar(nova_receita)
+        return nova_receita
+
+    def add_muitos(self, dados: List[BaseReceita]) -> List[int]:
+        """Insere várias receitas em uma transação, com INSERTs em lote.
+
+        Não verifica nomes duplicados: quem chama deve filtrá-los antes com
+        ``nomes_em_uso``.
+        """
+        ingredientes = self._ids_ingredientes(
+            nome for receita in dados for nome in receita.ingredientes
+        )
+        ids = []
+        for lote in em_lotes(dados):
+            ids_lote = list(self.db.scalars(
+                insert(Receita).returning(Receita.id, sort_by_parameter_order=True),
+                [
+                    {
+                        'nome': receita.nome,
+                        'nome_normalizado': self._chave(receita.nome),
+                        'modo_de_preparo': receita.modo_de_preparo,
+                    }
+                    for receita in lote
+                ],
+            ))
+            self.db.execute(insert(ReceitaIngrediente), [
+                {'receita_id': receita_id, 'posicao': posicao, 'ingrediente_id': ingredientes[nome]}
+                for receita_id, receita in zip(ids_lote, lote)
+                for posicao, nome in enumerate(receita.ingredientes)
+            ])
+            self._indexar_no_banco(ids_lote)
+            ids.extend(ids_lote)
+        registrar(self.db, RECEITA, CRIADO, ids)
+        aplicar(self.db, de_receitas(criadas=[
+            [ingredientes[nome] for nome in receita.ingredientes] for receita in dados
+        ]))
+        self.db.commit()
+
+        for receita_id, receita in zip(ids, dados):
+            self._indexar(ReceitaSchema(id=receita_id, **receita.model_dump()))
+        return ids
+
+    def update(self, receita_id: int, dados: BaseReceita) -> Receita:
+        receita = self.db.get(Receita, receita_id)
+        receita.nome = dados.nome
+        receita.nome_normalizado = self._chave(dados.nome)
+        receita.modo_de_preparo = dados.modo_de_preparo
+
+        # Os itens antigos são removidos antes de inserir os novos, já que
+        # compartilham a chave primária (receita_id, posicao)
+        antigos = self._ids_dos_itens(receita)
+        receita.itens.clear()
+        self.db.flush()
+        receita.itens.extend(self._itens(dados.ingredientes))
+        self.db.flush()
+        self._indexar_no_banco([receita_id])
+        registrar(self.db, RECEITA, ATUALIZADO, [receita_id])
+        aplicar(self.db, de_receitas(removidas=[antigos], criadas=[self._ids_dos_itens(receita)]))
+
+        self.db.commit()
+        self._indexar(receita)
+        return receita
+
+    def delete(self, receita_id: int) -> Optional[ReceitaSchema]:
+        receita = self.db.get(Receita, receita_id)
+        if receita is None:
+            return None
+
+        # Copia os dados antes do commit, que expira o objeto removido
+        removida = ReceitaSchema.model_validate(receita)
+        ingredientes = self._ids_dos_itens(receita)
+        self.db.delete(receita)
+        for indice in INDICES_NO_BANCO:
+            indice.remover(self.db, [receita_id])
+        registrar(self.db, RECEITA, REMOVIDO, [receita_id])
+        aplicar(self.db, de_receitas(removidas=[ingredientes]))
+        self.db.commit()
+        for indice in INDICES:
+            indice.remover(receita_id)
+        return removida
+
+    @staticmethod
+    def _ids_dos_itens(receita: Receita) -> List[int]:
+        # Já persistidos (flush): os ids dos ingredientes, para os agregados de /stats
+        return [item.ingrediente_id for item in receita.itens]
+
+    def _indexar(self, receita: Receita) -> None:
+        for indice in INDICES:
+            indice.adicionar(receita)
+
+    def _indexar_no_banco(self, ids: List[int]) -> None:
+        for indice in INDICES_NO_BANCO:
+            indice.indexar(self.db, ids)
+
+    def iterar(self, after: int = 0, lote: int = 1000) -> Iterator[ReceitaSchema]:
+        """Percorre o catálogo em ordem de id com dois cursores no servidor.
+
+        Não carrega objetos ORM nem o resultado inteiro em memória, então
+        serve tanto para exportações quanto para montar os índices.
+        """
+        ingredientes = self.db.execute(
+            select(ReceitaIngrediente.receita_id, Ingrediente.nome)
+            .join(Ingrediente)
+            .where(ReceitaIngrediente.receita_id > after)
+            .order_by(ReceitaIngrediente.receita_id, ReceitaIngrediente.posicao)
+            .execution_options(yield_per=lote)
+        )
+        por_receita = groupby(ingredientes, key=lambda linha: linha.receita_id)
+        atual = next(por_receita, None)
+
+        linhas = self.db.execute(
+            select(Receita.id, Receita.nome, Receita.modo_de_preparo)
+            .where(Receita.id > after)
+            .order_by(Receita.id)
+            .execution_options(yield_per=lote)
+        )
+        for linha in linhas:
+            nomes = []
+            if atual is not None and atual[0] == linha.id:
+                nomes = [item.nome for item in atual[1]]
+                atual = next(por_receita, None)
+            yield ReceitaSchema.model_construct(
+                id=linha.id,
+                nome=linha.nome,
+                ingredientes=nomes,
+                modo_de_preparo=linha.modo_de_preparo,
+            )
+
+    def carregar_indices(self) -> None:
+        """Deixa os índices em memória em dia com o banco antes de uma leitura.
+
+        As escritas deste processo atualizam os índices na hora; as dos outros
+        workers chegam pelo registro de alterações: as receitas com entrada
+        depois do seq em que cada índice parou são relidas e reaplicadas
+        (adicionar e remover são idempotentes). Um índice ainda não montado,
+        ou parado antes de lápides já expurgadas, é remontado do zero.
+        """
+        # 1. Caminho comum, sem trava: nenhuma entrada nova desde a última leitura
+        em_dia = [_EM_DIA.get(indice) if indice.carregado else None for indice in INDICES]
+        if None not in em_dia and pendentes(self.db, RECEITA, min(em_dia, default=0)) == []:
+            return
+
+        with _sincronizacao:
+            faltando = [i for i in INDICES if not i.carregado or i not in _EM_DIA]
+            montados = [i for i in INDICES if i not in faltando]
+
+            # 2. Reaplica as receitas alteradas por outros workers
+            if montados:
+                desde = min(_EM_DIA[indice] for indice in montados)
+                entradas = pendentes(self.db, RECEITA, desde)
+                if entradas is None:
+                    faltando = INDICES
+                elif entradas:
+                    vivas = [e.entidade_id for e in entradas if e.operacao != REMOVIDO]
+                    receitas = {}
+                    for lote in em_lotes(vivas):
+                        receitas.update(self.get_muitos(lote))
+                    for indice in montados:
+                        ate = _EM_DIA[indice]
+                        for entrada in entradas:
+                            if entrada.seq <= ate:
+                                continue
+                            receita = receitas.get(entrada.entidade_id)
+                            if receita is None:
+                                indice.remover(entrada.entidade_id)
+                            else:
+                                indice.adicionar(receita)
+                        _EM_DIA[indice] = max(ate, entradas[-1].seq)
+
+            # 3. Monta do zero; o seq é lido antes de percorrer o catálogo, e o
+            #    que entrar no meio é reaplicado na próxima leitura
+            if faltando:
+                seq = self.db.scalar(select(func.coalesce(func.max(Alteracao.seq), 0)))
+                for indice in faltando:
+                    indice.reconstruir(self.iterar())
+                    _EM_DIA[indice] = seq
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, field_validator
-from typing import List
-from datetime import datetime
+from typing import List, Literal, Optional, Union
+from datetime import date, datetime
 
 class BaseReceita(BaseModel):
     nome: str
@@ -9,6 +9,39 @@ class BaseReceita(BaseModel):
 
 class Receita(BaseReceita):
     id: int 
+
+    class Config:
+        from_attributes = True
+
+class ReceitaCompativel(Receita):
+    ingredientes_cobertos: int
+    ingredientes_faltantes: List[str]
+
+class ReceitaEncontrada(Receita):
+    relevancia: float
+
+class ReceitaSimilar(Receita):
+    similaridade: float
+    ingredientes_em_comum: List[str]
+
+class SugestaoIngrediente(BaseModel):
+    nome: str
+    receitas: int
+
+class SugestaoReceita(BaseModel):
+    id: int
+    nome: str
+
+class ResultadoLinha(BaseModel):
+    linha: int
+    status: Literal['criado', 'duplicado', 'invalido']
+    id: Optional[int] = None
+    erro: Optional[str] = None
+
+class RelatorioImportacao(BaseModel):
+    criados: int
+    rejeitados: int
+    resultados: List[ResultadoLinha]
     
 class BaseUsuario(BaseModel):
     nome_usuario: str
@@ -41,4 +74,34 @@ class UsuarioPublic(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class Login(BaseModel):
+    email: EmailStr
+    senha: str
+
+class AlteracaoPublic(BaseModel):
+    seq: int
+    entidade: Literal['receita', 'usuario']
+    id: int
+    operacao: Literal['criado', 'atualizado', 'removido']
+    em: datetime
+    # Estado atual do item; None nas remoções (lápides)
+    dados: Optional[Union[Receita, UsuarioPublic]] = None
+
+class FrequenciaIngrediente(BaseModel):
+    nome: str
+    receitas: int
+
+class CadastrosDoDia(BaseModel):
+    dia: date
+    usuarios: int
+
+class Estatisticas(BaseModel):
+    receitas: int
+    usuarios: int
+    media_ingredientes_por_receita: float
+    ingredientes_mais_usados: List[FrequenciaIngrediente]
+    # Só os dias com cadastros, em ordem
+    cadastros_por_dia: List[CadastrosDoDia]
@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from typing import List, Literal, Optional
+
+from fastapi import HTTPException
+
+PREFIXO = 'scrypt'
+TAMANHO_SAL = 16
+TAMANHO_HASH = 32
+# Sal e hash do hash fictício: um scrypt completo que nunca confere
+SAL_FICTICIO = bytes(TAMANHO_SAL)
+
+
+def _b64(dados: bytes) -> str:
+    return base64.b64encode(dados).decode().rstrip('=')
+
+
+def _de_b64(texto: str) -> bytes:
+    return base64.b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _scrypt(senha: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+    # Função de módulo para poder rodar também em um ProcessPoolExecutor
+    memoria = 128 * r * (n + p + 2) + (1 << 20)
+    return hashlib.scrypt(
+        senha.encode(), salt=sal, n=n, r=r, p=p, maxmem=memoria, dklen=TAMANHO_HASH
+    )
+
+
+class ServicoDeSenhas:
+    """Hash de senhas com scrypt, fora do event loop e com limite de fila.
+
+    O scrypt é propositalmente lento; rodá-lo no handler travaria o event loop
+    e, no threadpool padrão, tomaria as threads das rotas síncronas. Aqui ele
+    roda em um pool próprio de ``workers``; com mais de ``fila_maxima``
+    cálculos pendentes, novas requisições recebem 503 em vez de esperar.
+
+    O hash guarda os parâmetros (``scrypt$n$r$p$sal$hash``), então mudar o
+    custo nas Settings não invalida as senhas antigas: ``verificar`` continua
+    aceitando-as e ``precisa_rehash`` indica quando gravar um hash novo.
+    """
+
+    def __init__(
+        self,
+        n: int = 2 ** 14,
+        r: int = 8,
+        p: int = 1,
+        workers: int = 4,
+        fila_maxima: int = 64,
+        executor: Literal['thread', 'processo'] = 'thread',
+    ):
+        self.n, self.r, self.p = n, r, p
+        self.workers = workers
+        self.fila_maxima = fila_maxima
+        self.tipo_executor = executor
+        self._executor: Optional[Executor] = None
+        self._pendentes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def a_partir_de(cls, settings) -> 'ServicoDeSenhas':
+        return cls(
+            n=settings.SENHA_SCRYPT_N,
+            r=settings.SENHA_SCRYPT_R,
+            p=settings.SENHA_SCRYPT_P,
+            workers=settings.SENHA_WORKERS,
+            fila_maxima=settings.SENHA_FILA_MAXIMA,
+            executor=settings.SENHA_EXECUTOR,
+        )
+
+    @property
+    def pendentes(self) -> int:
+        return self._pendentes
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.tipo_executor == 'processo':
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='senhas'
+                    )
+            return self._executor
+
+    async def _calcular(self, senha: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+        with self._lock:
+            if self._pendentes >= self.fila_maxima:
+                raise HTTPException(
+                    status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                    detail="Servidor ocupado, tente novamente em instantes",
+                    headers={"Retry-After": "1"},
+                )
+            self._pendentes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), _scrypt, senha, sal, n, r, p)
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+    async def gerar_hash(self, senha: str) -> str:
+        sal = os.urandom(TAMANHO_SAL)
+        chave = await self._calcular(senha, sal, self.n, self.r, self.p)
+        return f'{PREFIXO}${self.n}${self.r}${self.p}${_b64(sal)}${_b64(chave)}'
+
+    async def gerar_hashes(self, senhas: List[str]) -> List[str]:
+        # Em ondas do tamanho do pool, para uma importação não lotar a fila sozinha
+        hashes = []
+        for inicio in range(0, len(senhas), self.workers):
+            onda = senhas[inicio:inicio + self.workers]
+            hashes.extend(await asyncio.gather(*(self.gerar_hash(s) for s in onda)))
+        return hashes
+
+    @property
+    def hash_ficticio(self) -> str:
+        """Hash com o custo atual para conferir quando o usuário não existe.
+
+        A resposta leva o mesmo tempo que a de uma senha errada, então o tempo
+        do login não revela quais e-mails têm conta.
+        """
+        return f'{PREFIXO}${self.n}${self.r}${self.p}${_b64(SAL_FICTICIO)}${_b64(bytes(TAMANHO_HASH))}'
+
+    async def verificar(self, senha: str, armazenada: str) -> bool:
+        partes = armazenada.split('$')
+        if len(partes) != 6 or partes[0] != PREFIXO:
+            # Senha gravada antes do hash (texto puro): aceita e pede rehash,
+            # com o mesmo custo de uma conta com hash
+            await self.verificar(senha, self.hash_ficticio)
+            return hmac.compare_digest(senha.encode(), armazenada.encode())
+        _, n, r, p, sal, chave = partes
+        calculada = await self._calcular(senha, _de_b64(sal), int(n), int(r), int(p))
+        return hmac.compare_digest(calculada, _de_b64(chave))
+
+    def precisa_rehash(self, armazenada: str) -> bool:
+        return not armazenada.startswith(f'{PREFIXO}${self.n}${self.r}${self.p}$')
+
+    def fechar(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -0,0 +1,66 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Type, TypeVar
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+M = TypeVar('M', bound=BaseModel)
+
+
+@lru_cache(maxsize=None)
+def adaptador(tipo: Any) -> TypeAdapter:
+    # Montar um TypeAdapter compila o schema; reutiliza um por tipo
+    return TypeAdapter(tipo)
+
+
+def json_bytes(tipo: Any, valor: Any, validar: bool = True) -> bytes:
+    """Gera o JSON de ``valor`` como ``tipo``, no mesmo formato do ``response_model``.
+
+    Com ``validar=True`` aceita objetos ORM (``from_attributes``); quando os
+    valores já são instâncias dos schemas, ``validar=False`` serializa direto.
+    """
+    tipo_adaptado = adaptador(tipo)
+    if validar:
+        valor = tipo_adaptado.validate_python(valor, from_attributes=True)
+    return tipo_adaptado.dump_json(valor)
+
+
+def colunas(modelo: Type[BaseModel], entidade: Any) -> list:
+    """Colunas da entidade ORM com os mesmos nomes dos campos do schema."""
+    return [getattr(entidade, campo) for campo in modelo.model_fields]
+
+
+def construir(modelo: Type[M], linhas: Iterable[Mapping[str, Any]]) -> List[M]:
+    """Monta schemas a partir de linhas do banco sem validar de novo.
+
+    Os dados foram validados na escrita; revalidar a cada leitura custa caro
+    (o ``EmailStr``, por exemplo, passa pelo email-validator a cada linha).
+    """
+    return [modelo.model_construct(**linha) for linha in linhas]
+
+
+class RespostaJSON(JSONResponse):
+    """Resposta com o corpo JSON já serializado.
+
+    Quando a rota devolve uma ``Response``, o FastAPI não revalida o retorno
+    contra o ``response_model`` nem passa pelo ``jsonable_encoder``. Herda de
+    ``JSONResponse`` para que o ``response_model`` do decorador continue
+    documentado no OpenAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        # Conteúdo comum (ex.: rota que devolveu um dict) vira JSON normalmente
+        return adaptador(Any).dump_json(content)
+
+    @classmethod
+    def de(
+        cls,
+        tipo: Any,
+        valor: Any,
+        validar: bool = True,
+        headers: Optional[Dict[str, str]] = None,
+        status_code: int = 200,
+    ) -> 'RespostaJSON':
+        return cls(json_bytes(tipo, valor, validar), status_code=status_code, headers=headers)
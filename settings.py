@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Dict, List, Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,4 +9,125 @@ class Settings(BaseSettings):
         env_file='.env', env_file_encoding='utf-8'
     )
 
-    DATABASE_URL: str
\ No newline at end of file
+    DATABASE_URL: str
+    # URL do driver assíncrono; se vazia, é derivada de DATABASE_URL
+    # (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg)
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    # Conexões abertas em cada pool durante a partida, antes de aceitar tráfego
+    DATABASE_POOL_AQUECIDAS: int = 2
+
+    # Réplicas de leitura (lista JSON de URLs; a assíncrona é derivada como a
+    # de DATABASE_URL). As rotas GET de usuários leem delas em rodízio; uma
+    # réplica que não conecta fica fora por DATABASE_PAUSA_REPLICA_COM_FALHA
+    # segundos e a leitura volta para a primária. Quem acabou de escrever lê
+    # da primária por DATABASE_LEITURA_APOS_ESCRITA segundos (cookie).
+    DATABASE_REPLICAS: List[str] = []
+    DATABASE_LEITURA_APOS_ESCRITA: float = 5
+    DATABASE_PAUSA_REPLICA_COM_FALHA: float = 30
+
+    # SQLite em arquivo: WAL, synchronous=NORMAL, mmap, cache e busy timeout
+    # em cada conexão e, sem réplicas, um pool só de leitura para os GETs
+    SQLITE_DESEMPENHO: bool = True
+    SQLITE_MMAP_MB: int = 256
+    SQLITE_CACHE_MB: int = 64
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+
+    # Na partida, faz uma leitura interna em cada rota GET (compila o SQL,
+    # monta os serializadores e os índices em memória) antes do /ready
+    AQUECER_ROTAS: bool = True
+
+    # Cache de respostas GET. "memoria" é local a cada worker; com vários
+    # workers use "redis" para que as invalidações valham para todos.
+    CACHE_BACKEND: Literal['memoria', 'redis', 'desligado'] = 'memoria'
+    CACHE_TTL: float = 60
+    CACHE_MAX_ENTRADAS: int = 1024
+    REDIS_URL: Optional[str] = None
+
+    # Compressão negociada pelo Accept-Encoding, na ordem de preferência do
+    # servidor; "br" e "zstd" exigem os pacotes brotli e zstandard e são
+    # ignorados sem eles. Corpos menores que o mínimo (em bytes) vão sem
+    # compressão. As respostas do cache guardam a versão comprimida.
+    COMPRESSAO_HABILITADA: bool = True
+    COMPRESSAO_CODIFICACOES: List[str] = ['zstd', 'br', 'gzip']
+    COMPRESSAO_TAMANHO_MINIMO: int = 1024
+
+    # Busca textual: "auto" usa FTS5 (SQLite) ou tsvector/pg_trgm (PostgreSQL)
+    # e cai no índice em memória quando o banco não oferece nenhum dos dois
+    BUSCA_BACKEND: Literal['auto', 'memoria'] = 'auto'
+
+    # Receitas similares (MinHash + LSH sobre os ingredientes). Mais bandas:
+    # mais recall e memória; mais linhas por banda: baldes menores e consultas
+    # mais rápidas, com menos recall. O re-rank exato olha no máximo
+    # SIMILARES_MAX_CANDIDATOS receitas por consulta.
+    SIMILARES_BANDAS: int = 16
+    SIMILARES_LINHAS: int = 2
+    SIMILARES_MAX_CANDIDATOS: int = 500
+
+    # Registro de alterações (GET /changes). Cada item guarda só a entrada mais
+    # recente; remoções ficam como lápides por ALTERACOES_RETENCAO_DIAS e são
+    # expurgadas a cada ALTERACOES_INTERVALO_EXPURGO segundos (0 desliga).
+    # Com espera (long-poll/SSE), as gravações dos outros workers são vistas
+    # a cada ALTERACOES_VERIFICACAO segundos; acima de ALTERACOES_MAXIMO_ESPERAS
+    # conexões esperando, as requisições respondem na hora.
+    ALTERACOES_RETENCAO_DIAS: float = 7
+    ALTERACOES_INTERVALO_EXPURGO: float = 300
+    ALTERACOES_ESPERA_MAXIMA: float = 30
+    ALTERACOES_VERIFICACAO: float = 1.0
+    ALTERACOES_MAXIMO_ESPERAS: int = 1000
+
+    # Agregados de /stats, somados na mesma transação de cada escrita e
+    # recalculados a partir das tabelas a cada ESTATISTICAS_INTERVALO_RECONCILIACAO
+    # segundos (0 desliga), corrigindo o que divergir
+    ESTATISTICAS_INTERVALO_RECONCILIACAO: float = 3600
+
+    # Hash de senhas (scrypt). Alterar o custo vale para as próximas senhas;
+    # as antigas são regravadas no próximo login.
+    SENHA_SCRYPT_N: int = 2 ** 14
+    SENHA_SCRYPT_R: int = 8
+    SENHA_SCRYPT_P: int = 1
+    # Pool dedicado ao scrypt e quantos cálculos podem esperar antes do 503
+    SENHA_WORKERS: int = 4
+    SENHA_FILA_MAXIMA: int = 64
+    SENHA_EXECUTOR: Literal['thread', 'processo'] = 'thread'
+
+    # Controle de admissão por grupo de rotas: "leitura" (GET), "escrita" e
+    # "senha" (rotas que calculam scrypt). O limite de concorrência de cada
+    # grupo começa no máximo e se adapta à latência (AIMD); o excedente espera
+    # numa fila limitada e recebe 503 com Retry-After quando ela enche ou a
+    # espera passa de ADMISSAO_ESPERA_MAXIMA segundos.
+    ADMISSAO_HABILITADA: bool = True
+    ADMISSAO_LIMITE_MAXIMO: Dict[str, int] = {'leitura': 64, 'escrita': 16, 'senha': 8}
+    ADMISSAO_FILA_MAXIMA: Dict[str, int] = {'leitura': 128, 'escrita': 32, 'senha': 32}
+    ADMISSAO_LIMITE_MINIMO: int = 2
+    ADMISSAO_ESPERA_MAXIMA: float = 2.0
+    # Latência recente acima de N vezes a de referência reduz o limite
+    ADMISSAO_TOLERANCIA_LATENCIA: float = 2.0
+    # Balde de fichas por cliente (req/s, com rajada); 429 ao esgotar.
+    # Desligado quando vazio. O cliente é o IP da conexão, ou o valor do
+    # cabeçalho configurado (ex.: X-Forwarded-For atrás de um proxy confiável)
+    ADMISSAO_TAXA_POR_CLIENTE: Optional[float] = None
+    ADMISSAO_RAJADA_POR_CLIENTE: int = 20
+    ADMISSAO_CABECALHO_CLIENTE: Optional[str] = None
+
+    # Leituras de usuários por id e por nome pedidas dentro da janela (em ms)
+    # viram uma só consulta IN (...); leituras iguais simultâneas compartilham
+    # a mesma consulta. 0 agrupa só o que chega na mesma volta do event loop.
+    AGRUPAMENTO_JANELA_MS: float = 2
+    AGRUPAMENTO_LOTE_MAXIMO: int = 500
+
+    # Log "metricas.lentas" com o SQL das requisições acima do limiar (em ms);
+    # desligado quando vazio. As métricas em /metrics são sempre coletadas.
+    METRICAS_LIMIAR_LENTAS_MS: Optional[float] = None
+    METRICAS_MAX_COMANDOS_LENTAS: int = 50
+
+
+@lru_cache
+def get_settings() -> Settings:
+    # Lidas do ambiente/.env uma única vez, no primeiro uso
+    return Settings()
@@ -0,0 +1,252 @@
+import hashlib
+import heapq
+import random
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from normalizacao import normalizar
+
+# Hash universal (a·x + b) mod p; as assinaturas guardam só os 32 bits baixos
+PRIMO = (1 << 61) - 1
+MASCARA = 0xFFFFFFFF
+# Alterações acumuladas antes de reordenar os baldes (no mínimo; ou 1/8 do índice)
+COMPACTAR_APOS = 1024
+
+
+class Similar(NamedTuple):
+    receita_id: int
+    similaridade: float
+    em_comum: int
+
+
+class IndiceSimilares:
+    """MinHash + LSH sobre os conjuntos de ingredientes normalizados.
+
+    Cada receita tem uma assinatura de ``bandas * linhas`` mínimos de 32 bits,
+    todas num único ``array('I')`` (uma faixa por receita, reaproveitada
+    quando a receita sai). As ``linhas`` de cada banda formam a chave de um
+    balde; receitas que dividem algum balde são candidatas e voltam ordenadas
+    pelo Jaccard exato. Mais bandas aumentam o recall (e a memória); mais
+    linhas por banda deixam os baldes mais seletivos e a consulta mais
+    rápida. ``max_candidatos`` limita o re-rank exato.
+
+    Os baldes de cada banda são dois arrays paralelos (chaves ordenadas e
+    ids), consultados por busca binária: 12 bytes por receita e banda, em vez
+    de uma entrada de dict. Escritas vão para um dict pequeno de recentes e
+    marcam a receita como alterada (suas entradas nos arrays podem estar
+    velhas e são conferidas na consulta); com alterações suficientes, os
+    arrays são reordenados.
+
+    Cada ingrediente é um token com o seu vetor de hashes; o token de um
+    ingrediente que nenhuma receita usa mais é reaproveitado pelo próximo.
+
+    É atualizado pelo ``ReceitaRepository`` a cada escrita.
+    """
+
+    def __init__(self, bandas: int = 16, linhas: int = 2, max_candidatos: int = 500, semente: int = 1):
+        self.bandas = bandas
+        self.linhas = linhas
+        self.permutacoes = bandas * linhas
+        self.max_candidatos = max_candidatos
+        aleatorio = random.Random(semente)
+        self._a = [aleatorio.randrange(1, PRIMO) for _ in range(self.permutacoes)]
+        self._b = [aleatorio.randrange(0, PRIMO) for _ in range(self.permutacoes)]
+
+        # Ingrediente normalizado -> token; o token t ocupa a faixa
+        # [t * permutacoes, (t + 1) * permutacoes) de _vetores
+        self._vocabulario: Dict[str, int] = {}
+        self._vetores = array('I')
+        # Nome como escrito -> token (normalizar custa mais que a assinatura)
+        self._por_nome: Dict[str, int] = {}
+        # Por token: ingrediente, nomes que apontam para ele e receitas que o
+        # usam; sem receitas, sai do vocabulário e a faixa volta para _tokens_livres
+        self._ingredientes: List[str] = []
+        self._nomes: List[List[str]] = []
+        self._usos = array('I')
+        self._tokens_livres: List[int] = []
+        # Receita -> (faixa em _assinaturas, tokens dos ingredientes)
+        self._receitas: Dict[int, Tuple[int, Tuple[int, ...]]] = {}
+        self._assinaturas = array('I')
+        self._livres: List[int] = []
+        # Por banda: chaves ordenadas e ids na mesma ordem
+        self._chaves = [array('q') for _ in range(bandas)]
+        self._ids = [array('I') for _ in range(bandas)]
+        # Por banda, chave -> ids escritos depois da última ordenação; e quem mudou desde então
+        self._recentes: List[Dict[int, List[int]]] = [{} for _ in range(bandas)]
+        self._alteradas: Set[int] = set()
+        self._lock = threading.Lock()
+        self.carregado = False
+
+    def __len__(self) -> int:
+        return len(self._receitas)
+
+    def _token(self, nome: str) -> int:
+        token = self._por_nome.get(nome)
+        if token is not None:
+            return token
+        ingrediente = normalizar(nome)
+        token = self._vocabulario.get(ingrediente)
+        if token is None:
+            x = int.from_bytes(hashlib.blake2b(ingrediente.encode(), digest_size=8).digest(), 'little')
+            vetor = array('I', (((a * x + b) % PRIMO) & MASCARA for a, b in zip(self._a, self._b)))
+            if self._tokens_livres:
+                token = self._tokens_livres.pop()
+                self._vetores[token * self.permutacoes:(token + 1) * self.permutacoes] = vetor
+                self._ingredientes[token] = ingrediente
+            else:
+                token = len(self._ingredientes)
+                self._vetores.extend(vetor)
+                self._ingredientes.append(ingrediente)
+                self._nomes.append([])
+                self._usos.append(0)
+            self._vocabulario[ingrediente] = token
+        self._por_nome[nome] = token
+        self._nomes[token].append(nome)
+        return token
+
+    def _liberar(self, tokens: Iterable[int]) -> None:
+        for token in tokens:
+            self._usos[token] -= 1
+            if self._usos[token]:
+                continue
+            del self._vocabulario[self._ingredientes[token]]
+            for nome in self._nomes[token]:
+                del self._por_nome[nome]
+            self._nomes[token].clear()
+            self._tokens_livres.append(token)
+
+    def _assinar(self, tokens: Iterable[int]) -> array:
+        n = self.permutacoes
+        vetores = [self._vetores[t * n:(t + 1) * n] for t in tokens]
+        return array('I', map(min, *vetores)) if len(vetores) > 1 else vetores[0]
+
+    def _chave(self, faixa: int, banda: int) -> int:
+        # hash dos bytes da banda: muda entre processos, mas o índice vive em memória
+        inicio = faixa * self.permutacoes + banda * self.linhas
+        return hash(self._assinaturas[inicio:inicio + self.linhas].tobytes())
+
+    def _remover(self, receita_id: int) -> None:
+        item = self._receitas.pop(receita_id, None)
+        if item is None:
+            return
+        # As entradas nos baldes ficam até a próxima ordenação; a consulta as ignora
+        self._alteradas.add(receita_id)
+        self._livres.append(item[0])
+        self._liberar(item[1])
+
+    def _adicionar(self, receita_id: int, ingredientes: Iterable[str]) -> None:
+        tokens = tuple(sorted({self._token(i) for i in ingredientes}))
+        item = self._receitas.get(receita_id)
+        if item is not None and item[1] == tokens:
+            # Mesmos ingredientes (a própria escrita reaplicada pelo registro
+            # de alterações): nada a refazer nos baldes
+            return
+        # Os tokens novos são contados antes de liberar os antigos: um
+        # ingrediente que continua na receita não sai do vocabulário
+        for token in tokens:
+            self._usos[token] += 1
+        self._remover(receita_id)
+        if not tokens:
+            return
+        assinatura = self._assinar(tokens)
+        n = self.permutacoes
+        if self._livres:
+            faixa = self._livres.pop()
+            self._assinaturas[faixa * n:(faixa + 1) * n] = assinatura
+        else:
+            faixa = len(self._assinaturas) // n
+            self._assinaturas.extend(assinatura)
+        self._receitas[receita_id] = (faixa, tokens)
+        if not self.carregado:
+            # Durante a reconstrução os baldes são ordenados uma vez no final
+            return
+
+        self._alteradas.add(receita_id)
+        for banda, recentes in enumerate(self._recentes):
+            recentes.setdefault(self._chave(faixa, banda), []).append(receita_id)
+        if len(self._alteradas) > max(COMPACTAR_APOS, len(self._receitas) // 8):
+            self._ordenar()
+
+    def _ordenar(self) -> None:
+        # Mesmas chaves de _chave, calculadas sobre uma cópia em bytes das assinaturas
+        dados = self._assinaturas.tobytes()
+        passo, largura = self.permutacoes * 4, self.linhas * 4
+        ids = list(self._receitas)
+        inicios = [faixa * passo for faixa, _ in self._receitas.values()]
+        for banda in range(self.bandas):
+            deslocamento = banda * largura
+            chaves = [hash(dados[i + deslocamento:i + deslocamento + largura]) for i in inicios]
+            ordem = sorted(range(len(chaves)), key=chaves.__getitem__)
+            self._chaves[banda] = array('q', [chaves[i] for i in ordem])
+            self._ids[banda] = array('I', [ids[i] for i in ordem])
+        for recentes in self._recentes:
+            recentes.clear()
+        self._alteradas.clear()
+
+    def _no_balde(self, receita_id: int, banda: int, chave: int) -> bool:
+        if receita_id not in self._alteradas:
+            return True
+        item = self._receitas.get(receita_id)
+        return item is not None and self._chave(item[0], banda) == chave
+
+    def adicionar(self, receita) -> None:
+        with self._lock:
+            self._adicionar(receita.id, receita.ingredientes)
+
+    def remover(self, receita_id: int) -> None:
+        with self._lock:
+            self._remover(receita_id)
+
+    def reconstruir(self, receitas: Iterable) -> None:
+        with self._lock:
+            self.carregado = False
+            self._receitas.clear()
+            self._assinaturas = array('I')
+            self._livres.clear()
+            self._vocabulario.clear()
+            self._vetores = array('I')
+            self._por_nome.clear()
+            self._ingredientes.clear()
+            self._nomes.clear()
+            self._usos = array('I')
+            self._tokens_livres.clear()
+            for receita in receitas:
+                self._adicionar(receita.id, receita.ingredientes)
+            self._ordenar()
+            self.carregado = True
+
+    def similares(self, receita_id: int, k: int = 10) -> Optional[List[Similar]]:
+        """As ``k`` receitas de maior Jaccard entre as candidatas; None se a receita não está no índice."""
+        with self._lock:
+            item = self._receitas.get(receita_id)
+            if item is None:
+                return None
+            faixa, tokens = item
+
+            # 1. Candidatas: quantas bandas cada receita divide com a consultada
+            bandas_em_comum: Counter = Counter()
+            for banda in range(self.bandas):
+                chave = self._chave(faixa, banda)
+                chaves = self._chaves[banda]
+                inicio = bisect_left(chaves, chave)
+                balde = set(self._ids[banda][inicio:bisect_right(chaves, chave, inicio)])
+                balde.update(self._recentes[banda].get(chave, ()))
+                bandas_em_comum.update(r for r in balde if self._no_balde(r, banda, chave))
+            bandas_em_comum.pop(receita_id, None)
+            candidatas = (
+                [r for r, _ in bandas_em_comum.most_common(self.max_candidatos)]
+                if len(bandas_em_comum) > self.max_candidatos else list(bandas_em_comum)
+            )
+
+            # 2. Re-rank pelo Jaccard exato dos ingredientes
+            consulta = set(tokens)
+            resultados = []
+            for candidata in candidatas:
+                outros = self._receitas[candidata][1]
+                comum = sum(1 for t in outros if t in consulta)
+                resultados.append(Similar(candidata, comum / (len(consulta) + len(outros) - comum), comum))
+
+        return heapq.nsmallest(k, resultados, key=lambda s: (-s.similaridade, s.receita_id))
@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from main import app
+from database import create_db_and_tables
+from admissao import BaldeDeFichas, ControleDeAdmissao, LimiteAdaptativo, MiddlewareDeAdmissao
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def app_lento(controle):
+    lento = FastAPI()
+    lento.add_middleware(MiddlewareDeAdmissao, controle=controle)
+
+    @lento.get("/lenta")
+    async def lenta():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    return lento
+
+def test_limite_adaptativo_aimd():
+    limite = LimiteAdaptativo("teste", maximo=10, fila_maxima=0, minimo=2)
+
+    # 1. Latência estável: o limite fica no máximo
+    for _ in range(50):
+        limite._ajustar(0.005)
+    assert limite.limite == 10
+
+    # 2. Latência bem acima da referência: redução multiplicativa, até o mínimo
+    for _ in range(100):
+        limite._ultima_reducao = 0
+        limite._ajustar(0.5)
+    assert limite.limite == 2
+
+    # 3. De volta ao normal: aumento aditivo
+    for _ in range(300):
+        limite._ajustar(0.005)
+    assert 2 < limite.limite <= 10
+
+def test_fila_limitada_e_espera_maxima():
+    async def cenario():
+        limite = LimiteAdaptativo("teste", maximo=1, fila_maxima=1, espera_maxima=0.1)
+        assert await limite.adquirir() == "admitida"
+        na_fila = asyncio.create_task(limite.adquirir())
+        await asyncio.sleep(0)
+        assert await limite.adquirir() == "fila_cheia"
+
+        # A vaga liberada passa direto para quem esperava na fila
+        limite.liberar()
+        assert await na_fila == "enfileirada"
+        assert limite.em_uso == 1
+
+        assert await limite.adquirir() == "espera_esgotada"
+        assert limite.na_fila == 0
+
+    asyncio.run(cenario())
+
+def test_balde_de_fichas_por_cliente():
+    baldes = BaldeDeFichas(taxa=1, rajada=2)
+    assert baldes.consumir("a") == 0
+    assert baldes.consumir("a") == 0
+    assert baldes.consumir("a") > 0
+    assert baldes.consumir("b") == 0
+
+def test_excedente_recebe_503_com_retry_after():
+    controle = ControleDeAdmissao([LimiteAdaptativo("leitura", maximo=1, fila_maxima=0)])
+
+    async def rajada():
+        transport = httpx.ASGITransport(app=app_lento(controle))
+        async with httpx.AsyncClient(transport=transport, base_url="http://teste") as cliente:
+            return await asyncio.gather(cliente.get("/lenta"), cliente.get("/lenta"))
+
+    respostas = sorted(asyncio.run(rajada()), key=lambda r: r.status_code)
+    assert [r.status_code for r in respostas] == [200, 503]
+    assert int(respostas[1].headers["Retry-After"]) >= 1
+
+def test_taxa_por_cliente_responde_429():
+    controle = ControleDeAdmissao(
+        [LimiteAdaptativo("leitura", maximo=10, fila_maxima=10)],
+        baldes=BaldeDeFichas(taxa=0.01, rajada=1),
+    )
+    cliente = TestClient(app_lento(controle))
+    assert cliente.get("/lenta").status_code == 200
+    response = cliente.get("/lenta")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 1
+
+def test_grupos_de_rotas_e_contadores():
+    assert client.get("/receitas/1").status_code == 200
+    texto = client.get("/metrics").text
+    assert 'admission_requests_total{group="leitura",result="admitida"}' in texto
+    assert 'admission_limit{group="senha"}' in texto
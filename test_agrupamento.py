@@ -0,0 +1,111 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from main import app
+from database import create_db_and_tables
+from agrupamento import CarregadorEmLote
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def carregador(maximo=500, falhar=False):
+    chamadas = []
+
+    async def buscar(chaves):
+        chamadas.append(sorted(chaves))
+        await asyncio.sleep(0.01)
+        if falhar:
+            raise RuntimeError("banco fora do ar")
+        return {chave: chave * 10 for chave in chaves if chave != 404}
+
+    return CarregadorEmLote("teste", buscar, janela=0.005, maximo=maximo), chamadas
+
+def test_leituras_simultaneas_viram_uma_consulta():
+    async def cenario():
+        lote, chamadas = carregador()
+        valores = await asyncio.gather(*(lote.carregar(chave) for chave in [1, 2, 2, 3, 404]))
+        assert valores == [10, 20, 20, 30, None]
+
+        # Pedido igual durante a consulta em andamento: aproveita a mesma
+        primeira = asyncio.create_task(lote.carregar(7))
+        await asyncio.sleep(0.008)
+        assert await lote.carregar(7) == await primeira == 70
+        return chamadas
+
+    assert asyncio.run(cenario()) == [[1, 2, 3, 404], [7]]
+
+def test_quem_escreveu_nao_aproveita_consulta_anterior():
+    async def cenario():
+        lote, chamadas = carregador()
+
+        # 1. Com o cookie de escrita: entra no lote aberto, mas não na consulta em andamento
+        primeira = asyncio.create_task(lote.carregar(7))
+        assert await lote.carregar(7, depois_de_escrever=True) == await primeira
+        primeira = asyncio.create_task(lote.carregar(8))
+        await asyncio.sleep(0.008)
+        await asyncio.gather(primeira, lote.carregar(8, depois_de_escrever=True))
+
+        # 2. Depois de uma escrita deste processo, ninguém aproveita a consulta anterior
+        primeira = asyncio.create_task(lote.carregar(9))
+        await asyncio.sleep(0.008)
+        lote.esquecer()
+        await asyncio.gather(primeira, lote.carregar(9))
+        return chamadas
+
+    assert asyncio.run(cenario()) == [[7], [8], [8], [9], [9]]
+
+def test_lote_cheio_dispara_sem_esperar_a_janela():
+    async def cenario():
+        lote, chamadas = carregador(maximo=2)
+        assert await lote.carregar_muitos([1, 2, 3]) == {1: 10, 2: 20, 3: 30}
+        return chamadas
+
+    assert asyncio.run(cenario()) == [[1, 2], [3]]
+
+def test_erro_chega_a_todos_do_lote():
+    async def cenario():
+        lote, _ = carregador(falhar=True)
+        return await asyncio.gather(lote.carregar(1), lote.carregar(2), return_exceptions=True)
+
+    assert all(isinstance(erro, RuntimeError) for erro in asyncio.run(cenario()))
+
+def test_usuarios_por_ids():
+    relatorio = client.post("/usuarios/bulk", json=[
+        {"nome_usuario": f"lote_ids_{i}", "email": f"lote_ids_{i}@example.com", "senha": "Senha123"}
+        for i in range(3)
+    ]).json()
+    ids = [r["id"] for r in relatorio["resultados"]]
+
+    response = client.get("/usuarios", params={"ids": f"{ids[2]},999999,{ids[0]},{ids[2]}"})
+    assert response.status_code == 200
+    assert [u["id"] for u in response.json()] == [ids[2], ids[0]]
+    assert response.headers["X-Missing-Ids"] == "999999"
+    assert "senha" not in response.json()[0]
+
+    # Página cortada (também quando vem do cache) aponta a próxima
+    for _ in range(2):
+        response = client.get("/usuarios", params={"limit": 1, "after": ids[0] - 1})
+        assert [u["id"] for u in response.json()] == [ids[0]]
+        assert response.headers["X-Next-Cursor"] == str(ids[0])
+        assert 'rel="next"' in response.headers["Link"]
+
+    # Leituras individuais simultâneas também vão em lotes
+    async def simultaneas():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://teste") as cliente:
+            return await asyncio.gather(*(cliente.get(f"/usuarios/nome/lote_ids_{i}") for i in range(3)))
+
+    assert [r.json()["id"] for r in asyncio.run(simultaneas())] == ids
+
+def test_receitas_por_ids():
+    response = client.get("/receitas", params={"ids": "2,1"})
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()] == [2, 1]
+    assert response.json()[0]["ingredientes"]
+    assert "X-Missing-Ids" not in response.headers
+
+    assert client.get("/receitas", params={"ids": "1,dois"}).status_code == 400
+    assert client.get("/receitas", params={"ids": ",".join(map(str, range(1, 102)))}).status_code == 400
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+import database
+from alteracoes import Aviso, eventos, expurgar, limite_de_retencao
+from database import create_db_and_tables, SessionLocal
+from main import app
+from models import Alteracao
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def cursor_atual():
+    with SessionLocal() as db:
+        return db.scalar(select(func.coalesce(func.max(Alteracao.seq), 0)))
+
+def nova_receita(nome):
+    resposta = client.post("/receitas", json={"nome": nome, "ingredientes": ["caldo do feed", "sal do feed"], "modo_de_preparo": "Misture."})
+    assert resposta.status_code == 201
+    return resposta.json()["id"]
+
+def test_feed_com_compactacao_e_lapides():
+    since = cursor_atual()
+
+    # 1. Receita criada e depois alterada; usuário criado e depois removido
+    receita_id = nova_receita("Feed Um")
+    client.put(f"/receitas/{receita_id}", json={"nome": "Feed Um Editada", "ingredientes": ["sal do feed"], "modo_de_preparo": "Misture."})
+    usuario = client.post("/usuarios", json={"nome_usuario": "feed_user", "email": "feed@email.com", "senha": "Senha123"}).json()
+    assert client.delete(f"/usuarios/{usuario['id']}").status_code == 200
+
+    # 2. Só a última entrada de cada item, em ordem de seq, com o estado atual
+    resposta = client.get("/changes", params={"since": since})
+    assert resposta.status_code == 200
+    alteracoes = resposta.json()
+    assert [(a["entidade"], a["id"], a["operacao"]) for a in alteracoes] == [
+        ("receita", receita_id, "atualizado"),
+        ("usuario", usuario["id"], "removido"),
+    ]
+    assert alteracoes[0]["dados"]["nome"] == "Feed Um Editada"
+    assert alteracoes[1]["dados"] is None
+    assert resposta.headers["X-Next-Cursor"] == str(alteracoes[-1]["seq"])
+
+    # 3. Paginação pelo seq
+    primeira = client.get("/changes", params={"since": since, "limit": 1})
+    assert [a["seq"] for a in primeira.json()] == [alteracoes[0]["seq"]]
+    assert 'rel="next"' in primeira.headers["Link"]
+
+    # 4. Nada novo: lista vazia e o mesmo cursor
+    vazia = client.get("/changes", params={"since": alteracoes[-1]["seq"]})
+    assert vazia.json() == [] and vazia.headers["X-Next-Cursor"] == str(alteracoes[-1]["seq"])
+
+def test_long_poll_responde_na_escrita():
+    since = cursor_atual()
+    resultado = {}
+
+    def esperar():
+        inicio = time.perf_counter()
+        resposta = client.get("/changes", params={"since": since, "espera": 10})
+        resultado["tempo"] = time.perf_counter() - inicio
+        resultado["alteracoes"] = resposta.json()
+
+    espera = threading.Thread(target=esperar)
+    espera.start()
+    time.sleep(0.5)
+    receita_id = nova_receita("Feed Long Poll")
+    espera.join(timeout=15)
+
+    assert [a["id"] for a in resultado["alteracoes"]] == [receita_id]
+    assert resultado["tempo"] < 5
+
+def test_expurgo_de_lapides_e_horizonte():
+    receita_id = nova_receita("Feed Expurgo")
+    client.delete(f"/receitas/{receita_id}")
+
+    async def expurgar_com(retencao_dias):
+        async with database.AsyncSessionLocal() as db:
+            removidas = await expurgar(db, retencao_dias=retencao_dias)
+        await database.async_engine.dispose()
+        return removidas
+
+    # 1. Pelo relógio do banco, a lápide recém-gravada ainda não venceu; com
+    #    retenção negativa, todas já venceram
+    assert asyncio.run(expurgar_com(1)) == 0
+    assert asyncio.run(expurgar_com(-1)) >= 1
+    # No PostgreSQL o limite também é calculado no banco
+    assert str(limite_de_retencao("postgresql", 7).compile(dialect=postgresql.dialect())) == "now() - %(now_1)s"
+
+    # 2. Cursor antes da lápide expurgada: 410; since=0 continua valendo
+    resposta = client.get("/changes", params={"since": 1})
+    assert resposta.status_code == 410
+    assert all(a["operacao"] != "removido" for a in client.get("/changes", params={"limit": 1000}).json())
+
+def test_eventos_sse():
+    class Item:
+        def __init__(self, seq):
+            self.seq, self.operacao = seq, "criado"
+        def model_dump_json(self):
+            return f'{{"seq": {self.seq}}}'
+
+    paginas = [[Item(1), Item(2)], [], [], [Item(3)]]
+    async def ler_pagina(since):
+        return paginas.pop(0) if paginas else []
+    async def ultimo():
+        return 0
+
+    async def cenario():
+        aviso = Aviso(intervalo=60)
+        fluxo = eventos(aviso, ler_pagina, 0, ultimo, manter_viva=0.05)
+        recebidos = [await fluxo.__anext__() for _ in range(3)]
+        # Sem alterações, um comentário mantém a conexão; um aviso traz a próxima
+        aviso.notificar()
+        recebidos.append(await fluxo.__anext__())
+        await fluxo.aclose()
+        return recebidos
+
+    recebidos = asyncio.run(cenario())
+    assert recebidos[0] == 'id: 1\nevent: criado\ndata: {"seq": 1}\n\n'
+    assert recebidos[1].startswith("id: 2\n")
+    assert recebidos[2] == ": manter viva\n\n"
+    assert recebidos[3].startswith("id: 3\n")
@@ -0,0 +1,92 @@
+import random
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import autocompletar
+from autocompletar import AutocompletarIngredientes, AutocompletarReceitas, Prefixos
+from database import create_db_and_tables
+from main import app
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def receita(id, nome="", ingredientes=()):
+    return SimpleNamespace(id=id, nome=nome, ingredientes=list(ingredientes))
+
+def test_prefixos_igual_a_forca_bruta(monkeypatch):
+    # Limiares baixos: exercita o top-k guardado e as junções da lista de novas
+    monkeypatch.setattr(autocompletar, "VARREDURA_MAXIMA", 8)
+    monkeypatch.setattr(autocompletar, "COMPACTAR_APOS", 4)
+    aleatorio = random.Random(3)
+    palavras = ["".join(aleatorio.choice("abc") for _ in range(aleatorio.randint(1, 4))) for _ in range(200)]
+    prefixos, pesos = Prefixos(), {}
+    for passo in range(3000):
+        chave = aleatorio.choice(palavras)
+        delta = aleatorio.choice([1, 1, 2, -1])
+        prefixos.somar(chave, delta)
+        pesos[chave] = max(pesos.get(chave, 0) + delta, 0)
+        if passo % 10 == 0:
+            prefixo = aleatorio.choice(["a", "b", "ab", "ca", "abc"])
+            esperado = sorted((c for c, p in pesos.items() if p and c.startswith(prefixo)), key=lambda c: (-pesos[c], c))[:5]
+            assert [s.chave for s in prefixos.buscar(prefixo, 5)] == esperado
+
+def test_ingredientes_por_popularidade_sem_acento():
+    indice = AutocompletarIngredientes()
+    indice.reconstruir([
+        receita(1, ingredientes=["Açúcar", "ovos"]),
+        receita(2, ingredientes=["açúcar", "acelga"]),
+        receita(3, ingredientes=["acelga", "açafrão", "Açúcar"]),
+    ])
+    assert indice.buscar("AC") == [("Açúcar", 3), ("acelga", 2), ("açafrão", 1)]
+
+    # Escritas: a receita alterada só mexe nos ingredientes que mudaram
+    indice.adicionar(receita(3, ingredientes=["açafrão", "ovos"]))
+    indice.remover(2)
+    assert indice.buscar("ac") == [("açafrão", 1), ("Açúcar", 1)]
+    assert indice.buscar("ovo", k=1) == [("ovos", 2)]
+    assert indice.buscar("x") == []
+
+def test_receitas_pelo_comeco_do_nome_ou_de_uma_palavra():
+    indice = AutocompletarReceitas()
+    indice.reconstruir([
+        receita(1, "Bolo de Chocolate"),
+        receita(2, "Chocolate Quente"),
+        receita(3, "Mousse de chocolate"),
+        receita(4, "Pão de Queijo"),
+    ])
+    # O começo do nome vem antes das palavras do meio; "de" não inicia sugestões
+    assert indice.buscar("choc") == [(2, "Chocolate Quente"), (1, "Bolo de Chocolate"), (3, "Mousse de chocolate")]
+    assert indice.buscar("de") == []
+    assert indice.buscar("pao") == [(4, "Pão de Queijo")]
+
+    indice.adicionar(receita(4, "Pão de Batata"))
+    indice.remover(2)
+    assert indice.buscar("queijo") == []
+    assert indice.buscar("bat") == [(4, "Pão de Batata")]
+    assert [i for i, _ in indice.buscar("choc")] == [1, 3]
+
+def test_receitas_distintas_mesmo_com_varias_palavras_casando(monkeypatch):
+    indice = AutocompletarReceitas()
+    indice.reconstruir([receita(1, "Sopa pão pão pão pão"), receita(2, "Sopa pão sem sal")])
+    # As quatro chaves da receita 1 vêm antes da receita 2: pede mais até achar k receitas
+    assert indice.buscar("pao", k=2) == [(1, "Sopa pão pão pão pão"), (2, "Sopa pão sem sal")]
+
+    # Também além do top-k guardado dos prefixos com muitas chaves
+    monkeypatch.setattr(autocompletar, "VARREDURA_MAXIMA", 2)
+    monkeypatch.setattr(autocompletar, "TOPO_K", 3)
+    assert [i for i, _ in indice.buscar("pao", k=2)] == [1, 2]
+    assert [i for i, _ in indice.buscar("pao", k=3)] == [1, 2]
+
+def test_rotas_de_autocompletar():
+    client.post("/receitas", json={"nome": "Torta de Jiló", "ingredientes": ["Jiló", "jilo", "Jabuticaba"], "modo_de_preparo": "Asse."})
+
+    resposta = client.get("/autocomplete/ingredientes", params={"prefix": "JIL"})
+    assert resposta.status_code == 200
+    assert resposta.json() == [{"nome": "Jiló", "receitas": 1}]
+    assert "max-age" in resposta.headers["Cache-Control"]
+
+    assert client.get("/autocomplete/receitas", params={"prefix": "jilo"}).json()[0]["nome"] == "Torta de Jiló"
+    assert client.get("/autocomplete/receitas", params={"prefix": "torta de j"}).json()[0]["nome"] == "Torta de Jiló"
+    assert client.get("/autocomplete/receitas", params={"prefix": ""}).status_code == 422
@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from main import app
+from database import create_db_and_tables
+from cache import CacheDeRespostas, CacheMemoria, CacheRedis, Entrada
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+class RedisFalso:
+    # Só o que o CacheRedis usa: get, set(ex=...), delete e incr
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def set(self, chave, valor, ex=None):
+        self.dados[chave] = valor
+
+    def delete(self, *chaves):
+        for chave in chaves:
+            self.dados.pop(chave, None)
+
+    def incr(self, chave):
+        self.dados[chave] = int(self.dados.get(chave, 0)) + 1
+        return self.dados[chave]
+
+def test_etag_e_get_condicional():
+    criada = client.post("/receitas", json={
+        "nome": "Cocada",
+        "ingredientes": ["coco ralado", "açúcar"],
+        "modo_de_preparo": "Cozinhe até dar ponto.",
+    }).json()
+
+    # 1. A primeira leitura traz o ETag; repetir com If-None-Match dá 304
+    response = client.get(f"/receitas/{criada['id']}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    response = client.get(f"/receitas/{criada['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # 2. A listagem também responde 304 enquanto nada mudar
+    lista = client.get("/receitas")
+    response = client.get("/receitas", headers={"If-None-Match": lista.headers["ETag"]})
+    assert response.status_code == 304
+
+    # 3. Uma escrita invalida o item, o nome antigo e as páginas
+    client.put(f"/receitas/{criada['id']}", json={
+        "nome": "Cocada Branca",
+        "ingredientes": ["coco ralado", "açúcar", "leite"],
+        "modo_de_preparo": "Cozinhe até dar ponto.",
+    })
+    response = client.get(f"/receitas/{criada['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["ingredientes"] == ["coco ralado", "açúcar", "leite"]
+    assert client.get("/receitas/nome/cocada").status_code == 404
+    response = client.get("/receitas", headers={"If-None-Match": lista.headers["ETag"]})
+    assert response.status_code == 200
+    assert "Cocada Branca" in [r["nome"] for r in response.json()]
+
+    # 4. Depois de deletada, a receita não é servida do cache
+    client.delete(f"/receitas/{criada['id']}")
+    assert client.get(f"/receitas/{criada['id']}").status_code == 404
+    assert client.get("/receitas/nome/cocada branca").status_code == 404
+
+def test_cache_de_usuario_invalida_na_atualizacao():
+    usuario = client.post("/usuarios", json={
+        "nome_usuario": "cache_user",
+        "email": "cache@example.com",
+        "senha": "senha123",
+    }).json()
+
+    response = client.get(f"/usuarios/{usuario['id']}")
+    etag = response.headers["ETag"]
+    assert client.get(f"/usuarios/{usuario['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/usuarios/{usuario['id']}", json={
+        "nome_usuario": "cache_user_2",
+        "email": "cache@example.com",
+        "senha": "senha123",
+    })
+    response = client.get(f"/usuarios/{usuario['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["nome_usuario"] == "cache_user_2"
+
+    client.delete(f"/usuarios/{usuario['id']}")
+    assert client.get(f"/usuarios/{usuario['id']}").status_code == 404
+
+def test_backends():
+    # O LRU descarta a entrada menos usada
+    memoria = CacheMemoria(max_entradas=2)
+    memoria.set("a", b"1")
+    memoria.set("b", b"2")
+    memoria.get("a")
+    memoria.set("c", b"3")
+    assert memoria.get("b") is None
+    assert memoria.get("a") == b"1"
+
+    # O backend Redis funciona com qualquer cliente compatível
+    cliente = RedisFalso()
+    respostas = CacheDeRespostas(CacheRedis(cliente))
+    entrada = Entrada.criar(b'{"id": 1}', {"X-Next-Cursor": "1"})
+    respostas.backend.set("receita:1", entrada.para_bytes())
+    assert Entrada.de_bytes(cliente.get("api-receitas:receita:1")) == entrada
+
+    chave = respostas.chave_versionada("receitas", 10, 0)
+    respostas.nova_versao("receitas")
+    assert respostas.chave_versionada("receitas", 10, 0) != chave
+    respostas.invalidar("receita:1")
+    assert respostas.backend.get("receita:1") is None
+
+def test_invalidacao_durante_a_leitura_nao_grava_entrada_velha():
+    request = Request({"type": "http", "headers": []})
+    respostas = CacheDeRespostas(CacheMemoria())
+
+    # 1. A escrita invalida enquanto a leitura produz a resposta (sync e async)
+    def produzir():
+        respostas.invalidar("receita:1")
+        return Entrada.criar(b'{"versao": "velha"}')
+
+    async def produzir_async():
+        return produzir()
+
+    respostas.responder(request, "receita:1", produzir)
+    assert respostas.backend.get("receita:1") is None
+    asyncio.run(respostas.responder_async(request, "receita:1", produzir_async))
+    assert respostas.backend.get("receita:1") is None
+
+    # 2. A invalidação cai entre a conferência da geração e o set
+    class InvalidaNoSet(CacheMemoria):
+        def set(self, chave, valor, ttl=None):
+            if chave == "receita:2":
+                respostas.invalidar("receita:2")
+            super().set(chave, valor, ttl)
+
+    respostas.backend = InvalidaNoSet()
+    respostas.responder(request, "receita:2", lambda: Entrada.criar(b'{"versao": "velha"}'))
+    assert respostas.backend.get("receita:2") is None
+
+    # 3. Sem invalidação, grava normalmente
+    respostas.responder(request, "receita:3", lambda: Entrada.criar(b"{}"))
+    assert respostas.backend.get("receita:3") is not None
+
+def test_leitura_da_replica_nao_e_gravada_logo_depois_de_escrita_em_outro_worker():
+    request = Request({"type": "http", "headers": []})
+    cliente = RedisFalso()
+    # Dois workers sobre o mesmo Redis
+    escreve = CacheDeRespostas(CacheRedis(cliente), janela_replicas=5)
+    le = CacheDeRespostas(CacheRedis(cliente), janela_replicas=5)
+
+    # 1. Sem escrita recente, o lido da réplica é gravado
+    le.responder(request, "usuario:1", lambda: Entrada.criar(b"{}"), de_replica=True)
+    assert le.backend.get("usuario:1") is not None
+
+    # 2. Escrita no outro worker: a réplica pode estar atrasada e nada é gravado
+    escreve.invalidar("usuario:1")
+    le.responder(request, "usuario:1", lambda: Entrada.criar(b'{"versao": "velha?"}'), de_replica=True)
+    assert le.backend.get("usuario:1") is None
+    escreve.nova_versao("usuarios")
+    le.responder(request, "usuarios:v1", lambda: Entrada.criar(b"[]"), de_replica=True)
+    assert le.backend.get("usuarios:v1") is None
+
+    # 3. O lido da primária é gravado, e o da réplica volta a ser depois da janela
+    le.responder(request, "usuario:1", lambda: Entrada.criar(b"{}"))
+    assert le.backend.get("usuario:1") is not None
+    cliente.set("api-receitas:ultima_invalidacao", b"%.3f" % (time.time() - 6))
+    le.responder(request, "usuarios:v1", lambda: Entrada.criar(b"[]"), de_replica=True)
+    assert le.backend.get("usuarios:v1") is not None
@@ -0,0 +1,87 @@
+import gzip
+import json
+
+from fastapi.testclient import TestClient
+
+from main import app
+from database import create_db_and_tables
+from compressao import negociar
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+def amostra(serie: str) -> float:
+    for linha in client.get("/metrics").text.splitlines():
+        if linha.startswith(serie + " "):
+            return float(linha.rsplit(" ", 1)[1])
+    return 0
+
+def test_negociacao():
+    preferencia = ["zstd", "br", "gzip"]
+    assert negociar("gzip, br", preferencia) == "br"
+    assert negociar("gzip;q=1, br;q=0.5", preferencia) == "gzip"
+    assert negociar("*", preferencia) == "zstd"
+    assert negociar("br;q=0, *;q=0.1", ["br", "gzip"]) == "gzip"
+    assert negociar("identity", preferencia) is None
+    assert negociar(None, preferencia) is None
+
+def test_listagem_repetida_usa_a_versao_comprimida_do_cache():
+    client.post("/receitas/bulk", json=[
+        {"nome": f"Compressão {i}", "ingredientes": ["farinha", "ovos", "leite"], "modo_de_preparo": "Misture e asse. " * 5}
+        for i in range(20)
+    ])
+    comprimidas = 'http_response_compressions_total{encoding="gzip",source="cache"}'
+    do_cache = 'http_precompressed_responses_total{encoding="gzip"}'
+
+    # 1. Primeira leitura: comprime uma vez e guarda
+    antes = amostra(comprimidas)
+    response = client.get("/receitas?limit=1000", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"].endswith('-gzip"')
+    assert any(r["nome"] == "Compressão 19" for r in response.json())
+    assert amostra(comprimidas) == antes + 1
+
+    # 2. Leitura repetida: os mesmos bytes, sem comprimir de novo
+    servidas = amostra(do_cache)
+    repetida = client.get("/receitas?limit=1000", headers=GZIP)
+    assert repetida.content == response.content
+    assert amostra(comprimidas) == antes + 1
+    assert amostra(do_cache) == servidas + 1
+
+    # 3. GET condicional com o ETag da representação comprimida
+    etag = response.headers["ETag"]
+    assert client.get("/receitas?limit=1000", headers={**GZIP, "If-None-Match": etag}).status_code == 304
+
+    # 4. Sem Accept-Encoding, o corpo original e o ETag base
+    identidade = client.get("/receitas?limit=1000", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identidade.headers
+    assert identidade.headers["ETag"] == etag.replace('-gzip"', '"')
+    assert identidade.json() == response.json()
+
+def test_listagem_de_usuarios_em_cache_muda_com_novo_usuario():
+    primeira = client.get("/usuarios?limit=1000", headers=GZIP).json()
+    client.post("/usuarios", json={"nome_usuario": "comprimido", "email": "comprimido@example.com", "senha": "Senha123"})
+    segunda = client.get("/usuarios?limit=1000", headers=GZIP).json()
+    assert len(segunda) == len(primeira) + 1
+
+def test_corpo_pequeno_vai_sem_compressao():
+    response = client.get("/ready", headers=GZIP)
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+def test_exportacao_ndjson_comprimida_em_fluxo():
+    response = client.get("/receitas/export", headers=GZIP)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+
+    # O fluxo inteiro é um único membro gzip válido
+    with client.stream("GET", "/receitas/export", headers=GZIP) as fluxo:
+        comprimido = b"".join(fluxo.iter_raw())
+    linhas = gzip.decompress(comprimido).decode().splitlines()
+    assert linhas
+    assert [json.loads(linha)["id"] for linha in linhas] == [json.loads(linha)["id"] for linha in response.text.splitlines()]
@@ -0,0 +1,91 @@
+import asyncio
+from datetime import date, datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, update
+
+import database
+from database import create_db_and_tables, SessionLocal
+from estatisticas import ITENS, RECEITAS, USUARIOS, de_receitas, de_usuarios, reconciliar
+from main import app
+from models import CadastrosPorDia, Estatistica, EstatisticaIngrediente, Receita, ReceitaIngrediente, User
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def stats(**params):
+    resposta = client.get("/stats", params={"limite": 100, **params})
+    assert resposta.status_code == 200
+    return resposta.json()
+
+def frequencia(resumo, nome):
+    return next((i["receitas"] for i in resumo["ingredientes_mais_usados"] if i["nome"] == nome), 0)
+
+def reconciliar_agora():
+    async def rodar():
+        async with database.AsyncSessionLocal() as db:
+            corrigidos = await reconciliar(db)
+        await database.async_engine.dispose()
+        return corrigidos
+    return asyncio.run(rodar())
+
+def test_variacao_conta_so_o_que_mudou():
+    # Receita alterada: "2" saiu, "4" entrou; o ingrediente repetido conta uma receita
+    variacao = de_receitas(removidas=[[1, 2, 3]], criadas=[[1, 3, 3, 4]])
+    assert variacao.contadores == {ITENS: 1}
+    assert variacao.ingredientes == {2: -1, 4: 1}
+
+    variacao = de_usuarios(criados=[datetime(2026, 1, 2, 23, 59), datetime(2026, 1, 2, 8)])
+    assert variacao.contadores == {USUARIOS: 2}
+    assert variacao.cadastros == {date(2026, 1, 2): 2}
+
+def test_stats_acompanha_as_escritas():
+    antes = stats()
+
+    # 1. Receitas criadas, alterada e removida
+    ids = [
+        client.post("/receitas", json={"nome": f"Stats {i}", "ingredientes": ["fermento stats", "sal stats", "sal stats"], "modo_de_preparo": "Asse."}).json()["id"]
+        for i in range(3)
+    ]
+    client.put(f"/receitas/{ids[0]}", json={"nome": "Stats 0", "ingredientes": ["fermento stats"], "modo_de_preparo": "Asse."})
+    client.delete(f"/receitas/{ids[1]}")
+
+    # 2. Usuários criados (um deles em lote) e um removido
+    client.post("/usuarios", json={"nome_usuario": "stats_um", "email": "stats1@email.com", "senha": "Senha123"})
+    client.post("/usuarios/bulk", json=[
+        {"nome_usuario": "stats_dois", "email": "stats2@email.com", "senha": "Senha123"},
+        {"nome_usuario": "stats_tres", "email": "stats3@email.com", "senha": "Senha123"},
+    ])
+    removido = client.get("/usuarios/nome/stats_tres").json()
+    client.delete(f"/usuarios/{removido['id']}")
+
+    depois = stats()
+    assert depois["receitas"] == antes["receitas"] + 2
+    assert depois["usuarios"] == antes["usuarios"] + 2
+    assert frequencia(depois, "fermento stats") == 2
+    assert frequencia(depois, "sal stats") == 1
+    assert sum(c["usuarios"] for c in depois["cadastros_por_dia"]) == depois["usuarios"]
+
+    # 3. Os agregados batem com as tabelas: a reconciliação não corrige nada
+    with SessionLocal() as db:
+        itens = db.scalar(select(func.count()).select_from(ReceitaIngrediente))
+        assert depois["receitas"] == db.scalar(select(func.count()).select_from(Receita))
+        assert depois["usuarios"] == db.scalar(select(func.count()).select_from(User))
+    assert depois["media_ingredientes_por_receita"] == round(itens / depois["receitas"], 2)
+    assert reconciliar_agora() == 0
+
+def test_reconciliacao_corrige_divergencias():
+    esperado = stats()
+
+    # Agregados corrompidos por fora do repositório
+    with SessionLocal() as db:
+        db.execute(update(Estatistica).where(Estatistica.chave == RECEITAS).values(valor=Estatistica.valor + 5))
+        db.execute(update(EstatisticaIngrediente).values(receitas=EstatisticaIngrediente.receitas + 1))
+        db.execute(update(CadastrosPorDia).values(usuarios=0))
+        db.commit()
+    assert stats() != esperado
+
+    assert reconciliar_agora() > 0
+    assert stats() == esperado
+    assert reconciliar_agora() == 0
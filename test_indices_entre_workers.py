@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import repositorio
+from main import app
+from busca import BuscaMemoria, indice_busca
+from database import create_db_and_tables, settings
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+pytestmark = pytest.mark.skipif(":memory" in settings.DATABASE_URL, reason="outro processo não enxerga um banco em memória")
+
+OUTRO_WORKER = """
+import json, sys
+from fastapi.testclient import TestClient
+from main import app
+client = TestClient(app)
+for metodo, caminho, corpo in json.loads(sys.argv[1]):
+    resposta = client.request(metodo, caminho, json=corpo)
+    assert resposta.status_code < 300, resposta.text
+    print(json.dumps(resposta.json()))
+"""
+
+def em_outro_worker(*requisicoes):
+    # Outra instância do app, em outro processo e com o mesmo banco: os
+    # índices em memória dela não são os deste processo
+    saida = subprocess.run(
+        [sys.executable, "-c", OUTRO_WORKER, json.dumps(requisicoes)],
+        cwd=RAIZ, check=True, capture_output=True, text=True,
+    )
+    return [json.loads(linha) for linha in saida.stdout.splitlines()]
+
+def compativeis(ingrediente):
+    response = client.get("/receitas/compativeis", params={"despensa": [ingrediente]})
+    assert response.status_code == 200
+    return [r["nome"] for r in response.json()]
+
+def test_indice_de_ingredientes_ve_escritas_de_outro_worker():
+    # 1. Índice montado aqui, com uma receita gravada por este processo
+    local = client.post("/receitas", json={"nome": "Cuscuz Local", "ingredientes": ["flocão de milho"], "modo_de_preparo": "Cozinhe no vapor."}).json()
+    assert compativeis("flocão de milho") == ["Cuscuz Local"]
+
+    # 2. O outro worker cria uma receita e altera a deste
+    criada, _ = em_outro_worker(
+        ("POST", "/receitas", {"nome": "Baião do Outro Worker", "ingredientes": ["feijão de corda"], "modo_de_preparo": "Cozinhe."}),
+        ("PUT", f"/receitas/{local['id']}", {"nome": "Cuscuz Local", "ingredientes": ["massa de milho"], "modo_de_preparo": "Cozinhe no vapor."}),
+    )
+    assert compativeis("feijão de corda") == ["Baião do Outro Worker"]
+    assert compativeis("massa de milho") == ["Cuscuz Local"]
+    assert compativeis("flocão de milho") == []
+
+    # 3. E remove as duas
+    em_outro_worker(("DELETE", f"/receitas/{criada['id']}", None), ("DELETE", f"/receitas/{local['id']}", None))
+    assert compativeis("feijão de corda") == []
+    assert compativeis("massa de milho") == []
+
+def similares(receita_id):
+    response = client.get(f"/receitas/{receita_id}/similares")
+    return [r["nome"] for r in response.json()] if response.status_code == 200 else response.status_code
+
+def test_similares_ve_escritas_de_outro_worker():
+    ingredientes = ["jambu", "tucupi", "camarão seco", "goma de tapioca"]
+    local = client.post("/receitas", json={"nome": "Tacacá Local", "ingredientes": ingredientes, "modo_de_preparo": "Sirva na cuia."}).json()
+    assert similares(local["id"]) == []
+
+    # Receita nova do outro worker: aparece como similar e tem as suas similares
+    criada, = em_outro_worker(("POST", "/receitas", {"nome": "Tacacá do Outro Worker", "ingredientes": ingredientes[:3] + ["alho"], "modo_de_preparo": "Sirva na cuia."}))
+    assert similares(local["id"]) == ["Tacacá do Outro Worker"]
+    assert similares(criada["id"]) == ["Tacacá Local"]
+
+    em_outro_worker(("DELETE", f"/receitas/{criada['id']}", None))
+    assert similares(local["id"]) == []
+    assert similares(criada["id"]) == 404
+    client.delete(f"/receitas/{local['id']}")
+
+def test_autocompletar_ve_escritas_de_outro_worker():
+    assert client.get("/autocomplete/receitas", params={"prefix": "vatap"}).json() == []
+    criada, = em_outro_worker(("POST", "/receitas", {"nome": "Vatapá do Outro Worker", "ingredientes": ["castanha de caju"], "modo_de_preparo": "Cozinhe."}))
+    assert client.get("/autocomplete/receitas", params={"prefix": "vatap"}).json() == [{"id": criada["id"], "nome": "Vatapá do Outro Worker"}]
+    assert client.get("/autocomplete/ingredientes", params={"prefix": "castanha de c"}).json() == [{"nome": "castanha de caju", "receitas": 1}]
+
+    em_outro_worker(("DELETE", f"/receitas/{criada['id']}", None))
+    assert client.get("/autocomplete/receitas", params={"prefix": "vatap"}).json() == []
+    assert client.get("/autocomplete/ingredientes", params={"prefix": "castanha de c"}).json() == []
+
+def test_busca_em_memoria_ve_escritas_de_outro_worker(monkeypatch):
+    # Este processo busca pelo índice em memória, mantido como os demais
+    monkeypatch.setattr(main, "busca", BuscaMemoria())
+    if indice_busca not in repositorio.INDICES:
+        monkeypatch.setattr(repositorio, "INDICES", [*repositorio.INDICES, indice_busca])
+
+    def nomes(q):
+        return [r["nome"] for r in client.get("/receitas/search", params={"q": q}).json()]
+
+    assert nomes("maniçoba") == []
+    criada, = em_outro_worker(("POST", "/receitas", {"nome": "Maniçoba do Outro Worker", "ingredientes": ["maniva"], "modo_de_preparo": "Cozinhe por dias."}))
+    assert nomes("maniçoba") == ["Maniçoba do Outro Worker"]
+    assert nomes("maniva") == ["Maniçoba do Outro Worker"]
+
+    em_outro_worker(("DELETE", f"/receitas/{criada['id']}", None))
+    assert nomes("maniçoba") == []
@@ -1,10 +1,17 @@
-from fastapi.testclient import TestClient
-from main import app
-from database import create_db_and_tables
+import asyncio
 import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from main import app, senhas
+import database
+from database import create_db_and_tables, SessionLocal
+from models import User
+from senhas import ServicoDeSenhas
 
-# Configuração para usar um banco de dados em memória para o teste
-os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 create_db_and_tables()
 
 client = TestClient(app)
@@ -88,5 +95,205 @@ def test_crud_flow():
     
     print("\n--- Teste CRUD de Usuários Concluído com Sucesso! ---")
 
+def test_conflitos_pela_restricao_unique():
+    primeiro = client.post("/usuarios", json={
+        "nome_usuario": "unico", "email": "unico@email.com", "senha": "Senha123"
+    }).json()
+    outro = client.post("/usuarios", json={
+        "nome_usuario": "outro", "email": "outro@email.com", "senha": "Senha123"
+    }).json()
+
+    # Nome de usuário duplicado também é um conflito
+    response = client.post("/usuarios", json={
+        "nome_usuario": "unico", "email": "novo@email.com", "senha": "Senha123"
+    })
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Já existe um usuário cadastrado com este nome de usuário."
+
+    # Atualizar para o e-mail de outro usuário
+    response = client.put(f"/usuarios/{outro['id']}", json={
+        "nome_usuario": "outro", "email": "unico@email.com", "senha": "Senha123"
+    })
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Já existe outro usuário com este email."
+
+    # Atualizar e deletar usuários inexistentes (sem calcular o hash da senha)
+    async def sem_hash(senha):
+        raise AssertionError("hash calculado para um usuário inexistente")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(senhas, "gerar_hash", sem_hash)
+        response = client.put("/usuarios/999999", json={
+            "nome_usuario": "fantasma", "email": "fantasma@email.com", "senha": "Senha123"
+        })
+    assert response.status_code == 404
+    assert client.delete("/usuarios/999999").status_code == 404
+
+    client.delete(f"/usuarios/{primeiro['id']}")
+    client.delete(f"/usuarios/{outro['id']}")
+
+def test_campo_em_conflito_pela_restricao(monkeypatch):
+    import main
+    from types import SimpleNamespace
+
+    def erro(original):
+        return IntegrityError("INSERT ...", {}, original)
+
+    # O DETAIL do PostgreSQL traz o valor: um nome com "email" não confunde
+    psycopg = Exception('duplicate key value violates unique constraint "users_nome_usuario_key"\nDETAIL: Key (nome_usuario)=(joao_email) already exists.')
+    psycopg.diag = SimpleNamespace(constraint_name="users_nome_usuario_key")
+    assert main.campo_em_conflito(erro(psycopg)) == "nome_usuario"
+    asyncpg = Exception("erro adaptado")
+    asyncpg.__cause__ = Exception("UniqueViolationError")
+    asyncpg.__cause__.constraint_name = "users_email_key"
+    assert main.campo_em_conflito(erro(asyncpg)) == "email"
+    assert main.campo_em_conflito(erro(Exception("UNIQUE constraint failed: users.email"))) == "email"
+    assert main.campo_em_conflito(erro(Exception("NOT NULL constraint failed: alteracoes.entidade"))) is None
+
+    # Outra violação na mesma transação não vira 409
+    async def falhar(*argumentos):
+        raise erro(Exception("NOT NULL constraint failed: alteracoes.entidade"))
+    monkeypatch.setattr(main, "registrar_async", falhar)
+    with pytest.raises(IntegrityError):
+        client.post("/usuarios", json={"nome_usuario": "joao_email", "email": "joao@email.com", "senha": "Senha123"})
+
+def test_importacao_de_usuarios_em_lote():
+    usuarios = [
+        {"nome_usuario": "lote1", "email": "lote1@email.com", "senha": "Senha123"},
+        {"nome_usuario": "lote2", "email": "lote1@email.com", "senha": "Senha123"},
+        {"nome_usuario": "lote3", "email": "lote3@email.com", "senha": "semnumero"},
+    ]
+    response = client.post("/usuarios/bulk", json=usuarios)
+    assert response.status_code == 200
+    relatorio = response.json()
+    assert relatorio["criados"] == 1
+    assert [r["status"] for r in relatorio["resultados"]] == ["criado", "duplicado", "invalido"]
+
+    # Reenviar o mesmo lote não duplica o usuário já gravado
+    response = client.post("/usuarios/bulk", json=usuarios[:1])
+    assert response.json()["resultados"][0]["status"] == "duplicado"
+
+    response = client.get("/usuarios/export")
+    emails = [linha for linha in response.text.splitlines() if "lote1@email.com" in linha]
+    assert len(emails) == 1
+
+    client.delete(f"/usuarios/{relatorio['resultados'][0]['id']}")
+
+def senha_gravada(email):
+    with SessionLocal() as db:
+        return db.scalar(select(User.senha).where(User.email == email))
+
+def test_login_e_rehash_de_senha(monkeypatch):
+    usuario = client.post("/usuarios", json={
+        "nome_usuario": "login", "email": "login@email.com", "senha": "Senha123"
+    }).json()
+
+    # 1. A senha é gravada como hash scrypt, nunca em texto puro
+    gravada = senha_gravada("login@email.com")
+    assert gravada.startswith(f"scrypt${senhas.n}$")
+    assert "Senha123" not in gravada
+
+    # 2. Login com senha certa e errada
+    assert client.post("/usuarios/login", json={"email": "login@email.com", "senha": "Senha123"}).json()["id"] == usuario["id"]
+    response = client.post("/usuarios/login", json={"email": "login@email.com", "senha": "Errada123"})
+    assert response.status_code == 401
+
+    # 3. E-mail sem conta: 401 depois do mesmo scrypt de uma senha errada
+    calculos = []
+    calcular = senhas._calcular
+    async def contar(*argumentos):
+        calculos.append(argumentos[2:])
+        return await calcular(*argumentos)
+    monkeypatch.setattr(senhas, "_calcular", contar)
+    response = client.post("/usuarios/login", json={"email": "ninguem@email.com", "senha": "Senha123"})
+    monkeypatch.undo()
+    assert response.status_code == 401
+    assert response.json() == client.post("/usuarios/login", json={"email": "login@email.com", "senha": "Errada123"}).json()
+    assert calculos == [(senhas.n, senhas.r, senhas.p)]
+
+    # 4. Com o custo alterado, o próximo login regrava o hash com os novos parâmetros
+    custo_original = senhas.n
+    senhas.n = custo_original * 2
+    try:
+        assert client.post("/usuarios/login", json={"email": "login@email.com", "senha": "Senha123"}).status_code == 200
+        assert senha_gravada("login@email.com").startswith(f"scrypt${custo_original * 2}$")
+    finally:
+        senhas.n = custo_original
+    assert client.get(f"/usuarios/{usuario['id']}").json()["updated_at"] == usuario["updated_at"]
+
+    client.delete(f"/usuarios/{usuario['id']}")
+
+def test_fila_de_senhas_cheia_responde_503():
+    servico = ServicoDeSenhas(n=2 ** 10, workers=1, fila_maxima=2)
+
+    async def disparar():
+        return await asyncio.gather(*(servico.gerar_hash("Senha123") for _ in range(5)), return_exceptions=True)
+
+    resultados = asyncio.run(disparar())
+    recusados = [r for r in resultados if not isinstance(r, str)]
+    assert len(recusados) == 3
+    assert all(r.status_code == 503 and r.headers["Retry-After"] for r in recusados)
+    assert asyncio.run(servico.verificar("Senha123", resultados[0]))
+    servico.fechar()
+
+def test_lifespan_aquece_antes_do_ready():
+    from aquecimento import aquecer_rotas, requisicao_de_aquecimento
+    from fastapi.routing import APIRoute
+
+    # 1. Leituras baratas: páginas de um item e exportações vazias
+    rotas = {r.path: r for r in app.routes if isinstance(r, APIRoute) and "GET" in r.methods}
+    assert requisicao_de_aquecimento(rotas["/receitas"]) == ("/receitas", {"limit": 1})
+    assert requisicao_de_aquecimento(rotas["/receitas/{receita_id}"]) == ("/receitas/1", {})
+    caminho, query = requisicao_de_aquecimento(rotas["/usuarios/export"])
+    assert query["after"] > 10 ** 12
+
+    # 2. As leituras vão direto na interface ASGI do app; nenhuma falha
+    async def aquecer():
+        try:
+            return await aquecer_rotas(app)
+        finally:
+            await database.async_engine.dispose()
+    status = asyncio.run(aquecer())
+    assert status["/receitas"] == 200 and status["/receitas/{receita_id}"] in (200, 404)
+    assert all(codigo < 500 for codigo in status.values())
+
+    # 3. Durante a partida o /ready responde 503; depois do aquecimento, 200
+    app.state.pronto = False
+    assert client.get("/ready").status_code == 503
+    with TestClient(app) as cliente_com_lifespan:
+        assert cliente_com_lifespan.get("/ready").json() == {"status": "pronto"}
+
+def test_partida_sem_httpx():
+    # O httpx é dependência dos testes, não do app (requirements.txt)
+    codigo = "import sys; sys.modules['httpx'] = None; import main"
+    subprocess.run([sys.executable, "-c", codigo], cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True)
+
+def test_lifespan_espera_as_tarefas_antes_de_fechar_conexoes(monkeypatch):
+    import main
+
+    encerramento = []
+
+    def periodica(nome):
+        async def manter(*argumentos):
+            try:
+                await asyncio.sleep(3600)
+            finally:
+                # Limpeza que ainda precisa do event loop (e das conexões)
+                await asyncio.sleep(0)
+                encerramento.append(nome)
+        return manter
+
+    fechar_conexoes = main.fechar_conexoes
+    async def fechar():
+        encerramento.append("conexoes")
+        await fechar_conexoes()
+
+    monkeypatch.setattr(main, "manter", periodica("expurgo"))
+    monkeypatch.setattr(main.estatisticas, "manter", periodica("reconciliacao"))
+    monkeypatch.setattr(main, "fechar_conexoes", fechar)
+    with TestClient(app):
+        pass
+    assert sorted(encerramento[:2]) == ["expurgo", "reconciliacao"]
+    assert encerramento[2:] == ["conexoes"]
+
 if __name__ == "__main__":
     test_crud_flow()
@@ -0,0 +1,73 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from main import app
+from database import create_db_and_tables, engine, SessionLocal
+from metricas import MiddlewareDeMetricas, Registro
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def amostra(texto: str, serie: str) -> float:
+    for linha in texto.splitlines():
+        if linha.startswith(serie + " "):
+            return float(linha.rsplit(" ", 1)[1])
+    raise AssertionError(f"série ausente: {serie}")
+
+def test_metrics_por_rota_e_sql():
+    assert client.get("/receitas/1").status_code == 200
+    assert client.post("/usuarios", json={"nome_usuario": "medido", "senha": "segredo123", "email": "medido@exemplo.com"}).status_code in (201, 409)
+    client.get("/nao-existe")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    texto = response.text
+
+    # 1. Rótulos pelo template da rota; caminhos sem rota não viram rótulo
+    rota = 'method="GET",route="/receitas/{receita_id}"'
+    assert amostra(texto, f'http_requests_total{{{rota},status="200"}}') >= 1
+    assert amostra(texto, f'http_request_duration_seconds_count{{{rota}}}') >= 1
+    assert amostra(texto, f'http_response_size_bytes_sum{{{rota}}}') > 0
+    assert amostra(texto, 'http_requests_total{method="GET",route="<sem rota>",status="404"}') >= 1
+    assert "/nao-existe" not in texto
+
+    # 2. SQL atribuído à requisição e estado do pool
+    assert amostra(texto, f'http_request_db_queries_sum{{{rota}}}') >= 1
+    assert amostra(texto, 'db_queries_total{engine="sync"}') >= 1
+    assert amostra(texto, 'db_pool_checkout_wait_seconds_count{engine="sync"}') >= 1
+    assert amostra(texto, 'db_pool_checkout_wait_seconds_count{engine="async"}') >= 1
+    assert amostra(texto, 'db_pool_connections_in_use{engine="sync"}') == 0
+    # Medido sem trocar a classe do pool
+    assert type(engine.pool).__module__ == "sqlalchemy.pool.impl"
+
+def test_histograma_acumulado():
+    registro = Registro()
+    histograma = registro.histograma("teste_segundos", "Teste", ("rota",), buckets=(0.1, 1))
+    for valor in (0.05, 0.5, 5):
+        histograma.observar(valor, ("/x",))
+
+    texto = registro.expor()
+    assert amostra(texto, 'teste_segundos_bucket{rota="/x",le="0.1"}') == 1
+    assert amostra(texto, 'teste_segundos_bucket{rota="/x",le="1"}') == 2
+    assert amostra(texto, 'teste_segundos_bucket{rota="/x",le="+Inf"}') == 3
+    assert amostra(texto, 'teste_segundos_count{rota="/x"}') == 3
+
+def test_log_de_requisicoes_lentas(caplog):
+    lento = FastAPI()
+    lento.add_middleware(MiddlewareDeMetricas, limiar_lentas_ms=0)
+
+    @lento.get("/consulta")
+    def consulta():
+        with SessionLocal() as db:
+            return {"total": db.scalar(text("SELECT count(*) FROM receitas"))}
+
+    with caplog.at_level(logging.WARNING, logger="metricas.lentas"):
+        assert TestClient(lento).get("/consulta").status_code == 200
+
+    assert "GET /consulta -> 200" in caplog.text
+    assert "SELECT count(*) FROM receitas" in caplog.text
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, insert, select, update
+
+from models import User, table_registry
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+def alembic(url, *argumentos):
+    # Processo à parte: o env.py lê DATABASE_URL das settings, que aqui já estão em cache
+    subprocess.run(
+        [sys.executable, "-m", "alembic", *argumentos],
+        cwd=RAIZ, env={**os.environ, "DATABASE_URL": url}, check=True, capture_output=True,
+    )
+
+def sem_busca(nome, tipo, pais):
+    # As tabelas da busca (FTS5/tsvector) são criadas pela migração, fora dos models
+    return tipo != "table" or not (nome or "").startswith("receitas_busca")
+
+def test_upgrade_head_igual_aos_models(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migracoes.db'}"
+    alembic(url, "upgrade", "head")
+
+    engine = create_engine(url)
+    with engine.connect() as conexao:
+        contexto = MigrationContext.configure(conexao, opts={"include_name": sem_busca})
+        assert compare_metadata(contexto, table_registry.metadata) == []
+
+    # As escritas de usuários gravam updated_at
+    with engine.begin() as conexao:
+        usuario_id = conexao.scalar(insert(User).values(nome_usuario="migrado", email="migrado@email.com", senha="x").returning(User.id))
+        conexao.execute(update(User).where(User.id == usuario_id).values(senha="y"))
+        assert conexao.scalar(select(User.updated_at).where(User.id == usuario_id)) is not None
+    engine.dispose()
+
+    alembic(url, "downgrade", "base")
@@ -0,0 +1,301 @@
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.dialects import postgresql
+
+from main import app
+from paginacao import LIMITE_PADRAO
+from database import create_db_and_tables, engine, SessionLocal
+from busca import BuscaPostgres, IndiceBusca
+from models import Ingrediente
+from repositorio import RECEITAS_INICIAIS, ReceitaRepository
+from schema import BaseReceita, Receita as ReceitaSchema
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def test_receitas_crud_flow():
+    # 1. GET - Receitas de exemplo já cadastradas
+    response = client.get("/receitas")
+    assert response.status_code == 200
+    nomes = [r["nome"] for r in response.json()]
+    assert "Brigadeiro" in nomes
+
+    # 2. POST - Criar Receita (Sucesso)
+    receita_data = {
+        "nome": "Quindim",
+        "ingredientes": ["gema", "açúcar", "coco ralado"],
+        "modo_de_preparo": "Misture e asse em banho-maria."
+    }
+    response = client.post("/receitas", json=receita_data)
+    assert response.status_code == 201
+    criada = response.json()
+    assert criada["ingredientes"] == receita_data["ingredientes"]
+    receita_id = criada["id"]
+
+    # 3. POST - Nome duplicado, ignorando maiúsculas
+    response = client.post("/receitas", json={**receita_data, "nome": "QUINDIM"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Receita com este nome já existe"
+
+    # 4. GET - Buscar pelo nome
+    response = client.get("/receitas/nome/quindim")
+    assert response.status_code == 200
+    assert response.json()["id"] == receita_id
+
+    # 5. PUT - Atualizar a ordem e a lista de ingredientes
+    atualizada = {**receita_data, "ingredientes": ["coco ralado", "gema", "açúcar", "manteiga"]}
+    response = client.put(f"/receitas/{receita_id}", json=atualizada)
+    assert response.status_code == 200
+    assert response.json()["ingredientes"] == atualizada["ingredientes"]
+
+    # 6. DELETE - Deletar Receita (retorna a receita deletada)
+    response = client.delete(f"/receitas/{receita_id}")
+    assert response.status_code == 200
+    assert response.json()["nome"] == "Quindim"
+
+    response = client.get(f"/receitas/{receita_id}")
+    assert response.status_code == 404
+
+def test_listagem_sem_n_mais_1():
+    # Os ingredientes são carregados em lote, independente do número de receitas
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        response = client.get("/receitas")
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+
+    assert response.status_code == 200
+    assert len(response.json()) >= 6
+    assert len(consultas) <= 2
+
+def test_receitas_compativeis():
+    # "acucar" sem acento encontra as receitas com "açúcar"
+    response = client.get("/receitas/compativeis", params={"despensa": ["leite condensado", "LEITE", "ovos", "acucar"]})
+    assert response.status_code == 200
+    resultado = response.json()
+    assert resultado[0]["nome"] == "Pudim"
+    assert resultado[0]["ingredientes_cobertos"] == 4
+    assert resultado[0]["ingredientes_faltantes"] == []
+
+    # Filtros obrigatórios e de exclusão
+    response = client.get("/receitas/compativeis", params={
+        "despensa": ["leite", "ovos"],
+        "incluir": ["chocolate em pó"],
+        "excluir": ["manteiga"],
+    })
+    assert [r["nome"] for r in response.json()] == ["Bolo de Chocolate"]
+
+    # O índice acompanha as escritas
+    nova = client.post("/receitas", json={
+        "nome": "Ovo Cozido",
+        "ingredientes": ["ovos", "água"],
+        "modo_de_preparo": "Cozinhe por dez minutos.",
+    }).json()
+    response = client.get("/receitas/compativeis", params={"despensa": ["ovos", "agua"]})
+    assert response.json()[0]["id"] == nova["id"]
+
+    client.delete(f"/receitas/{nova['id']}")
+    response = client.get("/receitas/compativeis", params={"despensa": ["agua"]})
+    assert response.json() == []
+
+def test_paginacao_e_ndjson():
+    # Páginas por cursor, sem repetir nem pular receitas
+    vistos = []
+    params = {"limit": 4}
+    while True:
+        response = client.get("/receitas", params=params)
+        assert response.status_code == 200
+        vistos.extend(r["id"] for r in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+        params = {"limit": 4, "after": response.headers["X-Next-Cursor"]}
+    assert vistos == sorted(vistos)
+    assert len(vistos) == len(client.get("/receitas").json())
+
+    # Exportação em NDJSON, uma receita por linha
+    response = client.get("/receitas", params={"formato": "ndjson", "after": vistos[1]})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    linhas = response.text.splitlines()
+    assert [json.loads(linha)["id"] for linha in linhas] == vistos[2:]
+
+def test_limite_padrao_com_cursor_da_proxima_pagina():
+    # Sem ?limit=, a listagem para em LIMITE_PADRAO receitas e aponta a próxima página
+    relatorio = client.post("/receitas/bulk", json=[
+        {"nome": f"Receita em lote {i}", "ingredientes": ["sal"], "modo_de_preparo": "Misture."}
+        for i in range(LIMITE_PADRAO + 1)
+    ]).json()
+    ids = [r["id"] for r in relatorio["resultados"]]
+
+    # A segunda leitura vem do cache, com os mesmos cabeçalhos
+    for _ in range(2):
+        response = client.get("/receitas")
+        assert len(response.json()) == LIMITE_PADRAO
+        cursor = response.headers["X-Next-Cursor"]
+        assert cursor == str(response.json()[-1]["id"])
+        proxima = response.headers["Link"].split(";")[0].strip("<>")
+        assert f"after={cursor}" in proxima and f"limit={LIMITE_PADRAO}" in proxima
+
+    restantes = client.get(proxima).json()
+    assert restantes and restantes[-1]["id"] == ids[-1]
+    for id in ids:
+        client.delete(f"/receitas/{id}")
+
+def test_ingrediente_novo_gravado_por_outra_escrita_no_meio(monkeypatch):
+    # Outra requisição grava o mesmo ingrediente novo entre o SELECT dos
+    # existentes e o INSERT dos que faltam
+    def com_corrida(db, metodo):
+        original = getattr(db, metodo)
+        def executar(consulta, *argumentos, **opcoes):
+            resultado = original(consulta, *argumentos, **opcoes)
+            entidade = getattr(consulta, "column_descriptions", [{}])[0].get("entity")
+            if entidade is Ingrediente and not corridas:
+                corridas.append(consulta)
+                # Lido antes da outra escrita
+                resultado = resultado.freeze()() if metodo == "execute" else list(resultado)
+                db.execute(insert(Ingrediente).values(nome=f"pimenta de cheiro {metodo}"))
+            return resultado
+        monkeypatch.setattr(db, metodo, executar)
+
+    with SessionLocal() as db:
+        receitas = ReceitaRepository(db)
+        corridas = []
+        com_corrida(db, "scalars")
+        criada = receitas.add(BaseReceita(nome="Pato no Tucupi", ingredientes=["pato", "pimenta de cheiro scalars"], modo_de_preparo="Cozinhe."))
+        assert criada.ingredientes == ["pato", "pimenta de cheiro scalars"]
+
+        # O mesmo na importação em lote
+        corridas = []
+        com_corrida(db, "execute")
+        receitas.add_muitos([BaseReceita(nome="Arroz Paraense", ingredientes=["arroz", "pimenta de cheiro execute"], modo_de_preparo="Cozinhe.")])
+        assert len(corridas) == 1
+        monkeypatch.undo()
+
+        repetidos = db.scalar(select(func.count()).select_from(Ingrediente).where(Ingrediente.nome.like("pimenta de cheiro %")))
+        assert repetidos == 2
+    exportadas = {r["nome"]: r["ingredientes"] for r in client.get("/receitas", params={"limit": 1000}).json()}
+    assert exportadas["Arroz Paraense"] == ["arroz", "pimenta de cheiro execute"]
+
+def test_importacao_e_exportacao_em_lote():
+    linhas = [
+        {"nome": "Cuscuz", "ingredientes": ["flocão", "sal", "água"], "modo_de_preparo": "Cozinhe no vapor."},
+        {"nome": "cuscuz", "ingredientes": ["flocão"], "modo_de_preparo": "Repetida no lote."},
+        {"nome": "Pudim", "ingredientes": ["leite"], "modo_de_preparo": "Já cadastrada."},
+        {"nome": "X", "ingredientes": ["sal"], "modo_de_preparo": "Nome curto demais."},
+        {"nome": "Tapioca"},
+        {"nome": "Tapioca", "ingredientes": ["goma", "sal"], "modo_de_preparo": "Espalhe na frigideira."},
+    ]
+    corpo = "\n".join(json.dumps(linha) for linha in linhas) + "\n{json inválido\n"
+    response = client.post("/receitas/bulk", content=corpo, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    relatorio = response.json()
+    assert relatorio["criados"] == 2
+    assert [r["status"] for r in relatorio["resultados"]] == [
+        "criado", "duplicado", "duplicado", "invalido", "invalido", "criado", "invalido"
+    ]
+
+    # As receitas importadas ficam disponíveis nas consultas e no índice
+    cuscuz_id = relatorio["resultados"][0]["id"]
+    assert client.get(f"/receitas/{cuscuz_id}").json()["ingredientes"] == ["flocão", "sal", "água"]
+    compativeis = client.get("/receitas/compativeis", params={"despensa": ["goma"]}).json()
+    assert [r["nome"] for r in compativeis] == ["Tapioca"]
+
+    response = client.get("/receitas/export", params={"after": cuscuz_id - 1})
+    assert [json.loads(linha)["nome"] for linha in response.text.splitlines()] == ["Cuscuz", "Tapioca"]
+
+    for resultado in relatorio["resultados"]:
+        if resultado["id"]:
+            client.delete(f"/receitas/{resultado['id']}")
+
+def test_respostas_pre_serializadas_mantem_openapi():
+    # As rotas devolvem bytes prontos, mas o schema documentado é o do response_model
+    esquema = app.openapi()["paths"]["/receitas"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert esquema["items"] == {"$ref": "#/components/schemas/Receita"}
+
+    response = client.get("/receitas/compativeis", params={"despensa": ["leite"]})
+    assert response.headers["content-type"] == "application/json"
+    assert set(response.json()[0]) == {
+        "id", "nome", "ingredientes", "modo_de_preparo", "ingredientes_cobertos", "ingredientes_faltantes"
+    }
+
+def test_busca_textual():
+    # Sem acentos, com erro de digitação, parcial e por ingrediente
+    def nomes(q):
+        response = client.get("/receitas/search", params={"q": q})
+        assert response.status_code == 200
+        return [r["nome"] for r in response.json()]
+
+    assert nomes("pao de queijo")[0] == "Pão de Queijo"
+    assert nomes("moqeca")[0] == "Moqueca de Peixe"
+    assert nomes("queij")[0] == "Pão de Queijo"
+    assert nomes("dende") == ["Moqueca de Peixe"]
+    assert nomes("xyz") == []
+
+    # O índice acompanha criação, atualização e remoção
+    nova = client.post("/receitas", json={
+        "nome": "Bobó de Camarão",
+        "ingredientes": ["camarão", "mandioca", "leite de coco"],
+        "modo_de_preparo": "Cozinhe a mandioca e bata com o leite de coco.",
+    }).json()
+    assert nomes("bobo camarao")[0] == "Bobó de Camarão"
+
+    client.put(f"/receitas/{nova['id']}", json={
+        "nome": "Bobó de Camarão",
+        "ingredientes": ["camarão", "aipim", "leite de coco"],
+        "modo_de_preparo": "Cozinhe o aipim e bata com o leite de coco.",
+    })
+    assert nomes("mandioca") == []
+    assert nomes("aipim") == ["Bobó de Camarão"]
+
+    client.delete(f"/receitas/{nova['id']}")
+    assert nomes("bobo") == []
+
+class ComandosPostgres:
+    """Sessão de mentira: compila cada comando para o dialeto do PostgreSQL, sem banco."""
+
+    def __init__(self):
+        self.comandos = []
+
+    def execute(self, comando, parametros=None):
+        self.comandos.append((str(comando.compile(dialect=postgresql.dialect())), parametros))
+        return []
+
+def test_busca_postgres_compila_para_o_dialeto():
+    db = ComandosPostgres()
+    BuscaPostgres().buscar(db, "Pão queij", limite=5)
+    (busca_e, parametros_e), (busca_ou, parametros_ou) = db.comandos
+    # Todas as palavras como prefixo; sem resultado, qualquer uma delas
+    assert parametros_e == {"texto": "pao queij", "expressao": "pao:* & queij:*", "limite": 5}
+    assert parametros_ou["expressao"] == "pao:* | queij:*"
+    # O % do operador do pg_trgm vai escapado para o paramstyle do driver
+    assert "WHERE documento @@ q OR %(texto)s <%% nome" in busca_e
+    assert "to_tsquery('simple', %(expressao)s) q" in busca_ou
+
+    db = ComandosPostgres()
+    BuscaPostgres().indexar(db, [3, 7])
+    (remocao, parametros), (insercao, _) = db.comandos
+    # A lista de ids é expandida na execução, um parâmetro por id
+    assert remocao == "DELETE FROM receitas_busca WHERE receita_id IN (__[POSTCOMPILE_ids])"
+    assert parametros == {"ids": [3, 7]}
+    assert "setweight(to_tsvector('simple', unaccent(lower(r.nome))), 'A')" in insercao
+    assert insercao.endswith("WHERE r.id IN (__[POSTCOMPILE_ids]) GROUP BY r.id")
+
+def test_indice_de_busca_em_memoria():
+    indice = IndiceBusca()
+    indice.reconstruir(
+        ReceitaSchema(id=i, **receita.model_dump()) for i, receita in enumerate(RECEITAS_INICIAIS, start=1)
+    )
+    nomes = {i: receita.nome for i, receita in enumerate(RECEITAS_INICIAIS, start=1)}
+    assert nomes[indice.buscar("pao de queijo")[0].receita_id] == "Pão de Queijo"
+    assert nomes[indice.buscar("moqeca")[0].receita_id] == "Moqueca de Peixe"
+
+    indice.remover(6)
+    assert [nomes[e.receita_id] for e in indice.buscar("polvilho")] == []
@@ -0,0 +1,84 @@
+import asyncio
+import tempfile
+import time
+
+import pytest
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import database
+from database import create_db_and_tables, engine, engines_de_leitura
+from replicas import COOKIE_ESCRITA, PRIMARIA, REPLICA, RoteadorDeLeituras
+
+create_db_and_tables()
+
+def banco(nome):
+    # Um SQLite por "servidor", que responde o próprio nome
+    caminho = f"{tempfile.mkdtemp()}/{nome}.db"
+    async def criar():
+        motor = create_async_engine(f"sqlite+aiosqlite:///{caminho}")
+        async with motor.begin() as conexao:
+            await conexao.execute(text("CREATE TABLE origem (nome TEXT)"))
+            await conexao.execute(text("INSERT INTO origem VALUES (:nome)"), {"nome": nome})
+        await motor.dispose()
+    asyncio.run(criar())
+    return async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{caminho}"))
+
+FORA_DO_AR = async_sessionmaker(create_async_engine("sqlite+aiosqlite:////nao/existe/replica.db"))
+
+def requisicao(cookies=""):
+    return Request({"type": "http", "headers": [(b"cookie", cookies.encode())]})
+
+def ler(roteador, destino, vezes=1):
+    async def cenario():
+        nomes = []
+        for _ in range(vezes):
+            async with roteador.sessao(destino) as db:
+                nomes.append(await db.scalar(text("SELECT nome FROM origem")))
+        return nomes
+    return asyncio.run(cenario())
+
+def test_rodizio_entre_replicas_e_volta_para_a_primaria():
+    primaria = banco("primaria")
+    roteador = RoteadorDeLeituras(primaria, [banco("replica0"), FORA_DO_AR, banco("replica1")])
+
+    # 1. Leituras alternam entre as réplicas; a que não conecta fica de fora
+    assert sorted(set(ler(roteador, REPLICA, vezes=6))) == ["replica0", "replica1"]
+    assert ler(roteador, PRIMARIA) == ["primaria"]
+
+    # 2. Sem nenhuma réplica disponível, a leitura vai para a primária
+    assert ler(RoteadorDeLeituras(primaria, [FORA_DO_AR]), REPLICA) == ["primaria"]
+
+def test_leitura_na_primaria_depois_da_propria_escrita():
+    roteador = RoteadorDeLeituras(banco("primaria"), [banco("replica0")], janela=5)
+    assert roteador.destino(requisicao()) == REPLICA
+    assert roteador.pode_estar_atrasado(REPLICA)
+    assert not roteador.pode_estar_atrasado(PRIMARIA)
+
+    response = Response()
+    roteador.registrar_escrita(response)
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith(f"{COOKIE_ESCRITA}=")
+    assert "Max-Age=5" in cookie
+
+    valor = cookie.split(";")[0]
+    assert roteador.destino(requisicao(valor)) == PRIMARIA
+    assert roteador.escreveu_agora(requisicao(valor))
+    assert not roteador.escreveu_agora(requisicao())
+    assert roteador.destino(requisicao(f"{COOKIE_ESCRITA}={time.time() - 1}")) == REPLICA
+
+@pytest.mark.skipif(not database.SQLITE_DESEMPENHO, reason="perfil só vale para SQLite em arquivo")
+def test_perfil_sqlite_e_pool_so_de_leitura():
+    with engine.connect() as conexao:
+        assert conexao.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conexao.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+
+    async def escrever_na_leitura():
+        async with engines_de_leitura[0].connect() as conexao:
+            assert await conexao.scalar(text("SELECT count(*) FROM receitas")) > 0
+            await conexao.execute(text("DELETE FROM receitas"))
+
+    with pytest.raises(OperationalError, match="readonly"):
+        asyncio.run(escrever_na_leitura())
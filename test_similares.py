@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from main import app
+from database import create_db_and_tables
+from similares import IndiceSimilares
+
+create_db_and_tables()
+
+client = TestClient(app)
+
+def receita(id, *ingredientes):
+    return SimpleNamespace(id=id, ingredientes=list(ingredientes))
+
+def test_indice_ordena_pelo_jaccard_exato():
+    indice = IndiceSimilares(bandas=32, linhas=1)
+    indice.reconstruir([
+        receita(1, "farinha", "ovos", "leite", "açúcar"),
+        receita(2, "Farinha", "ovos", "leite", "manteiga"),
+        receita(3, "farinha", "ovos", "sal", "fermento"),
+        receita(4, "peixe", "coentro", "dendê"),
+    ])
+    similares = indice.similares(1, k=10)
+    assert [(s.receita_id, s.em_comum) for s in similares] == [(2, 3), (3, 2)]
+    assert similares[0].similaridade == 3 / 5
+    assert indice.similares(99) is None
+
+def test_indice_atualiza_a_cada_escrita():
+    indice = IndiceSimilares(bandas=32, linhas=1)
+    indice.reconstruir([receita(1, "a", "b", "c"), receita(2, "x", "y")])
+    assert indice.similares(1) == []
+
+    # Atualizar troca os baldes; remover libera a faixa para a próxima receita
+    indice.adicionar(receita(2, "a", "b", "z"))
+    assert [s.receita_id for s in indice.similares(1)] == [2]
+    indice.remover(2)
+    assert indice.similares(1) == [] and indice.similares(2) is None
+    indice.adicionar(receita(3, "a", "b", "c"))
+    assert indice.similares(1)[0].similaridade == 1.0
+    assert len(indice._assinaturas) == 2 * indice.permutacoes
+
+    # Reordenados os baldes, o resultado é o mesmo
+    indice._ordenar()
+    assert [s.receita_id for s in indice.similares(1)] == [3]
+
+def test_vocabulario_libera_ingredientes_sem_receitas():
+    indice = IndiceSimilares(bandas=32, linhas=1)
+    indice.reconstruir([receita(1, "a", "b", "c")])
+    tamanho = len(indice._vetores)
+
+    # 1. Ingredientes que só a receita removida usava saem do vocabulário
+    indice.adicionar(receita(2, "a", "Pimenta", "pimenta"))
+    indice.remover(2)
+    assert sorted(indice._vocabulario) == ["a", "b", "c"]
+    assert sorted(indice._por_nome) == ["a", "b", "c"]
+
+    # 2. Atualizar também libera os que saíram; o token livre é reaproveitado
+    indice.adicionar(receita(3, "a", "b", "x"))
+    indice.adicionar(receita(3, "a", "b", "y"))
+    assert sorted(indice._vocabulario) == ["a", "b", "c", "y"]
+    # (o de "pimenta" foi para "x"; "y" entrou com "x" ainda em uso)
+    assert len(indice._vetores) == tamanho + 2 * indice.permutacoes
+    assert [(s.receita_id, s.similaridade) for s in indice.similares(3)] == [(1, 2 / 4)]
+
+    # 3. Milhares de escritas de ingredientes únicos não fazem o índice crescer
+    for i in range(2000):
+        indice.adicionar(receita(4, "a", f"único {i}"))
+    assert len(indice._vocabulario) == 5
+    assert len(indice._vetores) == tamanho + 3 * indice.permutacoes
+    assert [(s.receita_id, s.em_comum) for s in indice.similares(4)] == [(1, 1), (3, 1)]
+
+def test_rota_de_similares():
+    ids = [
+        client.post("/receitas", json={"nome": nome, "ingredientes": ingredientes, "modo_de_preparo": "Asse."}).json()["id"]
+        for nome, ingredientes in [
+            ("Base Similar", ["jabuticaba", "cupuaçu", "bacuri", "murici"]),
+            ("Quase Igual", ["jabuticaba", "cupuaçu", "bacuri", "taperebá"]),
+            ("Pouco Igual", ["jabuticaba", "cajá", "umbu", "pequi"]),
+        ]
+    ]
+    response = client.get(f"/receitas/{ids[0]}/similares", params={"k": 2})
+    assert response.status_code == 200
+    corpo = response.json()
+    assert corpo[0]["id"] == ids[1]
+    assert corpo[0]["similaridade"] == 0.6
+    assert corpo[0]["ingredientes_em_comum"] == ["jabuticaba", "cupuaçu", "bacuri"]
+
+    # Excluída, a receita sai do índice
+    client.delete(f"/receitas/{ids[1]}")
+    assert ids[1] not in [r["id"] for r in client.get(f"/receitas/{ids[0]}/similares").json()]
+    assert client.get("/receitas/999999/similares").status_code == 404